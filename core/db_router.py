@@ -0,0 +1,54 @@
+"""
+Roteamento entre o banco principal e a réplica de leitura.
+
+Por padrão tudo vai para ``default``. Views somente leitura marcadas com
+``usar_replica`` (atributo na classe ou decorator na função) têm suas leituras
+de GET/HEAD enviadas para a réplica pelo ``ReplicaLeituraMiddleware``; escritas
+sempre vão para o principal. O roteador só entra em ``DATABASE_ROUTERS``
+quando ``DB_REPLICA_NAME``/``DB_REPLICA_HOST`` estão configurados.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+ALIAS_PRINCIPAL = 'default'
+ALIAS_REPLICA = 'replica'
+
+lendo_da_replica = ContextVar('lendo_da_replica', default=False)
+
+
+def usar_replica(view):
+    """Marca uma view baseada em função como somente leitura. Fica acima do ``@api_view``."""
+    view.usar_replica = True
+    return view
+
+
+def view_usa_replica(view_func):
+    if getattr(view_func, 'usar_replica', False):
+        return True
+    return getattr(getattr(view_func, 'view_class', None), 'usar_replica', False)
+
+
+@contextmanager
+def leitura_na_replica():
+    token = lendo_da_replica.set(True)
+    try:
+        yield
+    finally:
+        lendo_da_replica.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if lendo_da_replica.get():
+            return ALIAS_REPLICA
+        return None
+
+    def db_for_write(self, model, **hints):
+        return ALIAS_PRINCIPAL
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Principal e réplica têm os mesmos dados
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != ALIAS_REPLICA
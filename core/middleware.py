@@ -0,0 +1,230 @@
+"""
+Instrumentação por requisição: número de consultas, tempo de SQL, tempo de
+serialização/renderização e tamanho da resposta.
+
+Ativada com ``METRICAS_REQUISICAO=True``. Desligada, o middleware levanta
+``MiddlewareNotUsed`` na carga e sai da cadeia; o custo por requisição é zero.
+"""
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import ExitStack
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from .db_router import lendo_da_replica, view_usa_replica
+
+logger = logging.getLogger(__name__)
+
+
+class OrcamentoQueriesExcedido(AssertionError):
+    """Levantada no modo estrito quando uma view passa do orçamento de consultas."""
+
+
+def orcamento_queries(limite):
+    """
+    Declara o orçamento de consultas SQL de uma view baseada em função.
+
+    Deve ficar acima do ``@api_view``. Para views baseadas em classe, use o
+    atributo ``orcamento_queries``. Aceita um inteiro (vale para qualquer
+    método) ou um dicionário por método HTTP, ex.: ``{'GET': 2, 'POST': 6}``.
+    """
+    def decorator(view):
+        view.orcamento_queries = limite
+        return view
+    return decorator
+
+
+def orcamento_da_view(view_func, metodo):
+    limite = getattr(view_func, 'orcamento_queries', None)
+    if limite is None:
+        limite = getattr(getattr(view_func, 'view_class', None), 'orcamento_queries', None)
+    if isinstance(limite, dict):
+        return limite.get(metodo)
+    return limite
+
+
+# ============= HISTOGRAMA =============
+class Histograma:
+    """Janela deslizante, em memória do processo, das últimas medições por rota."""
+
+    def __init__(self, janela=1000):
+        self.janela = janela
+        self._lock = threading.Lock()
+        self._medicoes = defaultdict(lambda: deque(maxlen=self.janela))
+
+    def registrar(self, rota, medicao):
+        with self._lock:
+            self._medicoes[rota].append(medicao)
+
+    def limpar(self):
+        with self._lock:
+            self._medicoes.clear()
+
+    def resumo(self):
+        with self._lock:
+            copia = {rota: list(medicoes) for rota, medicoes in self._medicoes.items()}
+        return {rota: resumir(medicoes) for rota, medicoes in sorted(copia.items())}
+
+
+def percentil(ordenados, p):
+    return ordenados[min(len(ordenados) - 1, int(p / 100 * len(ordenados)))]
+
+
+def resumir(medicoes):
+    resumo = {'requisicoes': len(medicoes)}
+    for campo in ('total_ms', 'sql_ms', 'serializacao_ms', 'consultas', 'bytes'):
+        valores = sorted(medicao[campo] for medicao in medicoes)
+        resumo[campo] = {
+            'p50': percentil(valores, 50),
+            'p95': percentil(valores, 95),
+            'p99': percentil(valores, 99),
+            'max': valores[-1],
+        }
+    return resumo
+
+
+histograma = Histograma(getattr(settings, 'METRICAS_JANELA', 1000))
+
+
+# ============= MIDDLEWARE =============
+class ColetorSQL:
+    """``execute_wrapper`` que conta as consultas e soma o tempo gasto no banco."""
+
+    def __init__(self):
+        self.consultas = 0
+        self.segundos = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.segundos += time.perf_counter() - inicio
+            self.consultas += 1
+
+
+class MetricasRequisicaoMiddleware:
+    """
+    Mede cada requisição e publica o resultado no cabeçalho ``Server-Timing``
+    e no histograma servido em ``/api/metricas/``.
+
+    - ``db``: tempo total de SQL, com o número de consultas na descrição;
+    - ``serializacao``: tempo da view fora do banco (montagem dos serializers)
+      somado à renderização do JSON;
+    - ``total``: tempo da requisição dentro do middleware.
+
+    Com ``ORCAMENTO_QUERIES_ESTRITO=True`` (usado nos testes) uma view que
+    passa do orçamento declarado levanta ``OrcamentoQueriesExcedido``; sem o
+    modo estrito o excesso só é registrado no log.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'METRICAS_REQUISICAO', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.estrito = getattr(settings, 'ORCAMENTO_QUERIES_ESTRITO', False)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        coletor = ColetorSQL()
+        request._orcamento_queries = None
+        inicio = time.perf_counter()
+        with ExitStack() as stack:
+            for conexao in connections.all():
+                stack.enter_context(conexao.execute_wrapper(coletor))
+            response = self.get_response(request)
+        return self.registrar(request, response, coletor, time.perf_counter() - inicio)
+
+    async def __acall__(self, request):
+        coletor = ColetorSQL()
+        request._orcamento_queries = None
+        inicio = time.perf_counter()
+        with ExitStack() as stack:
+            for conexao in connections.all():
+                stack.enter_context(conexao.execute_wrapper(coletor))
+            response = await self.get_response(request)
+        return self.registrar(request, response, coletor, time.perf_counter() - inicio)
+
+    def registrar(self, request, response, coletor, total):
+        tamanho = 0 if response.streaming else len(response.content)
+        serializacao = max(total - coletor.segundos, 0.0)
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={coletor.segundos * 1000:.2f};desc="{coletor.consultas} queries"',
+            f'serializacao;dur={serializacao * 1000:.2f}',
+            f'total;dur={total * 1000:.2f}',
+        ])
+
+        match = request.resolver_match
+        rota = f"{request.method} {match.view_name if match else request.path}"
+        histograma.registrar(rota, {
+            'total_ms': round(total * 1000, 3),
+            'sql_ms': round(coletor.segundos * 1000, 3),
+            'serializacao_ms': round(serializacao * 1000, 3),
+            'consultas': coletor.consultas,
+            'bytes': tamanho,
+        })
+
+        limite = request._orcamento_queries
+        if limite is not None and coletor.consultas > limite:
+            mensagem = f"{rota} fez {coletor.consultas} consultas (orçamento: {limite})"
+            if self.estrito:
+                raise OrcamentoQueriesExcedido(mensagem)
+            logger.warning(mensagem)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._orcamento_queries = orcamento_da_view(view_func, request.method)
+
+
+# ============= RÉPLICA DE LEITURA =============
+class ReplicaLeituraMiddleware:
+    """
+    Envia as leituras das views marcadas com ``usar_replica`` para a réplica,
+    apenas em GET/HEAD. Fica fora da cadeia se o ``ReplicaRouter`` não estiver
+    configurado.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if 'core.db_router.ReplicaRouter' not in settings.DATABASE_ROUTERS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        try:
+            return self.get_response(request)
+        finally:
+            self.encerrar(request)
+
+    async def __acall__(self, request):
+        try:
+            return await self.get_response(request)
+        finally:
+            self.encerrar(request)
+
+    def encerrar(self, request):
+        # Sem ContextVar.reset: sob ASGI o process_view roda em outro contexto
+        if getattr(request, '_leitura_na_replica', False):
+            lendo_da_replica.set(False)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.method in ('GET', 'HEAD') and view_usa_replica(view_func):
+            request._leitura_na_replica = True
+            lendo_da_replica.set(True)
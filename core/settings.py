@@ -43,6 +43,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricasRequisicaoMiddleware',
+    'core.middleware.ReplicaLeituraMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -75,13 +77,142 @@ WSGI_APPLICATION = 'core.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# DB_ENGINE=postgresql usa o PostgreSQL com conexões persistentes
+# (DB_CONN_MAX_AGE) ou, com DB_POOL=True, o pool nativo do psycopg 3.
+# Sem configuração continua o SQLite local, ajustado para escrita concorrente:
+# WAL (leitores não bloqueiam o escritor), synchronous=NORMAL, espera de até
+# DB_TIMEOUT segundos por um lock e transações IMMEDIATE, que pegam o lock de
+# escrita no BEGIN em vez de falhar com "database is locked" no meio.
+
+DB_ENGINE = config('DB_ENGINE', default='sqlite3')
+
+if DB_ENGINE == 'postgresql':
+    DB_POOL = config('DB_POOL', default=False, cast=bool)
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': config('DB_NAME', default='gym'),
+            'USER': config('DB_USER', default='gym'),
+            'PASSWORD': config('DB_PASSWORD', default=''),
+            'HOST': config('DB_HOST', default='localhost'),
+            'PORT': config('DB_PORT', default='5432'),
+            # O pool do psycopg exige CONN_MAX_AGE = 0
+            'CONN_MAX_AGE': 0 if DB_POOL else config('DB_CONN_MAX_AGE', default=60, cast=int),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'pool': {
+                    'min_size': config('DB_POOL_MIN', default=2, cast=int),
+                    'max_size': config('DB_POOL_MAX', default=20, cast=int),
+                    'timeout': config('DB_POOL_TIMEOUT', default=10, cast=int),
+                },
+            } if DB_POOL else {},
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': config('DB_NAME', default=str(BASE_DIR / 'db.sqlite3')),
+            'OPTIONS': {
+                'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL',
+                'timeout': config('DB_TIMEOUT', default=5, cast=int),
+                'transaction_mode': 'IMMEDIATE',
+            },
+        }
+    }
+
+# Réplica de leitura (core/db_router.py). Com o SQLite basta apontar
+# DB_REPLICA_NAME para uma cópia do arquivo principal para testar localmente.
+DB_REPLICA_NAME = config('DB_REPLICA_NAME', default='')
+DB_REPLICA_HOST = config('DB_REPLICA_HOST', default='')
+
+if DB_REPLICA_NAME or DB_REPLICA_HOST:
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': DB_REPLICA_NAME or DATABASES['default']['NAME'],
+        'HOST': DB_REPLICA_HOST or DATABASES['default'].get('HOST', ''),
+        'TEST': {'MIRROR': 'default'},
     }
+    DATABASE_ROUTERS = ['core.db_router.ReplicaRouter']
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='gym'),
+    },
+    # Contadores do dashboard (gym/estatisticas.py): precisam ser vistos por
+    # todos os processos (workers, cron, comandos de importação). O padrão
+    # em arquivos, dentro do projeto, serve a um host; com vários hosts, Redis
+    # ou Memcached. Com LocMem cada processo teria os seus e o comando
+    # reconciliar_estatisticas não corrigiria os do servidor. Os testes usam
+    # diretórios próprios (core/test_runner.py).
+    'estatisticas': {
+        'BACKEND': config('ESTATISTICAS_CACHE_BACKEND', default='django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': config('ESTATISTICAS_CACHE_LOCATION', default=str(BASE_DIR / '.cache' / 'estatisticas')),
+        'TIMEOUT': None,
+    },
+    # Chaves que todos os processos precisam ver, como as versões das análises
+    # de volume (gym/volume.py): a invalidação feita por um worker vale para
+    # todos. Mesmas opções do anterior.
+    'compartilhado': {
+        'BACKEND': config('COMPARTILHADO_CACHE_BACKEND', default='django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': config('COMPARTILHADO_CACHE_LOCATION', default=str(BASE_DIR / '.cache' / 'compartilhado')),
+    },
 }
 
+TEST_RUNNER = 'core.test_runner.TestRunner'
+
+# Idade máxima, em segundos, dos contadores do dashboard: passado esse tempo
+# desde a última reconciliação, a leitura seguinte reconta tudo
+ESTATISTICAS_IDADE_MAXIMA = config('ESTATISTICAS_IDADE_MAXIMA', default=3600, cast=int)
+
+
+# Métricas por requisição (core/middleware.py)
+
+METRICAS_REQUISICAO = config('METRICAS_REQUISICAO', default=False, cast=bool)
+METRICAS_JANELA = config('METRICAS_JANELA', default=1000, cast=int)
+ORCAMENTO_QUERIES_ESTRITO = config('ORCAMENTO_QUERIES_ESTRITO', default=False, cast=bool)
+
+
+# Cache de elegibilidade de check-in (gym/elegibilidade.py): 'local' (LRU por
+# processo) ou 'compartilhado' (backend de CACHES, para vários workers)
+
+ELEGIBILIDADE_CACHE = config('ELEGIBILIDADE_CACHE', default='local')
+ELEGIBILIDADE_CACHE_TAMANHO = config('ELEGIBILIDADE_CACHE_TAMANHO', default=10000, cast=int)
+ELEGIBILIDADE_CACHE_TTL = config('ELEGIBILIDADE_CACHE_TTL', default=300, cast=int)
+
+
+# Segundos que as análises de volume de treino (gym/volume.py) ficam em cache,
+# além da invalidação pelos sinais
+
+VOLUME_CACHE_TTL = config('VOLUME_CACHE_TTL', default=3600, cast=int)
+
+
+# Meses de check-ins mantidos na tabela quente, contando o corrente; os
+# anteriores vão para o arquivo mensal (gym/arquivamento.py)
+
+CHECKIN_RETENCAO_MESES = config('CHECKIN_RETENCAO_MESES', default=3, cast=int)
+
+
+# Sincronização incremental (gym/sync.py): dias mantidos no log de alterações
+# e margem, em segundos, que o cursor não ultrapassa. No PostgreSQL a margem
+# precisa ser maior que a transação de escrita mais longa que altere usuários,
+# treinos, exercícios ou mensalidades (ver gym/sync.py)
+
+SYNC_RETENCAO_DIAS = config('SYNC_RETENCAO_DIAS', default=90, cast=int)
+SYNC_MARGEM_SEGUNDOS = config('SYNC_MARGEM_SEGUNDOS', default=2, cast=int)
+
+
+# Listagens do admin (gym/admin.py): acima deste número de linhas a contagem
+# é a estimativa das estatísticas do banco (tabela inteira) ou fica limitada
+# a ele (com filtro ou busca)
+
+ADMIN_CONTAGEM_EXATA_ATE = config('ADMIN_CONTAGEM_EXATA_ATE', default=100000, cast=int)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -0,0 +1,34 @@
+import shutil
+import tempfile
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+# Caches vistos por todos os processos (ver CACHES em core/settings.py)
+CACHES_COMPARTILHADOS = ('estatisticas', 'compartilhado')
+
+
+class TestRunner(DiscoverRunner):
+    """
+    Roda os testes com os caches compartilhados em diretórios próprios: o
+    padrão em arquivos também é usado pelo servidor local, e os testes
+    limpariam os valores dele (ou deixariam lá os do banco de teste).
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.diretorio = tempfile.mkdtemp(prefix='gym_caches_teste_')
+        caches = {alias: dict(config) for alias, config in settings.CACHES.items()}
+        for alias in CACHES_COMPARTILHADOS:
+            if caches[alias]['BACKEND'].endswith('FileBasedCache'):
+                caches[alias]['LOCATION'] = f'{self.diretorio}/{alias}'
+            else:
+                # Redis/Memcached: um prefixo separa as chaves dos testes
+                caches[alias]['KEY_PREFIX'] = 'teste'
+        self.caches_de_teste = override_settings(CACHES=caches)
+        self.caches_de_teste.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.caches_de_teste.disable()
+        shutil.rmtree(self.diretorio, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
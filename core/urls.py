@@ -16,8 +16,10 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
+from .views import metricas
 
 urlpatterns = [
     path("admin/", admin.site.urls),
+    path("api/metricas/", metricas, name="metricas"),
     path("api/", include("gym.urls")),
 ]
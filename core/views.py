@@ -0,0 +1,11 @@
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from .middleware import histograma
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def metricas(request):
+    """Percentis por rota das últimas requisições medidas por este processo."""
+    return Response(histograma.resumo())
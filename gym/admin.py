@@ -1,7 +1,241 @@
+"""
+Admin das tabelas da academia, ajustado para tabelas com milhões de linhas.
+
+- As listagens trazem as relações exibidas no ``__str__`` com
+  ``list_select_related`` (sem uma consulta por linha) e são ordenadas, e só
+  ordenáveis, por colunas indexadas.
+- As chaves para Usuario usam autocomplete, e Exercicio.treino um campo de id:
+  nenhum formulário renderiza um ``<select>`` com a tabela inteira. A busca de
+  usuários é pelo início do nome, sem diferenciar acentos nem maiúsculas, numa
+  faixa do índice ``usuario_nome_busca_idx`` (``nome_busca``, normalizado em
+  Python: o LOWER do SQLite só converte letras ASCII); as outras listagens buscam
+  pelo id ou pelo início do nome do aluno (nos exercícios, o do treino, e os
+  encontrados são ordenados depois de lidos pelos índices de treino).
+- O ``date_hierarchy`` lista os anos, meses e dias saltando pelo índice da
+  data, uma consulta por valor, em vez de um ``DISTINCT`` sobre a tabela.
+- ``ContagemEstimadaPaginator`` nunca conta mais que
+  ``ADMIN_CONTAGEM_EXATA_ATE`` linhas: acima disso, a tabela inteira usa a
+  estimativa das estatísticas do banco (``pg_class.reltuples`` no PostgreSQL,
+  ``sqlite_stat1`` no SQLite, atualizadas pelo ANALYZE).
+"""
+from datetime import datetime, time, timedelta
+from django.conf import settings
 from django.contrib import admin
-from .models import Usuario, Mensalidade, Treino, Exercicio
+from django.contrib.admin.views.main import SEARCH_VAR
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections, models
+from django.db.models import Max, Min
+from django.utils import timezone
+from django.utils.functional import cached_property
+from .arquivamento import proximo_mes
+from .models import Usuario, Mensalidade, Treino, Exercicio, CheckIn, normalizar_nome
+
+
+# ============= CONTAGEM =============
+def linhas_estimadas(model, using):
+    """Linhas da tabela segundo as estatísticas do banco, ou ``None`` se ela ainda não foi analisada."""
+    conexao = connections[using]
+    tabela = model._meta.db_table
+    with conexao.cursor() as cursor:
+        if conexao.vendor == 'postgresql':
+            cursor.execute("SELECT reltuples FROM pg_class WHERE oid = to_regclass(%s)", [tabela])
+            linha = cursor.fetchone()
+            # -1: nunca analisada
+            return int(linha[0]) if linha and linha[0] >= 0 else None
+        if conexao.vendor == 'sqlite':
+            try:
+                cursor.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = %s", [tabela])
+            except DatabaseError:
+                # sqlite_stat1 só existe depois do primeiro ANALYZE
+                return None
+            # O primeiro número é o de entradas do índice (menor nos índices parciais)
+            return max((int(stat.split()[0]) for stat, in cursor.fetchall()), default=None)
+    return None
+
+
+class ContagemEstimadaPaginator(Paginator):
+    """
+    Paginador das listagens do admin com contagem de custo limitado: sem
+    filtro, a estimativa do banco quando ela passa do limite; nos demais
+    casos, a contagem para em ``ADMIN_CONTAGEM_EXATA_ATE`` (as páginas além
+    dele ficam fora da navegação até o filtro ser refinado).
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not isinstance(queryset, models.QuerySet):
+            return super().count
+        limite = settings.ADMIN_CONTAGEM_EXATA_ATE
+        if not queryset.query.where:
+            estimativa = linhas_estimadas(queryset.model, queryset.db)
+            if estimativa is not None and estimativa > limite:
+                return estimativa
+        return queryset.order_by().values('pk')[:limite].count()
+
+
+# ============= DATAS =============
+def truncar(dia, nivel):
+    if nivel == 'year':
+        return dia.replace(month=1, day=1)
+    if nivel == 'month':
+        return dia.replace(day=1)
+    return dia
+
+
+def seguinte(dia, nivel):
+    if nivel == 'year':
+        return dia.replace(year=dia.year + 1)
+    if nivel == 'month':
+        return proximo_mes(dia)
+    return dia + timedelta(days=1)
+
+
+class QuerySetDoAdmin(models.QuerySet):
+    """QuerySet das listagens, com as consultas do ``date_hierarchy`` resolvidas pelo índice da data."""
+    NIVEIS = ('year', 'month', 'day')
+
+    def aggregate(self, *args, **kwargs):
+        # O SQLite só resolve MIN/MAX pelo índice com um único agregado na consulta
+        if args or len(kwargs) < 2 or not all(isinstance(expressao, (Min, Max)) for expressao in kwargs.values()):
+            return super().aggregate(*args, **kwargs)
+        resultado = {}
+        for nome, expressao in kwargs.items():
+            resultado.update(super().aggregate(**{nome: expressao}))
+        return resultado
+
+    def dates(self, field_name, kind, order='ASC'):
+        if kind not in self.NIVEIS:
+            return super().dates(field_name, kind, order)
+        return self.em_saltos(field_name, kind, order, com_hora=False)
+
+    def datetimes(self, field_name, kind, order='ASC', tzinfo=None):
+        if kind not in self.NIVEIS or tzinfo is not None:
+            return super().datetimes(field_name, kind, order, tzinfo)
+        return self.em_saltos(field_name, kind, order, com_hora=True)
+
+    def em_saltos(self, campo, nivel, order, com_hora):
+        """
+        Anos, meses ou dias distintos de ``campo``: cada um é o MIN a partir do
+        início do período seguinte ao anterior, uma busca no índice por valor.
+        """
+        def inicio(dia):
+            return timezone.make_aware(datetime.combine(dia, time.min)) if com_hora else dia
+
+        valores = []
+        queryset = self.order_by()
+        primeiro = queryset.aggregate(primeiro=Min(campo))['primeiro']
+        while primeiro is not None:
+            dia = truncar(timezone.localtime(primeiro).date() if com_hora else primeiro, nivel)
+            valores.append(inicio(dia))
+            # O salto vem antes dos filtros da listagem: com dois limites inferiores
+            # na mesma coluna, o SQLite começa a faixa do índice pelo primeiro
+            salto = QuerySetDoAdmin(self.model, using=self.db).filter(**{f'{campo}__gte': inicio(seguinte(dia, nivel))})
+            primeiro = (salto & queryset).aggregate(primeiro=Min(campo))['primeiro']
+        return valores if order == 'ASC' else valores[::-1]
+
+
+# ============= BUSCA =============
+def por_nome(queryset, termo):
+    """Usuários cujo nome começa com ``termo``, sem diferenciar acentos nem maiúsculas, pelo índice ``usuario_nome_busca_idx``."""
+    inicio = normalizar_nome(termo)
+    if not inicio:
+        return queryset.none()
+    fim = inicio[:-1] + chr(ord(inicio[-1]) + 1)
+    # A faixa percorre o índice; o startswith confirma o prefixo em collations não binárias
+    return queryset.filter(nome_busca__gte=inicio, nome_busca__lt=fim, nome_busca__startswith=inicio)
+
+
+# ============= ADMINS =============
+class AdminEscalavel(admin.ModelAdmin):
+    """Base das listagens: QuerySetDoAdmin, contagem limitada e busca pelo aluno em ``campo_aluno``."""
+    paginator = ContagemEstimadaPaginator
+    show_full_result_count = False
+    campo_aluno = 'aluno'
+    search_help_text = "Id do aluno ou início do nome."
+
+    def get_queryset(self, request):
+        queryset = QuerySetDoAdmin(self.model)
+        ordering = self.get_ordering(request)
+        return queryset.order_by(*ordering) if ordering else queryset
+
+    def get_search_results(self, request, queryset, search_term):
+        termo = search_term.strip()
+        if not termo:
+            return queryset, False
+        if termo.isdigit():
+            return queryset.filter(**{f'{self.campo_aluno}_id': int(termo)}), False
+        return queryset.filter(**{f'{self.campo_aluno}__in': por_nome(Usuario.objects.all(), termo)}), False
+
+
+@admin.register(Usuario)
+class UsuarioAdmin(AdminEscalavel):
+    list_display = ('id', 'nome', 'is_personal', 'sexo', 'data_inscricao')
+    search_fields = ('^nome',)  # Alvo dos autocompletes; resolvida por get_search_results
+    search_help_text = "Id ou início do nome."
+    sortable_by = ('id',)
+
+    def get_ordering(self, request):
+        # Buscando (q na listagem, term no autocomplete), na ordem do índice do nome
+        if request.GET.get(SEARCH_VAR, '').strip() or request.GET.get('term', '').strip():
+            return ['nome_busca', 'pk']
+        return ['-pk']
+
+    def get_search_results(self, request, queryset, search_term):
+        termo = search_term.strip()
+        if not termo:
+            return queryset, False
+        if termo.isdigit():
+            return queryset.filter(pk=int(termo)), False
+        return por_nome(queryset, termo), False
+
+
+@admin.register(Mensalidade)
+class MensalidadeAdmin(AdminEscalavel):
+    list_display = ('id', 'aluno', 'data_pagamento', 'validade', 'valor')
+    list_select_related = ('aluno',)
+    autocomplete_fields = ('aluno',)
+    search_fields = ('^aluno__nome',)
+    date_hierarchy = 'data_pagamento'
+    ordering = ('-data_pagamento',)
+    sortable_by = ('id', 'data_pagamento')
+
+
+@admin.register(Treino)
+class TreinoAdmin(AdminEscalavel):
+    list_display = ('id', 'nome', 'aluno', 'personal', 'data_criacao')
+    list_select_related = ('aluno', 'personal')
+    autocomplete_fields = ('aluno', 'personal')
+    search_fields = ('^aluno__nome',)
+    date_hierarchy = 'data_criacao'
+    ordering = ('-data_criacao',)
+    sortable_by = ('id', 'data_criacao')
+
+
+@admin.register(Exercicio)
+class ExercicioAdmin(AdminEscalavel):
+    list_display = ('id', 'nome', 'treino', 'series', 'repeticoes', 'carga_kg')
+    list_select_related = ('treino__aluno',)
+    raw_id_fields = ('treino',)
+    campo_aluno = 'treino__aluno'
+    search_fields = ('^treino__aluno__nome',)
+    ordering = ('-pk',)
+    sortable_by = ('id',)
+
+
+@admin.register(CheckIn)
+class CheckInAdmin(AdminEscalavel):
+    list_display = ('id', 'aluno', 'data_hora_checkin')
+    list_select_related = ('aluno',)
+    autocomplete_fields = ('aluno',)
+    search_fields = ('^aluno__nome',)
+    date_hierarchy = 'data_hora_checkin'
+    ordering = ('-data_hora_checkin',)
+    sortable_by = ('id', 'data_hora_checkin')
+
+    # Os rollups de ocupação e frequência só acompanham inserções (gym/signals.py)
+    def has_change_permission(self, request, obj=None):
+        return False
 
-admin.site.register(Usuario)
-admin.site.register(Mensalidade)
-admin.site.register(Treino)
-admin.site.register(Exercicio)
+    def has_delete_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,54 @@
+"""
+Log de alterações (``Alteracao``) lido pela sincronização incremental (``gym/sync.py``).
+
+As entradas são gravadas na mesma transação da alteração, pelos sinais e
+pelas gravações em lote: um rollback leva junto a entrada. A poda remove as
+entradas com mais de ``SYNC_RETENCAO_DIAS``.
+"""
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import Max, Q
+from django.utils import timezone
+from .models import Alteracao, Treino, Exercicio, Mensalidade
+
+USUARIO, TREINO, EXERCICIO, MENSALIDADE = 'usuario', 'treino', 'exercicio', 'mensalidade'
+
+
+# ============= REGISTRO =============
+def registrar(modelo, objetos, excluido=False):
+    """Acrescenta ao log ``[(objeto_id, aluno_id)]`` de um modelo."""
+    agora = timezone.now()
+    Alteracao.objects.bulk_create([
+        Alteracao(modelo=modelo, objeto_id=objeto_id, aluno_id=aluno_id, excluido=excluido, criado_em=agora)
+        for objeto_id, aluno_id in objetos
+    ])
+
+
+def registrar_exercicios(treino_ids, excluido=False, aluno_id=None):
+    """Registra os exercícios dos treinos, com o aluno atual do treino ou ``aluno_id``."""
+    exercicios = Exercicio.objects.filter(treino_id__in=treino_ids)
+    if aluno_id is None:
+        linhas = exercicios.values_list('id', 'treino__aluno_id')
+    else:
+        linhas = ((exercicio_id, aluno_id) for exercicio_id in exercicios.values_list('id', flat=True))
+    registrar(EXERCICIO, list(linhas), excluido)
+
+
+def registrar_exibicoes_do_nome(usuario_id):
+    """Treinos e mensalidades que mostram o nome do usuário (como aluno ou personal)."""
+    treinos = Treino.objects.filter(Q(aluno_id=usuario_id) | Q(personal_id=usuario_id))
+    registrar(TREINO, list(treinos.values_list('id', 'aluno_id')))
+    registrar(MENSALIDADE, list(Mensalidade.objects.filter(aluno_id=usuario_id).values_list('id', 'aluno_id')))
+
+
+# ============= PODA =============
+def podar(dias=None):
+    """Remove as entradas do log mais antigas que ``dias``; a última entrada sempre fica."""
+    dias = dias if dias is not None else settings.SYNC_RETENCAO_DIAS
+    ultimo = Alteracao.objects.aggregate(ultimo=Max('id'))['ultimo']
+    if ultimo is None:
+        return 0
+    removidas, _ = Alteracao.objects.filter(
+        criado_em__lt=timezone.now() - timedelta(days=dias), id__lt=ultimo
+    ).delete()
+    return removidas
@@ -0,0 +1,166 @@
+"""
+Arquivamento mensal dos check-ins antigos.
+
+A tabela de CheckIn guarda só os meses recentes (``CHECKIN_RETENCAO_MESES``,
+contando o mês corrente): as consultas por período percorrem o índice de
+``data_hora_checkin`` sobre uma tabela de tamanho limitado. Os meses mais
+antigos são movidos pelo comando ``arquivar_checkins`` para ``ArquivoCheckIn``,
+uma linha por mês com os check-ins em colunas:
+
+- ``alunos``: ids dos alunos, na ordem dos horários;
+- ``instantes``: segundos desde o início do mês (epoch), em deltas crescentes;
+
+ambos como arrays de inteiros de 64 bits (little-endian) comprimidos com
+zlib. ``total`` e ``alunos_distintos`` ficam em colunas comuns, e os rollups
+de ocupação e frequência não são tocados: as consultas analíticas continuam
+iguais para meses arquivados. Check-ins que chegarem depois (ingestão em lote
+de eventos antigos) entram na tabela quente e são mesclados ao arquivo do mês
+na próxima execução.
+
+O arquivo guarda o histórico como foi: os ids de alunos excluídos depois
+continuam nas colunas.
+"""
+import sys
+import zlib
+from array import array
+from datetime import datetime, time, timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Min, Sum
+from django.utils import timezone
+from .models import CheckIn, ArquivoCheckIn
+
+TIPO = 'q'
+TAMANHO_BLOCO = 10000
+TAMANHO_LOTE_EXCLUSAO = 500  # Ids por DELETE ... WHERE id IN (...)
+
+
+# ============= MESES =============
+def proximo_mes(mes):
+    return (mes.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def limites_do_mes(mes):
+    """Início do mês e do mês seguinte, como datetimes locais."""
+    return (
+        timezone.make_aware(datetime.combine(mes, time.min)),
+        timezone.make_aware(datetime.combine(proximo_mes(mes), time.min)),
+    )
+
+
+def limite_de_retencao(hoje=None, meses=None):
+    """Primeiro mês mantido na tabela quente; os anteriores são arquivados."""
+    meses = max(meses if meses is not None else settings.CHECKIN_RETENCAO_MESES, 1)
+    mes = (hoje or timezone.localdate()).replace(day=1)
+    for _ in range(meses - 1):
+        mes = (mes - timedelta(days=1)).replace(day=1)
+    return mes
+
+
+# ============= CODIFICAÇÃO =============
+def comprimir(valores):
+    colunas = array(TIPO, valores)
+    if sys.byteorder == 'big':
+        colunas.byteswap()
+    return zlib.compress(colunas.tobytes())
+
+
+def descomprimir(dados):
+    colunas = array(TIPO)
+    colunas.frombytes(zlib.decompress(dados))
+    if sys.byteorder == 'big':
+        colunas.byteswap()
+    return colunas
+
+
+def codificar(alunos, instantes, base):
+    """``(alunos, instantes)`` comprimidos; ``instantes`` em epoch, já ordenados."""
+    deltas = array(TIPO)
+    anterior = base
+    for instante in instantes:
+        deltas.append(instante - anterior)
+        anterior = instante
+    return comprimir(alunos), comprimir(deltas)
+
+
+def decodificar(arquivo):
+    """``(alunos, instantes)`` de um mês arquivado, com ``instantes`` em epoch."""
+    alunos = descomprimir(arquivo.alunos)
+    instantes = array(TIPO)
+    atual = int(limites_do_mes(arquivo.mes)[0].timestamp())
+    for delta in descomprimir(arquivo.instantes):
+        atual += delta
+        instantes.append(atual)
+    return alunos, instantes
+
+
+def registros(de, ate):
+    """``(aluno_id, data_hora)`` dos check-ins arquivados em ``[de, ate)``."""
+    inicio, fim = int(de.timestamp()), int(ate.timestamp())
+    meses = ArquivoCheckIn.objects.filter(
+        mes__gte=timezone.localtime(de).date().replace(day=1), mes__lt=timezone.localtime(ate).date()
+    ).order_by('mes')
+    for arquivo in meses.iterator(chunk_size=1):
+        for aluno_id, instante in zip(*decodificar(arquivo)):
+            if inicio <= instante < fim:
+                yield aluno_id, datetime.fromtimestamp(instante, tz=timezone.get_current_timezone())
+
+
+# ============= ARQUIVAMENTO =============
+def arquivar_mes(mes):
+    """Move os check-ins do mês da tabela quente para o arquivo; devolve quantos foram movidos."""
+    de, ate = limites_do_mes(mes)
+    quentes = CheckIn.objects.filter(data_hora_checkin__gte=de, data_hora_checkin__lt=ate)
+    with transaction.atomic():
+        ids, alunos, instantes = array(TIPO), array(TIPO), array(TIPO)
+        linhas = quentes.order_by('data_hora_checkin', 'id').values_list('id', 'aluno_id', 'data_hora_checkin')
+        for checkin_id, aluno_id, data_hora in linhas.iterator(chunk_size=TAMANHO_BLOCO):
+            ids.append(checkin_id)
+            alunos.append(aluno_id)
+            instantes.append(int(data_hora.timestamp()))
+        movidos = len(alunos)
+        if not movidos:
+            return 0
+
+        arquivo = ArquivoCheckIn.objects.select_for_update().filter(mes=mes).first() or ArquivoCheckIn(mes=mes)
+        if arquivo.pk:
+            # Eventos que chegaram depois do arquivamento: mescla pelo horário
+            antigos_alunos, antigos_instantes = decodificar(arquivo)
+            pares = sorted([*zip(antigos_instantes, antigos_alunos), *zip(instantes, alunos)])
+            instantes = array(TIPO, (instante for instante, _ in pares))
+            alunos = array(TIPO, (aluno_id for _, aluno_id in pares))
+
+        arquivo.alunos, arquivo.instantes = codificar(alunos, instantes, int(de.timestamp()))
+        arquivo.total = len(alunos)
+        arquivo.alunos_distintos = len(set(alunos))
+        arquivo.save()
+        # Só as linhas lidas: no READ COMMITTED do PostgreSQL, refazer o filtro
+        # apagaria check-ins confirmados depois da leitura sem arquivá-los
+        for inicio in range(0, movidos, TAMANHO_LOTE_EXCLUSAO):
+            CheckIn.objects.filter(pk__in=ids[inicio:inicio + TAMANHO_LOTE_EXCLUSAO].tolist()).delete()
+    return movidos
+
+
+def arquivar(retencao=None, hoje=None, log=None):
+    """Arquiva, mês a mês, os check-ins anteriores à janela de retenção. Devolve ``[(mes, movidos)]``."""
+    log = log or (lambda mensagem: None)
+    limite = limite_de_retencao(hoje, retencao)
+    primeiro = CheckIn.objects.filter(
+        data_hora_checkin__lt=limites_do_mes(limite)[0]
+    ).aggregate(primeiro=Min('data_hora_checkin'))['primeiro']
+    if primeiro is None:
+        return []
+
+    resultado = []
+    mes = timezone.localtime(primeiro).date().replace(day=1)
+    while mes < limite:
+        movidos = arquivar_mes(mes)
+        if movidos:
+            log(f"{mes:%Y-%m}: {movidos} check-ins arquivados")
+            resultado.append((mes, movidos))
+        mes = proximo_mes(mes)
+    return resultado
+
+
+def total_arquivado():
+    return ArquivoCheckIn.objects.aggregate(total=Sum('total'))['total'] or 0
@@ -0,0 +1,411 @@
+"""
+Benchmark de latência da API da academia.
+
+Gera uma massa sintética reproduzível (semente fixa) em escala configurável,
+exercita todas as rotas de ``gym/urls.py`` com o cliente de testes do Django
+e coleta, por rota, percentis de latência e número de consultas SQL. O
+resultado é um dicionário serializável em JSON que pode ser comparado com
+uma linha de base gravada anteriormente (ver comando ``benchmark_api``).
+"""
+import asyncio
+import json
+import math
+import platform
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.db import connection, connections
+from django.db.models import Max
+from django.test import AsyncClient, Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from . import arquivamento, busca, elegibilidade, estatisticas, ocupacao, ranking
+from .models import Usuario, Mensalidade, ResumoMensalidade, Treino, Exercicio, CheckIn, Alteracao
+
+# Volume de referência (escala 1.0)
+VOLUME_BASE = {
+    'usuarios': 100_000,
+    'mensalidades': 1_000_000,
+    'treinos': 500_000,
+    'exercicios': 5_000_000,
+    'checkins': 10_000_000,
+}
+
+NOMES_EXERCICIOS = [
+    "Agachamento", "Supino reto", "Supino inclinado", "Levantamento terra", "Remada curvada",
+    "Puxada frontal", "Desenvolvimento", "Elevação lateral", "Rosca direta", "Rosca martelo",
+    "Tríceps testa", "Tríceps corda", "Leg press", "Cadeira extensora", "Mesa flexora",
+    "Stiff", "Afundo", "Panturrilha em pé", "Abdominal", "Prancha",
+]
+
+
+def volumes(escala):
+    return {tabela: max(1, int(total * escala)) for tabela, total in VOLUME_BASE.items()}
+
+
+def gravar_em_blocos(model, objetos, batch_size):
+    """Grava um gerador de instâncias em blocos, sem materializar tudo em memória."""
+    bloco = []
+    for objeto in objetos:
+        bloco.append(objeto)
+        if len(bloco) >= batch_size:
+            model.objects.bulk_create(bloco)
+            bloco = []
+    if bloco:
+        model.objects.bulk_create(bloco)
+
+
+def gerar_dados(escala=0.01, semente=42, batch_size=5000, log=None):
+    """
+    Popula o banco com dados sintéticos e reconstrói as tabelas derivadas
+    (resumo de mensalidades, ranking, rollups, índice de busca e contadores do
+    dashboard).
+    """
+    log = log or (lambda mensagem: None)
+    rng = random.Random(semente)
+    total = volumes(escala)
+    hoje = date.today()
+    agora = timezone.now()
+
+    log(f"Usuários: {total['usuarios']}")
+    gravar_em_blocos(Usuario, (
+        Usuario(
+            nome=f"Usuário {i}",
+            data_nascimento=hoje - timedelta(days=rng.randint(16 * 365, 70 * 365)),
+            sexo=rng.choice('MF'),
+            is_personal=rng.random() < 0.05,
+        )
+        for i in range(total['usuarios'])
+    ), batch_size)
+    usuarios = list(Usuario.objects.values_list('id', 'is_personal'))
+    alunos = [usuario_id for usuario_id, is_personal in usuarios if not is_personal]
+    personals = [usuario_id for usuario_id, is_personal in usuarios if is_personal] or alunos[:1]
+
+    def mensalidades():
+        for _ in range(total['mensalidades']):
+            pagamento = hoje - timedelta(days=rng.randint(0, 3 * 365))
+            yield Mensalidade(
+                aluno_id=rng.choice(alunos),
+                data_pagamento=pagamento,
+                validade=pagamento + timedelta(days=30),
+                valor=Decimal('99.90'),
+            )
+
+    log(f"Mensalidades: {total['mensalidades']}")
+    gravar_em_blocos(Mensalidade, mensalidades(), batch_size)
+
+    log(f"Treinos: {total['treinos']}")
+    gravar_em_blocos(Treino, (
+        Treino(
+            aluno_id=rng.choice(alunos),
+            personal_id=rng.choice(personals) if rng.random() < 0.8 else None,
+            nome=f"Treino {rng.choice('ABCDE')}",
+            descricao="Gerado pelo benchmark",
+        )
+        for _ in range(total['treinos'])
+    ), batch_size)
+    treinos = list(Treino.objects.values_list('id', flat=True))
+
+    log(f"Exercícios: {total['exercicios']}")
+    gravar_em_blocos(Exercicio, (
+        Exercicio(
+            treino_id=rng.choice(treinos),
+            nome=rng.choice(NOMES_EXERCICIOS),
+            series=rng.randint(2, 5),
+            repeticoes=rng.choice([6, 8, 10, 12, 15]),
+            carga_kg=round(rng.uniform(5, 150), 1) if rng.random() < 0.9 else None,
+        )
+        for _ in range(total['exercicios'])
+    ), batch_size)
+
+    log(f"Check-ins: {total['checkins']}")
+    gravar_em_blocos(CheckIn, (
+        CheckIn(
+            aluno_id=rng.choice(alunos),
+            data_hora_checkin=agora - timedelta(days=rng.randint(0, 364), minutes=rng.randint(0, 16 * 60)),
+        )
+        for _ in range(total['checkins'])
+    ), batch_size)
+
+    log("Tabelas derivadas")
+    ResumoMensalidade.objects.reconstruir(batch_size=batch_size)
+    ranking.reconstruir(batch_size=batch_size)
+    ocupacao.recompactar(hoje - timedelta(days=365), hoje, batch_size=batch_size)
+    busca.reconstruir(batch_size=batch_size)
+    elegibilidade.limpar()
+    estatisticas.reconciliar()
+    return total
+
+
+def amostras():
+    """Ids representativos para preencher os parâmetros das rotas."""
+    aluno_ativo = (
+        ResumoMensalidade.objects.filter(ativa=True, aluno__is_personal=False)
+        .values_list('aluno_id', flat=True).first()
+    )
+    treino = Treino.objects.filter(personal__isnull=False).order_by('id').values('id', 'aluno_id', 'personal_id').first()
+    return {
+        'aluno': aluno_ativo or Usuario.objects.filter(is_personal=False).values_list('id', flat=True).first(),
+        'personal': treino['personal_id'] if treino else Usuario.objects.filter(is_personal=True).values_list('id', flat=True).first(),
+        'treino': treino['id'] if treino else None,
+        'aluno_do_treino': treino['aluno_id'] if treino else None,
+        'mensalidade': Mensalidade.objects.values_list('id', flat=True).first(),
+        'exercicio': Exercicio.objects.values_list('id', flat=True).first(),
+        'cursor_sync': Alteracao.objects.aggregate(ultimo=Max('id'))['ultimo'] or 0,
+    }
+
+
+def rotas(ids):
+    """Uma ou mais requisições por rota de ``gym/urls.py``."""
+    pagina = {'page_size': 50}
+    treino_completo = {
+        'aluno': ids['aluno_do_treino'],
+        'personal': ids['personal'],
+        'nome': "Treino benchmark",
+        'exercicios': [{'nome': nome, 'series': 3, 'repeticoes': 10, 'carga_kg': 20} for nome in NOMES_EXERCICIOS[:12]],
+    }
+    agora = timezone.now().isoformat()
+    return [
+        {'rota': 'usuario-list-create', 'params': pagina},
+        {'rota': 'usuario-detail', 'kwargs': {'pk': ids['aluno']}},
+        {'rota': 'mensalidade-list-create', 'params': {**pagina, 'aluno': ids['aluno']}},
+        {'rota': 'mensalidade-detail', 'kwargs': {'pk': ids['mensalidade']}},
+        {'rota': 'mensalidade-vencendo', 'params': {'dias': 7}},
+        {'rota': 'treino-list-create', 'params': {**pagina, 'personal': ids['personal']}},
+        {
+            'rota': 'treino-list-create', 'nome': 'GET treino-list-create?fields=id,nome',
+            'params': {**pagina, 'personal': ids['personal'], 'fields': 'id,nome'},
+        },
+        {'rota': 'treino-detail', 'kwargs': {'pk': ids['treino']}},
+        {'rota': 'treino-completo-create', 'metodo': 'post', 'corpo': treino_completo},
+        {'rota': 'treino-completo-update', 'metodo': 'put', 'kwargs': {'pk': ids['treino']}, 'corpo': treino_completo},
+        {'rota': 'treino-busca', 'params': {'q': 'agach'}},
+        {'rota': 'treino-volume', 'kwargs': {'pk': ids['treino']}},
+        {'rota': 'exercicio-list-create', 'params': {**pagina, 'treino': ids['treino']}},
+        {'rota': 'exercicio-detail', 'kwargs': {'pk': ids['exercicio']}},
+        {'rota': 'alunos-personal', 'kwargs': {'personal_id': ids['personal']}, 'params': {**pagina, 'estatisticas': '1'}},
+        {'rota': 'status-mensalidade', 'kwargs': {'aluno_id': ids['aluno']}},
+        {'rota': 'dashboard-stats'},
+        {'rota': 'personal-mais-popular'},
+        {'rota': 'personal-ranking', 'params': {'top': 10}},
+        {'rota': 'aluno-checkin', 'metodo': 'post', 'kwargs': {'aluno_id': ids['aluno']}},
+        {'rota': 'checkin-elegibilidade', 'admin': True},
+        {'rota': 'checkin-bulk', 'metodo': 'post', 'corpo': [{'aluno_id': ids['aluno'], 'timestamp': agora}] * 100},
+        {'rota': 'checkin-ocupacao'},
+        {'rota': 'checkin-picos'},
+        {'rota': 'aluno-frequencia', 'kwargs': {'aluno_id': ids['aluno']}},
+        {'rota': 'aluno-volume', 'kwargs': {'aluno_id': ids['aluno_do_treino']}},
+        {'rota': 'financeiro-receita', 'params': {'por_aluno': 10}},
+        {'rota': 'financeiro-export-csv', 'params': {'inicio': (date.today() - timedelta(days=30)).isoformat()}},
+        {'rota': 'sync', 'nome': 'GET sync (retrato)', 'params': {'aluno': ids['aluno_do_treino']}},
+        {'rota': 'sync', 'params': {'aluno': ids['aluno_do_treino'], 'since': ids['cursor_sync']}},
+        {'rota': 'async-usuario-list', 'params': {'is_personal': 'true'}},
+        {'rota': 'async-mensalidade-list', 'params': {'aluno': ids['aluno']}},
+        {'rota': 'async-treino-list', 'params': {'personal': ids['personal']}},
+        {'rota': 'async-exercicio-list', 'params': {'treino': ids['treino']}},
+        {'rota': 'async-status-mensalidade', 'kwargs': {'aluno_id': ids['aluno']}},
+        {'rota': 'async-dashboard-stats'},
+        {'rota': 'async-aluno-checkin', 'metodo': 'post', 'kwargs': {'aluno_id': ids['aluno']}},
+    ]
+
+
+def pares_wsgi_asgi(ids):
+    """Pares (rota síncrona, versão assíncrona) com os mesmos parâmetros."""
+    pares = [
+        ('usuario-list-create', 'async-usuario-list', {}, {'is_personal': 'true'}),
+        ('mensalidade-list-create', 'async-mensalidade-list', {}, {'aluno': ids['aluno']}),
+        ('treino-list-create', 'async-treino-list', {}, {'personal': ids['personal']}),
+        ('status-mensalidade', 'async-status-mensalidade', {'aluno_id': ids['aluno']}, None),
+        ('dashboard-stats', 'async-dashboard-stats', {}, None),
+    ]
+    return [
+        ({'rota': sincrona, 'kwargs': kwargs, 'params': params}, {'rota': assincrona, 'kwargs': kwargs, 'params': params})
+        for sincrona, assincrona, kwargs, params in pares
+    ]
+
+
+def percentil(valores, p):
+    """Percentil pelo método do posto mais próximo."""
+    ordenados = sorted(valores)
+    return ordenados[max(0, math.ceil(p / 100 * len(ordenados)) - 1)]
+
+
+def requisitar(client, rota):
+    url = reverse(rota['rota'], kwargs=rota.get('kwargs'))
+    metodo = rota.get('metodo', 'get')
+    if metodo == 'get':
+        return client.get(url, rota.get('params'))
+    return getattr(client, metodo)(url, json.dumps(rota.get('corpo', {})), content_type='application/json')
+
+
+def medir(rotas_para_medir, repeticoes=30, aquecimento=2, client=None):
+    """Executa cada rota ``repeticoes`` vezes e resume latência e consultas."""
+    client = client or Client()
+    administrador = None
+    resultados = {}
+    for rota in rotas_para_medir:
+        nome = rota.get('nome') or f"{rota.get('metodo', 'get').upper()} {rota['rota']}"
+        cliente = client
+        if rota.get('admin'):
+            # Rotas restritas: sessão de um staff, num cliente à parte
+            if administrador is None:
+                administrador = Client()
+                administrador.force_login(
+                    User.objects.get_or_create(username='benchmark', defaults={'is_staff': True})[0]
+                )
+            cliente = administrador
+        for _ in range(aquecimento):
+            requisitar(cliente, rota)
+
+        latencias, consultas, codigos = [], [], set()
+        tamanho = 0
+        for _ in range(repeticoes):
+            with CaptureQueriesContext(connection) as ctx:
+                inicio = time.perf_counter()
+                response = requisitar(cliente, rota)
+                if getattr(response, 'streaming', False):
+                    tamanho = len(b''.join(response.streaming_content))
+                else:
+                    tamanho = len(response.content)
+                latencias.append((time.perf_counter() - inicio) * 1000)
+            consultas.append(len(ctx.captured_queries))
+            codigos.add(response.status_code)
+
+        resultados[nome] = {
+            'p50_ms': round(percentil(latencias, 50), 3),
+            'p95_ms': round(percentil(latencias, 95), 3),
+            'p99_ms': round(percentil(latencias, 99), 3),
+            'max_ms': round(max(latencias), 3),
+            'consultas': max(consultas),
+            'bytes': tamanho,
+            'status': sorted(codigos),
+        }
+    return resultados
+
+
+def vazao_wsgi(rota, requisicoes, concorrencia):
+    """Requisições por segundo pelo handler WSGI, com ``concorrencia`` threads."""
+    def trabalhador(quantidade):
+        client = Client()
+        try:
+            for _ in range(quantidade):
+                requisitar(client, rota)
+        finally:
+            if concorrencia > 1:
+                connections.close_all()
+
+    cotas = [requisicoes // concorrencia + (i < requisicoes % concorrencia) for i in range(concorrencia)]
+    inicio = time.perf_counter()
+    if concorrencia == 1:
+        trabalhador(requisicoes)
+    else:
+        with ThreadPoolExecutor(concorrencia) as executor:
+            list(executor.map(trabalhador, cotas))
+    return requisicoes / (time.perf_counter() - inicio)
+
+
+def vazao_asgi(rota, requisicoes, concorrencia):
+    """Requisições por segundo pelo handler ASGI, com ``concorrencia`` requisições em voo."""
+    url = reverse(rota['rota'], kwargs=rota.get('kwargs'))
+
+    async def rodar():
+        client = AsyncClient()
+        limite = asyncio.Semaphore(concorrencia)
+
+        async def uma():
+            async with limite:
+                await client.get(url, rota.get('params'))
+
+        inicio = time.perf_counter()
+        await asyncio.gather(*(uma() for _ in range(requisicoes)))
+        return requisicoes / (time.perf_counter() - inicio)
+
+    return async_to_sync(rodar)()
+
+
+def comparar_vazao(requisicoes=200, concorrencia=8):
+    """
+    Vazão das rotas de leitura síncronas (WSGI) contra as versões assíncronas
+    (ASGI). O handler ASGI é o mesmo que o uvicorn executa em
+    ``core.asgi:application``; aqui fica de fora apenas a camada de socket.
+    """
+    resultados = {}
+    for sincrona, assincrona in pares_wsgi_asgi(amostras()):
+        wsgi = vazao_wsgi(sincrona, requisicoes, concorrencia)
+        asgi = vazao_asgi(assincrona, requisicoes, concorrencia)
+        resultados[sincrona['rota']] = {
+            'wsgi_req_s': round(wsgi, 1),
+            'asgi_req_s': round(asgi, 1),
+            'razao_asgi_wsgi': round(asgi / wsgi, 3),
+        }
+    return resultados
+
+
+def comparar_serializacao(repeticoes=5, linhas=2000):
+    """
+    Tempo de montar as listagens (consultas incluídas) com os serializers do
+    DRF e com a leitura rápida (``gym/leitura.py``), sobre as mesmas
+    ``linhas`` primeiras linhas de cada view.
+    """
+    from .views import UsuarioListCreateView, MensalidadeListCreateView, TreinoListCreateView, ExercicioListCreateView
+
+    def tempo(funcao):
+        medidas = []
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            funcao()
+            medidas.append((time.perf_counter() - inicio) * 1000)
+        return percentil(medidas, 50)
+
+    resultados = {}
+    for view in (UsuarioListCreateView, MensalidadeListCreateView, TreinoListCreateView, ExercicioListCreateView):
+        queryset = view.queryset.order_by(*view.pagination_class.ordering)[:linhas]
+        serializer_class = view.leitura_rapida.serializer_class
+        drf = tempo(lambda: serializer_class(queryset.all(), many=True).data)
+        rapida = tempo(lambda: view.leitura_rapida.representar(view.leitura_rapida.valores(queryset.all())))
+        resultados[serializer_class.__name__] = {
+            'linhas': len(queryset),
+            'drf_ms': round(drf, 3),
+            'leitura_rapida_ms': round(rapida, 3),
+            'aceleracao': round(drf / rapida, 2) if rapida else None,
+        }
+    return resultados
+
+
+def executar(repeticoes=30, aquecimento=2):
+    """Mede todas as rotas e devolve o relatório completo, pronto para JSON."""
+    return {
+        'gerado_em': datetime.now().isoformat(timespec='seconds'),
+        'ambiente': {
+            'python': platform.python_version(),
+            'banco': connection.vendor,
+            'usuarios': Usuario.objects.count(),
+            'checkins': CheckIn.objects.count(),
+            'checkins_arquivados': arquivamento.total_arquivado(),
+        },
+        'repeticoes': repeticoes,
+        'rotas': medir(rotas(amostras()), repeticoes, aquecimento),
+    }
+
+
+def comparar(atual, base, limite=1.2, folga_ms=1.0):
+    """
+    Lista as regressões do relatório ``atual`` em relação à ``base``: p99 acima
+    de ``limite`` vezes o da base (com ``folga_ms`` de tolerância para rotas
+    muito rápidas) ou mais consultas SQL que antes.
+    """
+    regressoes = []
+    for nome, medida in atual['rotas'].items():
+        anterior = base.get('rotas', {}).get(nome)
+        if anterior is None:
+            continue
+        if medida['p99_ms'] > anterior['p99_ms'] * limite + folga_ms:
+            regressoes.append(f"{nome}: p99 {anterior['p99_ms']}ms -> {medida['p99_ms']}ms")
+        if medida['consultas'] > anterior['consultas']:
+            regressoes.append(f"{nome}: consultas {anterior['consultas']} -> {medida['consultas']}")
+    return regressoes
@@ -0,0 +1,155 @@
+"""
+Busca textual de treinos por nome, descrição e nomes dos exercícios.
+
+Cada treino é um documento num índice invertido mantido ao lado das tabelas:
+
+- SQLite: tabela virtual FTS5 ``gym_busca_treino`` (``rowid`` = id do
+  treino, tokenizador ``unicode61 remove_diacritics 2`` e índices de
+  prefixo de 2 e 3 letras), ordenada por ``bm25``;
+- PostgreSQL: tabela ``gym_busca_treino`` com uma coluna ``tsvector`` sob
+  índice GIN, ordenada por ``ts_rank``.
+
+O texto é normalizado antes de indexar e buscar (minúsculas e sem acentos),
+então "agachamento" encontra "Agachamento" e "Agachaménto" da mesma forma nos
+dois bancos; cada termo da busca é um prefixo ("agach" encontra
+"agachamento") e todos precisam aparecer no treino. Em outros bancos a busca
+recorre a ``icontains``, sem índice.
+
+Os documentos são recalculados por ``indexar`` (idempotente) a partir dos
+sinais de Treino e Exercicio e das gravações em lote; ``reconstruir``
+refaz o índice inteiro (comando ``reindexar_busca``).
+"""
+import re
+import unicodedata
+from itertools import islice
+from django.db import connections, router
+from django.db.models import Q
+from .models import Treino, Exercicio
+
+TABELA = 'gym_busca_treino'
+MAX_TERMOS = 8
+PESOS = (10.0, 1.0, 5.0)  # nome, descrição, exercícios
+
+
+def normalizar(texto):
+    decomposto = unicodedata.normalize('NFKD', (texto or '').lower())
+    return ''.join(caractere for caractere in decomposto if not unicodedata.combining(caractere))
+
+
+def termos(busca):
+    return re.findall(r'\w+', normalizar(busca))[:MAX_TERMOS]
+
+
+# ============= DDL (usado pela migração) =============
+def criar_indice(schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {TABELA} USING fts5("
+            "nome, descricao, exercicios, "
+            "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+        )
+    elif vendor == 'postgresql':
+        schema_editor.execute(f"CREATE TABLE {TABELA} (treino_id bigint PRIMARY KEY, documento tsvector NOT NULL)")
+        schema_editor.execute(f"CREATE INDEX {TABELA}_documento_idx ON {TABELA} USING gin (documento)")
+
+
+def remover_indice(schema_editor):
+    if schema_editor.connection.vendor in ('sqlite', 'postgresql'):
+        schema_editor.execute(f"DROP TABLE IF EXISTS {TABELA}")
+
+
+def suportada(connection):
+    return connection.vendor in ('sqlite', 'postgresql')
+
+
+# ============= INDEXAÇÃO =============
+def documentos(treino_ids, using):
+    """``{treino_id: (nome, descricao, exercicios)}`` normalizados, em duas consultas."""
+    docs = {
+        treino_id: [normalizar(nome), normalizar(descricao), []]
+        for treino_id, nome, descricao in
+        Treino.objects.using(using).filter(id__in=treino_ids).values_list('id', 'nome', 'descricao')
+    }
+    exercicios = Exercicio.objects.using(using).filter(treino_id__in=list(docs)).order_by('treino_id', 'id')
+    for treino_id, nome in exercicios.values_list('treino_id', 'nome'):
+        docs[treino_id][2].append(normalizar(nome))
+    return {treino_id: (nome, descricao, ' '.join(nomes)) for treino_id, (nome, descricao, nomes) in docs.items()}
+
+
+def indexar(treino_ids, using=None):
+    """Recalcula os documentos dos treinos; os que não existem mais saem do índice."""
+    treino_ids = list(treino_ids)
+    using = using or router.db_for_write(Treino)
+    connection = connections[using]
+    if not treino_ids or not suportada(connection):
+        return
+    docs = documentos(treino_ids, using)
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(
+                f"DELETE FROM {TABELA} WHERE rowid IN ({', '.join(['%s'] * len(treino_ids))})", treino_ids
+            )
+            cursor.executemany(
+                f"INSERT INTO {TABELA} (rowid, nome, descricao, exercicios) VALUES (%s, %s, %s, %s)",
+                [(treino_id, *doc) for treino_id, doc in docs.items()]
+            )
+        else:
+            cursor.execute(f"DELETE FROM {TABELA} WHERE treino_id = ANY(%s)", [treino_ids])
+            cursor.executemany(
+                f"INSERT INTO {TABELA} (treino_id, documento) VALUES (%s, "
+                "setweight(to_tsvector('simple', %s), 'A') || "
+                "setweight(to_tsvector('simple', %s), 'C') || "
+                "setweight(to_tsvector('simple', %s), 'B'))",
+                [(treino_id, *doc) for treino_id, doc in docs.items()]
+            )
+
+
+def reconstruir(batch_size=5000, using=None):
+    """Refaz o índice inteiro, em blocos de ``batch_size`` treinos."""
+    using = using or router.db_for_write(Treino)
+    connection = connections[using]
+    if not suportada(connection):
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABELA}")
+    total = 0
+    ids = Treino.objects.using(using).order_by('id').values_list('id', flat=True).iterator(chunk_size=batch_size)
+    while bloco := list(islice(ids, batch_size)):
+        indexar(bloco, using)
+        total += len(bloco)
+    return total
+
+
+# ============= CONSULTA =============
+def buscar(busca, limite=20):
+    """``[(treino_id, relevancia)]`` dos treinos com todos os termos, do mais relevante ao menos."""
+    lista = termos(busca)
+    if not lista:
+        return []
+    using = router.db_for_read(Treino)
+    connection = connections[using]
+    if connection.vendor == 'sqlite':
+        consulta = ' '.join(f'"{termo}"*' for termo in lista)
+        sql = (
+            f"SELECT rowid, -bm25({TABELA}, %s, %s, %s) AS relevancia FROM {TABELA} "
+            f"WHERE {TABELA} MATCH %s ORDER BY relevancia DESC, rowid LIMIT %s"
+        )
+        parametros = [*PESOS, consulta, limite]
+    elif connection.vendor == 'postgresql':
+        consulta = ' & '.join(f"{termo}:*" for termo in lista)
+        sql = (
+            f"SELECT treino_id, ts_rank(documento, to_tsquery('simple', %s)) AS relevancia FROM {TABELA} "
+            f"WHERE documento @@ to_tsquery('simple', %s) ORDER BY relevancia DESC, treino_id LIMIT %s"
+        )
+        parametros = [consulta, consulta, limite]
+    else:
+        filtro = Q()
+        for termo in lista:
+            filtro &= Q(nome__icontains=termo) | Q(descricao__icontains=termo) | Q(exercicios__nome__icontains=termo)
+        ids = Treino.objects.using(using).filter(filtro).order_by('id').values_list('id', flat=True).distinct()[:limite]
+        return [(treino_id, 0.0) for treino_id in ids]
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, parametros)
+        return cursor.fetchall()
@@ -0,0 +1,89 @@
+"""
+Ingestão de check-ins em lote, enviados pelas catracas após operarem offline.
+
+Aplica as mesmas regras de ``aluno_checkin`` com um número constante de
+consultas por bloco de alunos, independente do tamanho do lote.
+"""
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from . import ocupacao
+from .models import Usuario, CheckIn
+
+# Mantém cada IN (...) abaixo do limite de variáveis por consulta do SQLite
+TAMANHO_BLOCO = 900
+MAX_EVENTOS = 50000
+
+
+def interpretar_evento(evento):
+    """Converte ``{aluno_id, timestamp}`` em ``(aluno_id, data_hora)`` ou levanta ValueError."""
+    try:
+        aluno_id = int(evento['aluno_id'])
+        data_hora = parse_datetime(str(evento['timestamp']))
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("Evento inválido: informe aluno_id e timestamp.")
+    if data_hora is None:
+        raise ValueError("Evento inválido: timestamp fora do formato ISO 8601.")
+    if timezone.is_naive(data_hora):
+        data_hora = timezone.make_aware(data_hora)
+    return aluno_id, data_hora
+
+
+def carregar_alunos(ids):
+    """Retorna ``{aluno_id: (is_personal, validade)}`` lendo o resumo de mensalidades."""
+    ids = sorted(ids)
+    alunos = {}
+    for inicio in range(0, len(ids), TAMANHO_BLOCO):
+        linhas = (
+            Usuario.objects.filter(pk__in=ids[inicio:inicio + TAMANHO_BLOCO])
+            .values_list('id', 'is_personal', 'resumo_mensalidade__validade')
+        )
+        for aluno_id, is_personal, validade in linhas:
+            alunos[aluno_id] = (is_personal, validade)
+    return alunos
+
+
+def registrar_em_lote(eventos):
+    """
+    Valida e grava uma lista de eventos de check-in.
+
+    A mensalidade é comparada com a data do próprio evento, já que as catracas
+    podem enviar eventos de dias anteriores. Retorna um resultado por evento,
+    na mesma ordem, com o status HTTP que ``aluno_checkin`` daria a ele.
+    """
+    resultados = []
+    validos = []
+    for indice, evento in enumerate(eventos):
+        try:
+            aluno_id, data_hora = interpretar_evento(evento)
+        except ValueError as exc:
+            resultados.append({'indice': indice, 'status': 400, 'error': str(exc)})
+            continue
+        resultados.append({'indice': indice, 'aluno_id': aluno_id})
+        validos.append((indice, aluno_id, data_hora))
+
+    alunos = carregar_alunos({aluno_id for _, aluno_id, _ in validos})
+
+    novos = []
+    for indice, aluno_id, data_hora in validos:
+        resultado = resultados[indice]
+        if aluno_id not in alunos:
+            resultado.update(status=404, error="Aluno não encontrado.")
+            continue
+        is_personal, validade = alunos[aluno_id]
+        if is_personal:
+            resultado.update(status=400, error="Apenas alunos podem fazer check-in.")
+        elif validade is None:
+            resultado.update(status=403, error="Aluno não possui mensalidade registrada.")
+        elif validade < timezone.localdate(data_hora):
+            resultado.update(status=403, error="Mensalidade inativa. Verifique sua assinatura.")
+        else:
+            resultado['status'] = 201
+            novos.append(CheckIn(aluno_id=aluno_id, data_hora_checkin=data_hora))
+
+    with transaction.atomic():
+        CheckIn.objects.bulk_create(novos, batch_size=TAMANHO_BLOCO)
+        # bulk_create não dispara sinais: os rollups são atualizados aqui
+        ocupacao.acumular((checkin.aluno_id, checkin.data_hora_checkin) for checkin in novos)
+
+    return resultados
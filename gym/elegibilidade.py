@@ -0,0 +1,260 @@
+"""
+Cache da elegibilidade de check-in por aluno.
+
+O check-in individual só precisa saber se o usuário é aluno, o seu nome e se
+a mensalidade está ativa (``ResumoMensalidade.ativa``). Esses dados ficam num
+cache por aluno, de modo que, em regime, um check-in na catraca faz apenas as
+gravações (o CheckIn e os rollups de ocupação).
+
+Dois modos, escolhidos por ``ELEGIBILIDADE_CACHE``:
+
+- ``local`` (padrão): LRU em memória, por processo, limitado a
+  ``ELEGIBILIDADE_CACHE_TAMANHO`` alunos;
+- ``compartilhado``: o cache do Django (ex.: Redis/Memcached), para vários
+  workers, com as chaves sob uma versão global que ``limpar`` incrementa e
+  uma geração por aluno que ``descartar`` troca.
+
+Em ambos as entradas expiram após ``ELEGIBILIDADE_CACHE_TTL`` segundos e na
+virada do dia. Os sinais de Usuario e Mensalidade descartam a entrada do
+aluno na hora e de novo após o commit; atualizações em lote
+(``vencimentos.processar``, reconstrução do resumo, importação) limpam tudo.
+No modo ``local`` a limpeza feita por um comando (outro processo) não chega
+aos workers: lá a defasagem fica limitada pelo TTL.
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict, namedtuple
+from datetime import date
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from .models import Usuario
+
+Elegibilidade = namedtuple('Elegibilidade', 'is_personal nome ativa')  # ativa é None sem mensalidade
+
+
+class Contadores:
+    def __init__(self):
+        self.acertos = self.faltas = self.expiradas = self.invalidacoes = self.descartadas = 0
+
+    def resumo(self):
+        consultas = self.acertos + self.faltas
+        return {
+            'acertos': self.acertos,
+            'faltas': self.faltas,
+            'taxa_de_acerto': round(self.acertos / consultas, 4) if consultas else None,
+            'expiradas': self.expiradas,
+            'invalidacoes': self.invalidacoes,
+            'descartadas_por_tamanho': self.descartadas,
+        }
+
+
+class CacheLocal:
+    """
+    LRU por processo. ``geracao`` muda a cada invalidação: um valor lido do
+    banco antes dela não é guardado, mesmo que a gravação chegue depois.
+    """
+    modo = 'local'
+
+    def __init__(self, tamanho, ttl):
+        self.tamanho = tamanho
+        self.ttl = ttl
+        self.itens = OrderedDict()
+        self.lock = threading.Lock()
+        self.geracao = 0
+        self.contadores = Contadores()
+
+    def obter(self, aluno_id):
+        with self.lock:
+            item = self.itens.get(aluno_id)
+            if item is not None:
+                valor, expira_em, dia = item
+                if expira_em > time.monotonic() and dia == date.today():
+                    self.itens.move_to_end(aluno_id)
+                    self.contadores.acertos += 1
+                    return valor, self.geracao
+                del self.itens[aluno_id]
+                self.contadores.expiradas += 1
+            self.contadores.faltas += 1
+            return None, self.geracao
+
+    def guardar(self, aluno_id, valor, geracao):
+        with self.lock:
+            if geracao != self.geracao:
+                return
+            self.itens[aluno_id] = (valor, time.monotonic() + self.ttl, date.today())
+            self.itens.move_to_end(aluno_id)
+            while len(self.itens) > self.tamanho:
+                self.itens.popitem(last=False)
+                self.contadores.descartadas += 1
+
+    def descartar(self, aluno_id):
+        with self.lock:
+            self.geracao += 1
+            self.itens.pop(aluno_id, None)
+            self.contadores.invalidacoes += 1
+
+    def limpar(self):
+        with self.lock:
+            self.geracao += 1
+            self.itens.clear()
+
+    async def aobter(self, aluno_id):
+        return self.obter(aluno_id)
+
+    async def aguardar(self, aluno_id, valor, geracao):
+        self.guardar(aluno_id, valor, geracao)
+
+    def resumo(self):
+        return {'modo': self.modo, 'tamanho': len(self.itens), 'capacidade': self.tamanho, **self.contadores.resumo()}
+
+
+class CacheCompartilhado:
+    """
+    Entradas no cache do Django, sob ``gym:elegibilidade:<versão>:<geração>:<aluno_id>``.
+
+    Como no ``CacheLocal``, um valor lido do banco antes de uma invalidação
+    não pode sobreviver a ela: ``descartar`` troca a geração do aluno por um
+    valor novo, e a gravação atrasada de quem leu antes cai na chave da
+    geração anterior, que ninguém mais lê (e expira pelo TTL).
+    """
+    modo = 'compartilhado'
+    PREFIXO = 'gym:elegibilidade:'
+    VERSAO = PREFIXO + 'versao'
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.contadores = Contadores()
+
+    def chave_geracao(self, aluno_id):
+        return f'{self.PREFIXO}geracao:{aluno_id}'
+
+    @staticmethod
+    def nova_geracao():
+        # Única mesmo se a anterior tiver sido despejada do cache
+        return uuid.uuid4().hex
+
+    def chave(self, marcador, aluno_id):
+        versao, geracao = marcador
+        return f'{self.PREFIXO}{versao}:{geracao}:{aluno_id}'
+
+    def marcador(self, aluno_id):
+        """``(versão, geração do aluno)`` vigentes; criados na primeira leitura."""
+        chave_geracao = self.chave_geracao(aluno_id)
+        dados = cache.get_many([self.VERSAO, chave_geracao])
+        versao = dados.get(self.VERSAO) or cache.get_or_set(self.VERSAO, 1, timeout=None)
+        # Perder a geração só custa uma falta: ela pode expirar com as entradas
+        geracao = dados.get(chave_geracao) or cache.get_or_set(chave_geracao, self.nova_geracao, timeout=self.ttl)
+        return versao, geracao
+
+    async def amarcador(self, aluno_id):
+        chave_geracao = self.chave_geracao(aluno_id)
+        dados = await cache.aget_many([self.VERSAO, chave_geracao])
+        versao = dados.get(self.VERSAO) or await cache.aget_or_set(self.VERSAO, 1, timeout=None)
+        geracao = dados.get(chave_geracao) or await cache.aget_or_set(chave_geracao, self.nova_geracao, timeout=self.ttl)
+        return versao, geracao
+
+    def conferir(self, item):
+        if item is not None and item[1] == date.today().isoformat():
+            self.contadores.acertos += 1
+            return item[0]
+        self.contadores.faltas += 1
+        return None
+
+    def obter(self, aluno_id):
+        marcador = self.marcador(aluno_id)
+        return self.conferir(cache.get(self.chave(marcador, aluno_id))), marcador
+
+    def guardar(self, aluno_id, valor, marcador):
+        cache.set(self.chave(marcador, aluno_id), (valor, date.today().isoformat()), timeout=self.ttl)
+
+    async def aobter(self, aluno_id):
+        marcador = await self.amarcador(aluno_id)
+        return self.conferir(await cache.aget(self.chave(marcador, aluno_id))), marcador
+
+    async def aguardar(self, aluno_id, valor, marcador):
+        await cache.aset(self.chave(marcador, aluno_id), (valor, date.today().isoformat()), timeout=self.ttl)
+
+    def descartar(self, aluno_id):
+        cache.set(self.chave_geracao(aluno_id), self.nova_geracao(), timeout=self.ttl)
+        self.contadores.invalidacoes += 1
+
+    def limpar(self):
+        try:
+            cache.incr(self.VERSAO)
+        except ValueError:
+            # Sem versão guardada: não há entradas
+            pass
+
+    def resumo(self):
+        return {'modo': self.modo, **self.contadores.resumo()}
+
+
+_caches = {}
+
+
+def cache_ativo():
+    """O cache configurado em settings (um por combinação de modo, tamanho e TTL)."""
+    modo = settings.ELEGIBILIDADE_CACHE
+    ttl = settings.ELEGIBILIDADE_CACHE_TTL
+    tamanho = settings.ELEGIBILIDADE_CACHE_TAMANHO
+    chave = (modo, tamanho, ttl)
+    if chave not in _caches:
+        _caches[chave] = CacheCompartilhado(ttl) if modo == 'compartilhado' else CacheLocal(tamanho, ttl)
+    return _caches[chave]
+
+
+# ============= CONSULTA =============
+def consulta(aluno_id):
+    return Usuario.objects.filter(pk=aluno_id).values_list('is_personal', 'nome', 'resumo_mensalidade__ativa')
+
+
+def obter(aluno_id):
+    """Elegibilidade do aluno, ou ``None`` se ele não existe."""
+    atual = cache_ativo()
+    valor, versao = atual.obter(aluno_id)
+    if valor is None:
+        linha = consulta(aluno_id).first()
+        valor = Elegibilidade(*linha) if linha else None
+        if valor is not None:
+            atual.guardar(aluno_id, valor, versao)
+    return valor
+
+
+async def aobter(aluno_id):
+    atual = cache_ativo()
+    valor, versao = await atual.aobter(aluno_id)
+    if valor is None:
+        linha = await consulta(aluno_id).afirst()
+        valor = Elegibilidade(*linha) if linha else None
+        if valor is not None:
+            await atual.aguardar(aluno_id, valor, versao)
+    return valor
+
+
+# ============= INVALIDAÇÃO =============
+def invalidar(*aluno_ids):
+    """Descarta as entradas agora e de novo após o commit (leituras concorrentes no meio)."""
+    aluno_ids = {aluno_id for aluno_id in aluno_ids if aluno_id is not None}
+    if not aluno_ids:
+        return
+    atual = cache_ativo()
+
+    def aplicar():
+        for aluno_id in aluno_ids:
+            atual.descartar(aluno_id)
+
+    aplicar()
+    transaction.on_commit(aplicar)
+
+
+def limpar():
+    """Descarta todas as entradas, agora e após o commit (gravações em lote)."""
+    atual = cache_ativo()
+    atual.limpar()
+    transaction.on_commit(atual.limpar)
+
+
+def estatisticas():
+    return cache_ativo().resumo()
@@ -0,0 +1,150 @@
+"""
+Contadores do dashboard mantidos no cache do Django.
+
+Os contadores são ajustados por deltas vindos dos sinais de Usuario, Treino e
+Mensalidade (ver ``gym/signals.py``), aplicados somente após o commit da
+transação. Assim ``dashboard_stats`` lê tudo do cache, sem COUNT nas tabelas.
+O comando ``reconciliar_estatisticas`` recalcula tudo para corrigir desvios
+e deve rodar periodicamente (ex.: logo após a meia-noite, pelo cron).
+
+Os contadores ficam no cache ``estatisticas`` (ver ``CACHES``), que precisa
+ser compartilhado entre os processos: os workers, o cron e os comandos
+(``processar_vencimentos``, ``importar_legado``) ajustam e reconciliam os
+mesmos valores. Num cache por processo (LocMem) cada worker manteria os seus,
+com só os deltas das gravações que ele atendeu, e a reconciliação feita por
+um comando não chegaria a eles. Como ``incr`` não é atômico nos caches em
+arquivo ou banco, a leitura seguinte a ``ESTATISTICAS_IDADE_MAXIMA`` segundos
+da última reconciliação reconta tudo.
+"""
+import asyncio
+import time
+from datetime import date
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from .models import Usuario, Treino, ResumoMensalidade
+
+PREFIXO = 'gym:estatisticas:'
+CHAVE_DATA = PREFIXO + 'data_referencia'
+CHAVE_RECONCILIADO = PREFIXO + 'reconciliado_em'
+CONTADORES = ('total_usuarios', 'total_alunos', 'total_personals', 'total_treinos', 'alunos_ativos')
+
+
+def armazenamento():
+    return caches['estatisticas']
+
+
+def vencidos(dados):
+    """Contadores ausentes ou mais velhos que ``ESTATISTICAS_IDADE_MAXIMA``: recontar tudo."""
+    if len(dados) < len(CONTADORES) + 2:
+        return True
+    return time.time() - dados[CHAVE_RECONCILIADO] > settings.ESTATISTICAS_IDADE_MAXIMA
+
+
+def contar_alunos_ativos():
+    """Contagem no índice ``(ativa, validade)`` do resumo de mensalidades."""
+    return ResumoMensalidade.objects.filter(ativa=True).count()
+
+
+def calcular():
+    """Recalcula todos os contadores direto no banco."""
+    return {
+        'total_usuarios': Usuario.objects.count(),
+        'total_alunos': Usuario.objects.filter(is_personal=False).count(),
+        'total_personals': Usuario.objects.filter(is_personal=True).count(),
+        'total_treinos': Treino.objects.count(),
+        'alunos_ativos': contar_alunos_ativos(),
+    }
+
+
+def reconciliar():
+    """Recalcula os contadores e substitui os valores guardados no cache."""
+    valores = calcular()
+    dados = {PREFIXO + campo: valor for campo, valor in valores.items()}
+    dados[CHAVE_DATA] = date.today().isoformat()
+    dados[CHAVE_RECONCILIADO] = time.time()
+    armazenamento().set_many(dados, timeout=None)
+    return valores
+
+
+def obter():
+    """
+    Lê os contadores do cache.
+
+    Só consulta o banco com o cache vazio ou vencido (reconciliação
+    completa) ou na virada do dia, quando apenas ``alunos_ativos`` é
+    recontado pelo índice.
+    """
+    cache = armazenamento()
+    dados = cache.get_many([PREFIXO + campo for campo in CONTADORES] + [CHAVE_DATA, CHAVE_RECONCILIADO])
+    if vencidos(dados):
+        return reconciliar()
+
+    hoje = date.today()
+    if dados[CHAVE_DATA] != hoje.isoformat():
+        # Recontagem diária, após o processamento dos vencimentos
+        dados[PREFIXO + 'alunos_ativos'] = contar_alunos_ativos()
+        dados[CHAVE_DATA] = hoje.isoformat()
+        cache.set_many(
+            {PREFIXO + 'alunos_ativos': dados[PREFIXO + 'alunos_ativos'], CHAVE_DATA: dados[CHAVE_DATA]},
+            timeout=None
+        )
+    return {campo: dados[PREFIXO + campo] for campo in CONTADORES}
+
+
+def ajustar(**deltas):
+    """Soma os deltas aos contadores depois que a transação atual confirmar."""
+    deltas = {campo: delta for campo, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    def aplicar():
+        cache = armazenamento()
+        for campo, delta in deltas.items():
+            try:
+                cache.incr(PREFIXO + campo, delta)
+            except ValueError:
+                # Contador ausente: será recalculado na próxima leitura
+                pass
+
+    transaction.on_commit(aplicar)
+
+
+# ============= VERSÕES ASSÍNCRONAS =============
+async def acalcular():
+    """Como ``calcular``, com as contagens independentes disparadas juntas."""
+    valores = await asyncio.gather(
+        Usuario.objects.acount(),
+        Usuario.objects.filter(is_personal=False).acount(),
+        Usuario.objects.filter(is_personal=True).acount(),
+        Treino.objects.acount(),
+        ResumoMensalidade.objects.filter(ativa=True).acount(),
+    )
+    return dict(zip(CONTADORES, valores))
+
+
+async def areconciliar():
+    valores = await acalcular()
+    dados = {PREFIXO + campo: valor for campo, valor in valores.items()}
+    dados[CHAVE_DATA] = date.today().isoformat()
+    dados[CHAVE_RECONCILIADO] = time.time()
+    await armazenamento().aset_many(dados, timeout=None)
+    return valores
+
+
+async def aobter():
+    """Como ``obter``, usando a API assíncrona do cache e do ORM."""
+    cache = armazenamento()
+    dados = await cache.aget_many([PREFIXO + campo for campo in CONTADORES] + [CHAVE_DATA, CHAVE_RECONCILIADO])
+    if vencidos(dados):
+        return await areconciliar()
+
+    hoje = date.today()
+    if dados[CHAVE_DATA] != hoje.isoformat():
+        dados[PREFIXO + 'alunos_ativos'] = await ResumoMensalidade.objects.filter(ativa=True).acount()
+        dados[CHAVE_DATA] = hoje.isoformat()
+        await cache.aset_many(
+            {PREFIXO + 'alunos_ativos': dados[PREFIXO + 'alunos_ativos'], CHAVE_DATA: dados[CHAVE_DATA]},
+            timeout=None
+        )
+    return {campo: dados[PREFIXO + campo] for campo in CONTADORES}
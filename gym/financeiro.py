@@ -0,0 +1,112 @@
+"""
+Relatórios de receita das mensalidades, calculados no banco.
+
+Os totais saem de agregações sobre ``data_pagamento`` (índice
+``mensalidade_pagamento_idx``), sem instanciar modelos nem passar pelo
+serializer. Os totais mensais vêm de uma única consulta com um ``SUM`` filtrado
+por mês, que percorre a faixa do índice uma vez só, sem GROUP BY.
+"""
+import csv
+from datetime import date
+from decimal import Decimal
+from django.db.models import Count, Q, Sum
+from .models import Mensalidade
+
+CENTAVOS = Decimal('0.01')
+MAX_DIAS = 3660  # Cerca de dez anos: um SUM filtrado por mês na mesma consulta
+COLUNAS_CSV = ('id', 'aluno_id', 'aluno', 'data_pagamento', 'validade', 'valor')
+
+
+def moeda(valor):
+    return str((valor or Decimal('0')).quantize(CENTAVOS))
+
+
+def meses(inicio, fim):
+    """Primeiro dia de cada mês que intersecta o período."""
+    mes = inicio.replace(day=1)
+    while mes <= fim:
+        yield mes
+        mes = date(mes.year + mes.month // 12, mes.month % 12 + 1, 1)
+
+
+def pagamentos(inicio, fim, aluno_id=None):
+    queryset = Mensalidade.objects.filter(data_pagamento__gte=inicio, data_pagamento__lte=fim)
+    if aluno_id is not None:
+        queryset = queryset.filter(aluno_id=aluno_id)
+    return queryset
+
+
+def receita(inicio, fim, aluno_id=None):
+    """Total, quantidade e quebra mensal dos pagamentos do período."""
+    lista_de_meses = list(meses(inicio, fim))
+    agregados = {'total': Sum('valor'), 'quantidade': Count('id')}
+    for i, mes in enumerate(lista_de_meses):
+        proximo = lista_de_meses[i + 1] if i + 1 < len(lista_de_meses) else None
+        filtro = Q(data_pagamento__gte=mes) & (Q(data_pagamento__lt=proximo) if proximo else Q())
+        agregados[f'total_{i}'] = Sum('valor', filter=filtro)
+        agregados[f'quantidade_{i}'] = Count('id', filter=filtro)
+
+    valores = pagamentos(inicio, fim, aluno_id).aggregate(**agregados)
+    return {
+        'inicio': inicio,
+        'fim': fim,
+        'total': moeda(valores['total']),
+        'quantidade': valores['quantidade'],
+        'por_mes': [
+            {
+                'mes': mes.strftime('%Y-%m'),
+                'total': moeda(valores[f'total_{i}']),
+                'quantidade': valores[f'quantidade_{i}'],
+            }
+            for i, mes in enumerate(lista_de_meses)
+        ],
+    }
+
+
+def receita_por_aluno(inicio, fim, top):
+    """Os ``top`` alunos que mais pagaram no período (GROUP BY aluno no banco)."""
+    linhas = (
+        pagamentos(inicio, fim)
+        .values('aluno_id', 'aluno__nome')
+        .annotate(total=Sum('valor'), quantidade=Count('id'))
+        .order_by('-total', 'aluno_id')[:top]
+    )
+    return [
+        {
+            'aluno_id': linha['aluno_id'],
+            'aluno': linha['aluno__nome'],
+            'total': moeda(linha['total']),
+            'quantidade': linha['quantidade'],
+        }
+        for linha in linhas
+    ]
+
+
+# ============= EXPORTAÇÃO CSV =============
+class Eco:
+    """Pseudo-arquivo para o ``csv.writer``: devolve a linha em vez de guardá-la."""
+
+    def write(self, valor):
+        return valor
+
+
+def linhas_csv(inicio, fim, aluno_id=None, chunk_size=2000):
+    """
+    Gera o CSV linha a linha a partir de tuplas (``values_list``), lendo o
+    banco em blocos com ``.iterator()``: a memória usada não depende do
+    número de linhas exportadas.
+    """
+    queryset = (
+        pagamentos(inicio, fim, aluno_id)
+        .order_by('data_pagamento', 'id')
+        .values_list('id', 'aluno_id', 'aluno__nome', 'data_pagamento', 'validade', 'valor')
+    )
+    # O banco é escolhido agora; o gerador só roda depois que a view retornou
+    return escrever_csv(queryset.using(queryset.db), chunk_size)
+
+
+def escrever_csv(queryset, chunk_size):
+    escritor = csv.writer(Eco())
+    yield escritor.writerow(COLUNAS_CSV)
+    for linha in queryset.iterator(chunk_size=chunk_size):
+        yield escritor.writerow(linha)
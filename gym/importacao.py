@@ -0,0 +1,198 @@
+"""
+Importação em lote de usuários e mensalidades vindos de sistemas legados.
+
+Os CSVs são lidos em streaming e processados em lotes: cada linha é
+convertida pelos campos dos serializers e validada pelas mesmas regras da API
+(``UsuarioSerializer.validate_data_nascimento`` e
+``MensalidadeSerializer.validate``). As linhas válidas do lote são gravadas
+com ``bulk_create`` numa transação que também grava o progresso do arquivo
+(``ProgressoImportacao``, sob o nome do checkpoint): uma importação
+interrompida é retomada exatamente depois do último lote gravado, sem
+duplicar linhas. Linhas inválidas são puladas e relatadas, sem abortar o lote.
+
+Colunas esperadas:
+
+- usuários: ``id_externo, nome, data_nascimento, sexo, is_personal``
+- mensalidades: ``aluno, data_pagamento, validade, valor``, onde ``aluno`` é
+  o ``id_externo`` do aluno ou, na falta dele, o nome (se for único).
+
+``bulk_create`` não dispara sinais: o log de alterações é gravado junto com
+cada lote e, ao final, o resumo de mensalidades e os contadores do dashboard
+são reconstruídos de uma vez.
+"""
+import csv
+import os
+import time
+from itertools import islice
+from django.db import transaction
+from rest_framework import serializers
+from . import alteracoes, elegibilidade, estatisticas
+from .models import Usuario, Mensalidade, ResumoMensalidade, ProgressoImportacao
+from .serializers import UsuarioSerializer, MensalidadeSerializer
+
+TAMANHO_LOTE = 2000
+AMBIGUO = object()
+
+
+def mensagem_de_erro(exc):
+    """Achata o ``detail`` de uma ValidationError numa linha de texto."""
+    detalhe = exc.detail
+    if isinstance(detalhe, dict):
+        return '; '.join(f"{campo}: {mensagem_de_erro(serializers.ValidationError(msg))}" for campo, msg in detalhe.items())
+    if isinstance(detalhe, list):
+        return '; '.join(str(item) for item in detalhe)
+    return str(detalhe)
+
+
+class Checkpoint:
+    """
+    Linhas já gravadas de cada arquivo. Com ``nome``, persistidas em
+    ``ProgressoImportacao``; ``registrar`` deve ser chamado dentro da
+    transação do lote, para que o progresso nunca fique atrás das linhas
+    gravadas.
+    """
+
+    def __init__(self, nome=None):
+        self.nome = nome
+        self.progresso = {}
+
+    def linhas(self, origem):
+        origem = os.path.abspath(origem)
+        if self.nome and origem not in self.progresso:
+            self.progresso[origem] = ProgressoImportacao.objects.filter(
+                checkpoint=self.nome, origem=origem
+            ).values_list('linhas', flat=True).first() or 0
+        return self.progresso.get(origem, 0)
+
+    def registrar(self, origem, linhas):
+        origem = os.path.abspath(origem)
+        if self.nome:
+            ProgressoImportacao.objects.update_or_create(
+                checkpoint=self.nome, origem=origem, defaults={'linhas': linhas}
+            )
+        self.progresso[origem] = linhas
+
+
+class Importador:
+    def __init__(self, tamanho_lote=TAMANHO_LOTE, checkpoint=None, log=None):
+        self.tamanho_lote = tamanho_lote
+        self.checkpoint = checkpoint or Checkpoint()
+        self.log = log or (lambda mensagem: None)
+        self.erros = []
+        self.serializer_usuario = UsuarioSerializer()
+        self.campos_usuario = self.serializer_usuario.fields
+        self.serializer_mensalidade = MensalidadeSerializer()
+        self.campos_mensalidade = self.serializer_mensalidade.fields
+        self.por_externo = {}
+        self.por_nome = {}
+        self.externos_vistos = set()  # Cadastrados e pendentes no lote atual
+        self.mensalidades_importadas = False
+
+    # ============= MAPA DE ALUNOS =============
+    def carregar_mapa(self):
+        """Carrega ``id_externo -> id`` e ``nome -> id`` de todos os usuários já cadastrados."""
+        for usuario_id, id_externo, nome in Usuario.objects.values_list('id', 'id_externo', 'nome').iterator(chunk_size=5000):
+            self.mapear(usuario_id, id_externo, nome)
+
+    def mapear(self, usuario_id, id_externo, nome):
+        if id_externo:
+            self.por_externo[id_externo] = usuario_id
+            self.externos_vistos.add(id_externo)
+        self.por_nome[nome] = AMBIGUO if nome in self.por_nome else usuario_id
+
+    def resolver_aluno(self, referencia):
+        if referencia in self.por_externo:
+            return self.por_externo[referencia]
+        aluno_id = self.por_nome.get(referencia)
+        if aluno_id is AMBIGUO:
+            raise serializers.ValidationError(f"Nome '{referencia}' é ambíguo; use o id_externo.")
+        if aluno_id is None:
+            raise serializers.ValidationError(f"Aluno '{referencia}' não encontrado.")
+        return aluno_id
+
+    # ============= VALIDAÇÃO =============
+    @staticmethod
+    def campo(campos, nome, linha):
+        valor = (linha.get(nome) or '').strip()
+        return campos[nome].run_validation(valor if valor else None)
+
+    def usuario(self, linha):
+        id_externo = (linha.get('id_externo') or '').strip() or None
+        if id_externo in self.externos_vistos:
+            raise serializers.ValidationError(f"id_externo '{id_externo}' já importado.")
+        data_nascimento = self.serializer_usuario.validate_data_nascimento(
+            self.campo(self.campos_usuario, 'data_nascimento', linha)
+        )
+        usuario = Usuario(
+            id_externo=id_externo,
+            nome=self.campos_usuario['nome'].run_validation((linha.get('nome') or '').strip()),
+            data_nascimento=data_nascimento,
+            sexo=self.campo(self.campos_usuario, 'sexo', linha) or None,
+            is_personal=self.campos_usuario['is_personal'].run_validation((linha.get('is_personal') or 'false').strip()),
+        )
+        if id_externo:
+            self.externos_vistos.add(id_externo)
+        return usuario
+
+    def mensalidade(self, linha):
+        dados = {
+            nome: self.campo(self.campos_mensalidade, nome, linha)
+            for nome in ('data_pagamento', 'validade', 'valor')
+        }
+        self.serializer_mensalidade.validate(dados)
+        return Mensalidade(aluno_id=self.resolver_aluno((linha.get('aluno') or '').strip()), **dados)
+
+    # ============= IMPORTAÇÃO =============
+    def importar(self, origem, converter, gravar):
+        """Lê ``origem`` em lotes, a partir do checkpoint, convertendo e gravando cada lote."""
+        ja_gravadas = self.checkpoint.linhas(origem)
+        resultado = {'linhas': 0, 'inseridas': 0, 'rejeitadas': 0, 'retomadas_de': ja_gravadas}
+        inicio = time.perf_counter()
+        with open(origem, newline='', encoding='utf-8-sig') as arquivo:
+            leitor = csv.DictReader(arquivo)
+            numero = ja_gravadas
+            linhas = islice(leitor, ja_gravadas, None)
+            while lote := list(islice(linhas, self.tamanho_lote)):
+                objetos = []
+                for linha in lote:
+                    numero += 1
+                    try:
+                        objetos.append(converter(linha))
+                    except serializers.ValidationError as exc:
+                        self.erros.append((os.path.basename(origem), numero + 1, mensagem_de_erro(exc)))
+                with transaction.atomic():
+                    gravar(objetos)
+                    self.checkpoint.registrar(origem, numero)
+                resultado['linhas'] += len(lote)
+                resultado['inseridas'] += len(objetos)
+                resultado['rejeitadas'] += len(lote) - len(objetos)
+                self.log(f"{os.path.basename(origem)}: {numero} linhas ({resultado['linhas'] / (time.perf_counter() - inicio):.0f} linhas/s)")
+        resultado['segundos'] = round(time.perf_counter() - inicio, 3)
+        resultado['linhas_por_segundo'] = round(resultado['linhas'] / resultado['segundos']) if resultado['segundos'] else 0
+        return resultado
+
+    def gravar_usuarios(self, usuarios):
+        Usuario.objects.bulk_create(usuarios)
+        alteracoes.registrar(alteracoes.USUARIO, [(usuario.pk, usuario.pk) for usuario in usuarios])
+        for usuario in usuarios:
+            self.mapear(usuario.pk, usuario.id_externo, usuario.nome)
+
+    def gravar_mensalidades(self, mensalidades):
+        Mensalidade.objects.bulk_create(mensalidades)
+        alteracoes.registrar(alteracoes.MENSALIDADE, [(mensalidade.pk, mensalidade.aluno_id) for mensalidade in mensalidades])
+
+    def importar_usuarios(self, origem):
+        return self.importar(origem, self.usuario, self.gravar_usuarios)
+
+    def importar_mensalidades(self, origem):
+        # Mesmo numa retomada sem linhas novas: a execução anterior pode ter
+        # parado antes de ``finalizar``
+        self.mensalidades_importadas = True
+        return self.importar(origem, self.mensalidade, self.gravar_mensalidades)
+
+    def finalizar(self):
+        """Reconstrói o que os sinais manteriam se as linhas tivessem sido gravadas uma a uma."""
+        if self.mensalidades_importadas:
+            ResumoMensalidade.objects.reconstruir()
+            elegibilidade.limpar()
+        return estatisticas.reconciliar()
@@ -0,0 +1,140 @@
+"""
+Leitura rápida das listagens, sem instanciar modelos nem serializers.
+
+Numa listagem grande o custo de CPU fica quase todo na maquinaria por campo
+do DRF (``get_attribute``, ``to_representation``, um serializer aninhado por
+exercício). ``LeituraRapida`` monta o mesmo JSON direto das linhas de
+``.values()``: o formato (campos, ordem das chaves, ``source`` com ponto) é
+lido uma vez do próprio serializer, e só os campos que realmente convertem o
+valor (datas, decimais, choices) chamam o ``to_representation`` do campo.
+Relações aninhadas (``exercicios`` de um treino) vêm de uma segunda consulta,
+agrupadas pela chave estrangeira numa passada só.
+
+``recorte`` devolve a leitura só dos campos pedidos (``?fields=``): as
+colunas, joins e consultas aninhadas dos demais campos ficam de fora.
+"""
+from functools import cached_property
+from itertools import islice
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework import serializers
+
+# Campos cujo to_representation devolve o próprio valor lido do banco
+IDENTIDADE = (
+    serializers.IntegerField,
+    serializers.CharField,
+    serializers.BooleanField,
+    serializers.PrimaryKeyRelatedField,
+)
+
+
+class LeituraRapida:
+    def __init__(self, serializer_class, campos=None):
+        self.serializer_class = serializer_class
+        self.selecionados = campos
+        self.recortes = {}
+
+    def recorte(self, campos):
+        """Leitura só dos ``campos`` (``None``: todos), criada uma vez por conjunto."""
+        if campos is None:
+            return self
+        campos = frozenset(campos)
+        if campos not in self.recortes:
+            self.recortes[campos] = LeituraRapida(self.serializer_class, campos)
+        return self.recortes[campos]
+
+    @cached_property
+    def colunas(self):
+        """
+        ``(chave, caminho, conversor, relacao, aninhada)`` de cada campo, na
+        ordem do serializer. ``relacao`` é a chave estrangeira de um ``source``
+        com ponto: com ela nula o DRF omite o campo da resposta.
+        """
+        model = self.serializer_class.Meta.model
+        colunas = []
+        for chave, campo in self.serializer_class().fields.items():
+            if self.selecionados is not None and chave not in self.selecionados:
+                continue
+            if isinstance(campo, serializers.ListSerializer):
+                relacao = model._meta.get_field(campo.source)
+                aninhada = LeituraRapida(type(campo.child))
+                colunas.append((chave, relacao.field.name, None, None, aninhada))
+                continue
+            if isinstance(campo, (serializers.SerializerMethodField, serializers.BaseSerializer)):
+                raise ImproperlyConfigured(
+                    f"{self.serializer_class.__name__}.{chave}: campo sem equivalente em .values()."
+                )
+            conversor = None if isinstance(campo, IDENTIDADE) else campo.to_representation
+            relacao = campo.source_attrs[0] if len(campo.source_attrs) > 1 else None
+            colunas.append((chave, '__'.join(campo.source_attrs), conversor, relacao, None))
+        return colunas
+
+    @cached_property
+    def campos(self):
+        """Argumentos de ``.values()``: caminhos das colunas, relações e a pk."""
+        campos = {'pk': None}
+        for _, caminho, _, relacao, aninhada in self.colunas:
+            if aninhada is None:
+                campos[caminho] = None
+            if relacao:
+                campos[relacao] = None
+        return list(campos)
+
+    def valores(self, queryset, extras=()):
+        """Linhas de ``.values()``; ``extras`` são colunas a mais (ex.: a ordenação do cursor)."""
+        campos = self.campos + [campo for campo in extras if campo not in self.campos]
+        # prefetch_related não se aplica a dicionários; select_related é ignorado por values()
+        return queryset.prefetch_related(None).values(*campos)
+
+    def montar(self, linha, filhos):
+        dados = {}
+        for chave, caminho, conversor, relacao, aninhada in self.colunas:
+            if aninhada is not None:
+                dados[chave] = filhos[chave].get(linha['pk'], [])
+                continue
+            valor = linha[caminho]
+            if valor is None:
+                if relacao is not None and linha[relacao] is None:
+                    continue
+                dados[chave] = None
+            else:
+                dados[chave] = conversor(valor) if conversor else valor
+        return dados
+
+    # ============= RELAÇÕES ANINHADAS =============
+    def consultas_aninhadas(self, linhas):
+        """``(chave, leitura, fk, queryset)`` dos filhos de todas as ``linhas``."""
+        ids = [linha['pk'] for linha in linhas]
+        for chave, fk, _, _, aninhada in self.colunas:
+            if aninhada is not None:
+                model = aninhada.serializer_class.Meta.model
+                queryset = aninhada.valores(model.objects.filter(**{f'{fk}__in': ids}).order_by(fk, 'pk'))
+                yield chave, aninhada, fk, queryset
+
+    @staticmethod
+    def agrupar(aninhada, fk, linhas_filhas):
+        grupos = {}
+        for linha in linhas_filhas:
+            grupos.setdefault(linha[fk], []).append(aninhada.montar(linha, {}))
+        return grupos
+
+    def representar(self, linhas):
+        """Lista de dicionários no formato do serializer, a partir das linhas de ``valores``."""
+        linhas = list(linhas)
+        filhos = {}
+        if linhas:
+            for chave, aninhada, fk, queryset in self.consultas_aninhadas(linhas):
+                filhos[chave] = self.agrupar(aninhada, fk, queryset)
+        return [self.montar(linha, filhos) for linha in linhas]
+
+    async def arepresentar(self, linhas):
+        filhos = {}
+        if linhas:
+            for chave, aninhada, fk, queryset in self.consultas_aninhadas(linhas):
+                filhos[chave] = self.agrupar(aninhada, fk, [linha async for linha in queryset])
+        return [self.montar(linha, filhos) for linha in linhas]
+
+    def em_blocos(self, queryset, chunk_size):
+        """Gera um dicionário por linha, lendo o banco (e os filhos) em blocos."""
+        linhas = self.valores(queryset).iterator(chunk_size=chunk_size)
+        while bloco := list(islice(linhas, chunk_size)):
+            yield from self.representar(bloco)
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+from gym import arquivamento
+
+
+class Command(BaseCommand):
+    help = (
+        "Move os check-ins anteriores à janela de retenção (CHECKIN_RETENCAO_MESES) para o "
+        "arquivo mensal comprimido. Os rollups de ocupação e frequência não mudam."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--retencao', type=int,
+            help="Meses mantidos na tabela quente, contando o corrente. Padrão: CHECKIN_RETENCAO_MESES."
+        )
+
+    def handle(self, *args, **options):
+        if options['retencao'] is not None and options['retencao'] < 1:
+            raise CommandError("A retenção deve ser de pelo menos 1 mês.")
+
+        meses = arquivamento.arquivar(options['retencao'], log=self.stdout.write)
+        self.stdout.write(self.style.SUCCESS(
+            f"{sum(movidos for _, movidos in meses)} check-ins de {len(meses)} meses arquivados."
+        ))
@@ -0,0 +1,66 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from gym import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        "Gera dados sintéticos num banco de teste descartável, mede latência (p50/p95/p99) "
+        "e consultas SQL de todas as rotas da API e compara com uma linha de base."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--escala', type=float, default=0.01,
+                            help="Fração do volume de referência (1.0 = 100k usuários, 10M check-ins).")
+        parser.add_argument('--semente', type=int, default=42)
+        parser.add_argument('--repeticoes', type=int, default=30)
+        parser.add_argument('--aquecimento', type=int, default=2)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--saida', help="Arquivo JSON onde gravar o relatório (padrão: stdout).")
+        parser.add_argument('--base', help="Relatório JSON anterior usado como linha de base.")
+        parser.add_argument('--limite', type=float, default=1.2,
+                            help="Razão máxima aceitável entre o p99 atual e o da base.")
+        parser.add_argument('--vazao', action='store_true',
+                            help="Compara também a vazão das rotas de leitura via WSGI e via ASGI (views assíncronas).")
+        parser.add_argument('--serializacao', action='store_true',
+                            help="Compara o tempo de montar as listagens com os serializers do DRF e com a leitura rápida.")
+        parser.add_argument('--concorrencia', type=int, default=8)
+        parser.add_argument('--requisicoes', type=int, default=200)
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        nome_original = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            benchmark.gerar_dados(
+                escala=options['escala'],
+                semente=options['semente'],
+                batch_size=options['batch_size'],
+                log=lambda mensagem: self.stderr.write(f"Gerando {mensagem}"),
+            )
+            relatorio = benchmark.executar(options['repeticoes'], options['aquecimento'])
+            if options['vazao']:
+                relatorio['vazao'] = benchmark.comparar_vazao(options['requisicoes'], options['concorrencia'])
+            if options['serializacao']:
+                relatorio['serializacao'] = benchmark.comparar_serializacao(options['repeticoes'])
+        finally:
+            connection.creation.destroy_test_db(nome_original, verbosity=0)
+            teardown_test_environment()
+
+        relatorio['escala'] = options['escala']
+        conteudo = json.dumps(relatorio, indent=2, ensure_ascii=False)
+        if options['saida']:
+            with open(options['saida'], 'w', encoding='utf-8') as arquivo:
+                arquivo.write(conteudo)
+        else:
+            self.stdout.write(conteudo)
+
+        if options['base']:
+            with open(options['base'], encoding='utf-8') as arquivo:
+                base = json.load(arquivo)
+            regressoes = benchmark.comparar(relatorio, base, limite=options['limite'])
+            if regressoes:
+                raise CommandError("Regressões em relação à base:\n" + "\n".join(regressoes))
+            self.stderr.write(self.style.SUCCESS("Sem regressões em relação à base."))
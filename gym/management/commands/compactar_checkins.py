@@ -0,0 +1,23 @@
+from datetime import date, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+from gym import ocupacao
+
+
+class Command(BaseCommand):
+    help = "Refaz os rollups de ocupação horária e frequência diária a partir dos check-ins brutos."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--inicio', help="Data inicial (AAAA-MM-DD). Padrão: 30 dias atrás.")
+        parser.add_argument('--fim', help="Data final (AAAA-MM-DD). Padrão: hoje.")
+
+    def handle(self, *args, **options):
+        fim = parse_date(options['fim']) if options['fim'] else date.today()
+        inicio = parse_date(options['inicio']) if options['inicio'] else fim - timedelta(days=30)
+        if inicio is None or fim is None or inicio > fim:
+            raise CommandError("Período inválido. Use datas AAAA-MM-DD com inicio <= fim.")
+
+        horas, dias = ocupacao.recompactar(inicio, fim)
+        self.stdout.write(self.style.SUCCESS(
+            f"Rollups de {inicio} a {fim} refeitos: {horas} horas e {dias} registros de frequência."
+        ))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand, CommandError
+from gym import alteracoes
+
+
+class Command(BaseCommand):
+    help = (
+        "Remove do log de alterações da sincronização as entradas mais antigas que a retenção "
+        "(SYNC_RETENCAO_DIAS). Clientes com cursor anterior refazem o retrato."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, help="Dias mantidos no log. Padrão: SYNC_RETENCAO_DIAS.")
+
+    def handle(self, *args, **options):
+        if options['dias'] is not None and options['dias'] < 0:
+            raise CommandError("O número de dias não pode ser negativo.")
+        removidas = alteracoes.podar(options['dias'])
+        self.stdout.write(self.style.SUCCESS(f"{removidas} entradas removidas do log de alterações."))
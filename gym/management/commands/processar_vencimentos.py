@@ -0,0 +1,30 @@
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+from gym import vencimentos
+
+
+class Command(BaseCommand):
+    help = (
+        "Vira para inativos, em lote, os alunos cuja mensalidade venceu e lista quem vence "
+        "nos próximos dias. Deve rodar uma vez por dia, logo após a meia-noite."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--data', help="Data de referência (AAAA-MM-DD). Padrão: hoje.")
+        parser.add_argument('--dias', type=int, default=7, help="Janela da lista de vencimentos próximos.")
+
+    def handle(self, *args, **options):
+        hoje = parse_date(options['data']) if options['data'] else date.today()
+        if hoje is None or options['dias'] < 0:
+            raise CommandError("Use --data AAAA-MM-DD e --dias >= 0.")
+
+        resultado = vencimentos.processar(hoje)
+        self.stdout.write(self.style.SUCCESS(
+            f"{resultado['vencidas']} mensalidades vencidas e {resultado['reativadas']} reativadas em {hoje}."
+        ))
+
+        proximos = vencimentos.vencendo(options['dias'], hoje)
+        self.stdout.write(f"Vencendo nos próximos {options['dias']} dias:")
+        for resumo in proximos.iterator():
+            self.stdout.write(f"{resumo.validade} {resumo.aluno_id} {resumo.aluno.nome}")
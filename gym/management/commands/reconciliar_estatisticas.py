@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from gym import estatisticas
+
+
+class Command(BaseCommand):
+    help = "Recalcula os contadores do dashboard no banco e corrige os valores em cache."
+
+    def handle(self, *args, **options):
+        valores = estatisticas.reconciliar()
+        for campo, valor in valores.items():
+            self.stdout.write(f"{campo}: {valor}")
+        self.stdout.write(self.style.SUCCESS("Estatísticas reconciliadas."))
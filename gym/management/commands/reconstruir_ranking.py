@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from gym import ranking
+
+
+class Command(BaseCommand):
+    help = "Reconstrói os vínculos personal/aluno e o ranking de personals a partir dos treinos."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        total = ranking.reconstruir(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Ranking reconstruído com {total} personals."))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from gym import elegibilidade
+from gym.models import ResumoMensalidade
+
+
+class Command(BaseCommand):
+    help = "Reconstrói o resumo da mensalidade mais recente de cada aluno a partir do histórico."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        total = ResumoMensalidade.objects.reconstruir(batch_size=options['batch_size'])
+        elegibilidade.limpar()
+        self.stdout.write(self.style.SUCCESS(f"{total} resumos de mensalidade reconstruídos."))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from gym import busca
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstrói o índice de busca textual de treinos (FTS5 no SQLite, tsvector no "
+        "PostgreSQL) a partir das tabelas de treinos e exercícios."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        total = busca.reconstruir(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"{total} treinos indexados."))
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def popular_resumos(apps, schema_editor):
+    Usuario = apps.get_model('gym', 'Usuario')
+    Mensalidade = apps.get_model('gym', 'Mensalidade')
+    ResumoMensalidade = apps.get_model('gym', 'ResumoMensalidade')
+
+    ultimas = Mensalidade.objects.filter(aluno=models.OuterRef('pk')).order_by('-validade', '-id')
+    linhas = (
+        Usuario.objects.annotate(
+            ultima_id=models.Subquery(ultimas.values('id')[:1]),
+            ultima_validade=models.Subquery(ultimas.values('validade')[:1]),
+        )
+        .filter(ultima_id__isnull=False)
+        .values_list('id', 'ultima_id', 'ultima_validade')
+    )
+    ResumoMensalidade.objects.bulk_create(
+        [
+            ResumoMensalidade(aluno_id=aluno_id, ultima_mensalidade_id=ultima_id, validade=validade)
+            for aluno_id, ultima_id, validade in linhas.iterator()
+        ],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gym', '0002_checkin'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumoMensalidade',
+            fields=[
+                ('aluno', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='resumo_mensalidade', serialize=False, to='gym.usuario')),
+                ('validade', models.DateField(db_index=True)),
+                ('ultima_mensalidade', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='gym.mensalidade')),
+            ],
+        ),
+        migrations.RunPython(popular_resumos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gym', '0003_resumomensalidade'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='checkin',
+            index=models.Index(fields=['aluno', 'data_hora_checkin'], name='checkin_aluno_data_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='exercicio',
+            index=models.Index(fields=['treino', 'id'], name='exercicio_treino_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mensalidade',
+            index=models.Index(fields=['aluno', 'validade', 'id'], name='mensalidade_aluno_val_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mensalidade',
+            index=models.Index(fields=['validade', 'id'], name='mensalidade_validade_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='treino',
+            index=models.Index(condition=models.Q(('personal__isnull', False)), fields=['personal', 'aluno'], name='treino_personal_aluno_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='treino',
+            index=models.Index(condition=models.Q(('personal__isnull', False)), fields=['personal', 'data_criacao', 'id'], name='treino_personal_criacao_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='treino',
+            index=models.Index(fields=['aluno', 'data_criacao', 'id'], name='treino_aluno_criacao_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='treino',
+            index=models.Index(fields=['data_criacao', 'id'], name='treino_criacao_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='usuario',
+            index=models.Index(condition=models.Q(('is_personal', True)), fields=['id'], name='usuario_personal_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='usuario',
+            index=models.Index(condition=models.Q(('is_personal', False)), fields=['id'], name='usuario_aluno_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gym', '0004_indices_compostos'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='resumomensalidade',
+            name='aluno',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='resumo_mensalidade', serialize=False, to='gym.usuario'),
+        ),
+        migrations.AlterField(
+            model_name='resumomensalidade',
+            name='ultima_mensalidade',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='gym.mensalidade'),
+        ),
+    ]
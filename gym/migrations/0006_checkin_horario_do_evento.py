@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:52
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gym', '0005_resumo_sem_cascata'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='checkin',
+            name='data_hora_checkin',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
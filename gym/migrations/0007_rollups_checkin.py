@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def popular_rollups(apps, schema_editor):
+    from django.db.models import Count
+    from django.db.models.functions import TruncDate, TruncHour
+
+    CheckIn = apps.get_model('gym', 'CheckIn')
+    OcupacaoHoraria = apps.get_model('gym', 'OcupacaoHoraria')
+    FrequenciaDiaria = apps.get_model('gym', 'FrequenciaDiaria')
+
+    horas = (
+        CheckIn.objects.annotate(hora=TruncHour('data_hora_checkin'))
+        .values('hora').annotate(total=Count('id')).order_by()
+    )
+    dias = (
+        CheckIn.objects.annotate(dia=TruncDate('data_hora_checkin'))
+        .values('aluno_id', 'dia').annotate(total=Count('id')).order_by()
+    )
+    OcupacaoHoraria.objects.bulk_create((OcupacaoHoraria(**linha) for linha in horas.iterator()), batch_size=1000)
+    FrequenciaDiaria.objects.bulk_create((FrequenciaDiaria(**linha) for linha in dias.iterator()), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gym', '0006_checkin_horario_do_evento'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OcupacaoHoraria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hora', models.DateTimeField(unique=True)),
+                ('total', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='FrequenciaDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia', models.DateField()),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('aluno', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='frequencias', to='gym.usuario')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('aluno', 'dia'), name='frequencia_aluno_dia_unica')],
+            },
+        ),
+        migrations.RunPython(popular_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def popular_ranking(apps, schema_editor):
+    from django.db.models import Count, Max
+
+    Treino = apps.get_model('gym', 'Treino')
+    VinculoPersonalAluno = apps.get_model('gym', 'VinculoPersonalAluno')
+    RankingPersonal = apps.get_model('gym', 'RankingPersonal')
+
+    pares = (
+        Treino.objects.filter(personal__isnull=False, personal__is_personal=True)
+        .values('personal_id', 'aluno_id')
+        .annotate(total_treinos=Count('id'), ultimo_treino=Max('data_criacao'))
+        .order_by()
+    )
+    VinculoPersonalAluno.objects.bulk_create((VinculoPersonalAluno(**par) for par in pares.iterator()), batch_size=1000)
+    totais = VinculoPersonalAluno.objects.values('personal_id').annotate(total_alunos=Count('aluno_id')).order_by()
+    RankingPersonal.objects.bulk_create((RankingPersonal(**linha) for linha in totais.iterator()), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gym', '0007_rollups_checkin'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RankingPersonal',
+            fields=[
+                ('personal', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='ranking', serialize=False, to='gym.usuario')),
+                ('total_alunos', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-total_alunos', '-personal'], name='ranking_total_alunos_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='VinculoPersonalAluno',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_treinos', models.PositiveIntegerField(default=0)),
+                ('ultimo_treino', models.DateTimeField()),
+                ('aluno', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='vinculos_como_aluno', to='gym.usuario')),
+                ('personal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='vinculos_como_personal', to='gym.usuario')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['ultimo_treino', 'personal'], name='vinculo_ultimo_treino_idx')],
+                'constraints': [models.UniqueConstraint(fields=('personal', 'aluno'), name='vinculo_personal_aluno_unico')],
+            },
+        ),
+        migrations.RunPython(popular_ranking, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gym', '0008_ranking_personal'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exercicio',
+            name='atualizado_em',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='mensalidade',
+            name='atualizado_em',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='treino',
+            name='atualizado_em',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='usuario',
+            name='atualizado_em',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
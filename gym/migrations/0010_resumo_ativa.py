@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:09
+
+from datetime import date
+
+from django.db import migrations, models
+
+
+def marcar_ativas(apps, schema_editor):
+    ResumoMensalidade = apps.get_model('gym', 'ResumoMensalidade')
+    ResumoMensalidade.objects.filter(validade__gte=date.today()).update(ativa=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gym', '0009_atualizado_em'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='resumomensalidade',
+            name='ativa',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(marcar_ativas, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='resumomensalidade',
+            index=models.Index(fields=['validade', 'aluno'], condition=models.Q(('ativa', True)), name='resumo_ativa_validade_idx'),
+        ),
+    ]
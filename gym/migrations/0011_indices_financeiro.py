@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gym', '0010_resumo_ativa'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='mensalidade',
+            index=models.Index(fields=['data_pagamento', 'id'], name='mensalidade_pagamento_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mensalidade',
+            index=models.Index(fields=['aluno', 'data_pagamento'], name='mensalidade_aluno_pag_idx'),
+        ),
+    ]
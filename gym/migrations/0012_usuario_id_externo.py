@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gym', '0011_indices_financeiro'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usuario',
+            name='id_externo',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+from django.db import migrations
+
+
+def criar(apps, schema_editor):
+    from gym import busca
+    busca.criar_indice(schema_editor)
+    busca.reconstruir(using=schema_editor.connection.alias)
+
+
+def remover(apps, schema_editor):
+    from gym import busca
+    busca.remover_indice(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gym', '0012_usuario_id_externo'),
+    ]
+
+    operations = [
+        migrations.RunPython(criar, remover),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gym', '0013_busca_treino'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArquivoCheckIn',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mes', models.DateField(unique=True)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('alunos_distintos', models.PositiveIntegerField(default=0)),
+                ('alunos', models.BinaryField()),
+                ('instantes', models.BinaryField()),
+                ('atualizado_em', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='checkin',
+            index=models.Index(fields=['data_hora_checkin'], name='checkin_data_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:36
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gym', '0014_arquivo_checkins'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Alteracao',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('modelo', models.CharField(max_length=20)),
+                ('objeto_id', models.BigIntegerField()),
+                ('aluno_id', models.BigIntegerField(null=True)),
+                ('excluido', models.BooleanField(default=False)),
+                ('criado_em', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['aluno_id', 'id'], name='alteracao_aluno_idx'), models.Index(fields=['criado_em'], name='alteracao_criado_em_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:42
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gym', '0015_log_de_alteracoes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='usuario',
+            index=models.Index(django.db.models.functions.text.Lower('nome'), models.F('id'), name='usuario_nome_idx'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gym', '0016_indice_nome_usuario'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProgressoImportacao',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('checkpoint', models.CharField(max_length=255)),
+                ('origem', models.CharField(max_length=500)),
+                ('linhas', models.PositiveBigIntegerField(default=0)),
+                ('atualizado_em', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('checkpoint', 'origem'), name='progresso_importacao_unico')],
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:24
+
+import gym.models
+from django.db import migrations, models
+
+
+def popular_nome_busca(apps, schema_editor):
+    Usuario = apps.get_model('gym', 'Usuario')
+    usuarios = [
+        Usuario(id=usuario_id, nome_busca=gym.models.normalizar_nome(nome)[:100])
+        for usuario_id, nome in Usuario.objects.values_list('id', 'nome').iterator()
+    ]
+    Usuario.objects.bulk_update(usuarios, ['nome_busca'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gym', '0017_progresso_importacao'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='usuario',
+            name='usuario_nome_idx',
+        ),
+        migrations.AddField(
+            model_name='usuario',
+            name='nome_busca',
+            field=gym.models.NomeDeBuscaField(default='', editable=False, max_length=100),
+        ),
+        migrations.RunPython(popular_nome_busca, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='usuario',
+            index=models.Index(fields=['nome_busca', 'id'], name='usuario_nome_busca_idx'),
+        ),
+    ]
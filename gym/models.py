@@ -1,7 +1,33 @@
-from django.db import models
+import unicodedata
+from datetime import date
+from django.db import models, transaction
+from django.utils import timezone
 
 # Create your models here.
 
+def normalizar_nome(nome):
+    """``nome`` sem acentos e sem diferenciar maiúsculas, como é guardado em ``Usuario.nome_busca``."""
+    decomposto = unicodedata.normalize('NFKD', nome)
+    return ''.join(letra for letra in decomposto if not unicodedata.combining(letra)).casefold()
+
+
+class NomeDeBuscaField(models.CharField):
+    """
+    Cópia normalizada de ``nome``, preenchida a cada gravação (inclusive no
+    ``bulk_create``): o LOWER do SQLite só converte letras ASCII.
+    """
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('max_length', 100)
+        kwargs.setdefault('editable', False)
+        super().__init__(*args, **kwargs)
+
+    def pre_save(self, model_instance, add):
+        valor = normalizar_nome(model_instance.nome)[:self.max_length]
+        setattr(model_instance, self.attname, valor)
+        return valor
+
+
 class Usuario(models.Model):
     SEXO_CHOICES = (
         ('M', 'Masculino'),
@@ -9,10 +35,22 @@ class Usuario(models.Model):
     )
 
     nome = models.CharField(max_length=100)
+    nome_busca = NomeDeBuscaField(default='')
     data_nascimento = models.DateField(null=True, blank=True)
     sexo = models.CharField(max_length=1, choices=SEXO_CHOICES, null=True, blank=True)
     is_personal = models.BooleanField(default=False)  # True = personal
+    id_externo = models.CharField(max_length=64, unique=True, null=True, blank=True)  # Código no sistema legado
     data_inscricao = models.DateField(auto_now_add=True)
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Índices parciais: o filtro booleano só aproveita índice cuja condição ele implica
+            models.Index(fields=['id'], condition=models.Q(is_personal=True), name='usuario_personal_idx'),
+            models.Index(fields=['id'], condition=models.Q(is_personal=False), name='usuario_aluno_idx'),
+            # Busca por início do nome, sem acentos nem maiúsculas (admin e autocomplete)
+            models.Index(fields=['nome_busca', 'id'], name='usuario_nome_busca_idx'),
+        ]
 
     def __str__(self):
         tipo = "Personal" if self.is_personal else "Aluno"
@@ -23,17 +61,156 @@ class Mensalidade(models.Model):
     data_pagamento = models.DateField()
     valor = models.DecimalField(max_digits=8, decimal_places=2)
     validade = models.DateField()  # Validade da mensalidade
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Cobre latest('validade') por aluno e a listagem filtrada por aluno
+            models.Index(fields=['aluno', 'validade', 'id'], name='mensalidade_aluno_val_idx'),
+            # Chave da paginação por cursor (validade, id)
+            models.Index(fields=['validade', 'id'], name='mensalidade_validade_idx'),
+            # Relatórios e exportação por período de pagamento (gym/financeiro.py)
+            models.Index(fields=['data_pagamento', 'id'], name='mensalidade_pagamento_idx'),
+            models.Index(fields=['aluno', 'data_pagamento'], name='mensalidade_aluno_pag_idx'),
+        ]
 
     def __str__(self):
         return f"{self.aluno.nome} - Pago em {self.data_pagamento}"
+
+    # O resumo do aluno é atualizado pelos sinais, dentro da mesma transação
+    def save(self, *args, **kwargs):
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic(using=kwargs.get('using')):
+            return super().delete(*args, **kwargs)
     
 
+class ResumoMensalidadeManager(models.Manager):
+    def sincronizar(self, aluno_id):
+        """
+        Recalcula o resumo de um aluno a partir da sua mensalidade mais recente.
+
+        Retorna a tupla ``(ativa_anterior, ativa_nova)``; qualquer uma delas é
+        ``None`` quando o aluno não tinha/não tem mais mensalidades.
+        """
+        with transaction.atomic():
+            anterior = (
+                self.select_for_update().filter(aluno_id=aluno_id)
+                .values_list('ativa', flat=True).first()
+            )
+            ultima = (
+                Mensalidade.objects.filter(aluno_id=aluno_id)
+                .order_by('-validade', '-id')
+                .values('id', 'validade')
+                .first()
+            )
+            if ultima is None:
+                if anterior is not None:
+                    self.filter(aluno_id=aluno_id).delete()
+                return anterior, None
+
+            ativa = ultima['validade'] >= date.today()
+            campos = {'ultima_mensalidade_id': ultima['id'], 'validade': ultima['validade'], 'ativa': ativa}
+            if anterior is None:
+                # Outra transação pode ter criado o resumo depois da leitura (o
+                # primeiro pagamento do aluno gravado em paralelo): o
+                # get_or_create espera por ela e passa a atualizá-lo
+                resumo, criado = self.select_for_update().get_or_create(aluno_id=aluno_id, defaults=campos)
+                if criado:
+                    return None, ativa
+                anterior = resumo.ativa
+            self.filter(aluno_id=aluno_id).update(**campos)
+            return anterior, ativa
+
+    def reconstruir(self, batch_size=1000):
+        """Reconstrói todos os resumos a partir do histórico de mensalidades."""
+        ultimas = Mensalidade.objects.filter(aluno=models.OuterRef('pk')).order_by('-validade', '-id')
+        linhas = (
+            Usuario.objects.annotate(
+                ultima_id=models.Subquery(ultimas.values('id')[:1]),
+                ultima_validade=models.Subquery(ultimas.values('validade')[:1]),
+            )
+            .filter(ultima_id__isnull=False)
+            .values_list('id', 'ultima_id', 'ultima_validade')
+        )
+        total = 0
+        hoje = date.today()
+        with transaction.atomic():
+            self.all().delete()
+            lote = []
+            for aluno_id, ultima_id, validade in linhas.iterator(chunk_size=batch_size):
+                lote.append(self.model(
+                    aluno_id=aluno_id, ultima_mensalidade_id=ultima_id,
+                    validade=validade, ativa=validade >= hoje
+                ))
+                if len(lote) >= batch_size:
+                    self.bulk_create(lote)
+                    total += len(lote)
+                    lote = []
+            self.bulk_create(lote)
+            total += len(lote)
+        return total
+
+
+class ResumoMensalidade(models.Model):
+    """
+    Resumo desnormalizado da mensalidade mais recente de cada usuário.
+
+    Mantido pelos sinais de Mensalidade (ver ``gym/signals.py``), na mesma
+    transação da gravação (``Mensalidade.save``/``delete``), permite
+    verificar o status de um aluno lendo uma única linha indexada. ``ativa``
+    é gravado por ``sincronizar`` e virado para ``False`` em lote, uma vez por
+    dia, pelo comando ``processar_vencimentos`` (ver ``gym/vencimentos.py``);
+    as leituras de status não comparam datas. As chaves
+    usam DO_NOTHING porque o ciclo de vida da linha é todo controlado por
+    ``sincronizar``: ao excluir um aluno, a exclusão em cascata das suas
+    mensalidades remove o resumo na mesma transação, contando cada remoção
+    uma única vez nas estatísticas.
+    """
+    aluno = models.OneToOneField(Usuario, on_delete=models.DO_NOTHING, primary_key=True, related_name="resumo_mensalidade")
+    ultima_mensalidade = models.ForeignKey(Mensalidade, on_delete=models.DO_NOTHING, null=True, blank=True, related_name="+")
+    validade = models.DateField(db_index=True)  # Validade da mensalidade mais recente
+    ativa = models.BooleanField(default=False)
+
+    objects = ResumoMensalidadeManager()
+
+    class Meta:
+        indexes = [
+            # Vencimentos do dia e "vencendo em N dias"; parcial porque um
+            # filtro booleano puro não aproveita um índice composto
+            models.Index(fields=['validade', 'aluno'], condition=models.Q(ativa=True), name='resumo_ativa_validade_idx'),
+        ]
+
+    def __str__(self):
+        return f"Resumo de {self.aluno_id} - Válido até {self.validade}"
+
+
 class Treino(models.Model):
     aluno = models.ForeignKey(Usuario, on_delete=models.CASCADE, related_name="treinos")
     personal = models.ForeignKey(Usuario, on_delete=models.SET_NULL, null=True, blank=True, related_name="treinos_orientados")
     nome = models.CharField(max_length=100)
     descricao = models.TextField(blank=True)
     data_criacao = models.DateTimeField(auto_now_add=True)
+    atualizado_em = models.DateTimeField(auto_now=True)  # Também tocado quando um exercício muda
+
+    class Meta:
+        indexes = [
+            # Índice parcial: treinos sem personal nunca são consultados por personal
+            models.Index(
+                fields=['personal', 'aluno'],
+                condition=models.Q(personal__isnull=False),
+                name='treino_personal_aluno_idx'
+            ),
+            models.Index(
+                fields=['personal', 'data_criacao', 'id'],
+                condition=models.Q(personal__isnull=False),
+                name='treino_personal_criacao_idx'
+            ),
+            models.Index(fields=['aluno', 'data_criacao', 'id'], name='treino_aluno_criacao_idx'),
+            models.Index(fields=['data_criacao', 'id'], name='treino_criacao_idx'),
+        ]
 
     def __str__(self):
         return f"{self.nome} ({self.aluno.nome})"
@@ -44,13 +221,140 @@ class Exercicio(models.Model):
     series = models.IntegerField(default=3)
     repeticoes = models.IntegerField(default=10)
     carga_kg = models.FloatField(null=True, blank=True)
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['treino', 'id'], name='exercicio_treino_idx'),
+        ]
 
     def __str__(self):
         return f"{self.nome} ({self.series}x{self.repeticoes})"    
 
 class CheckIn(models.Model):
     aluno = models.ForeignKey(Usuario, on_delete=models.CASCADE, related_name="checkins")
-    data_hora_checkin = models.DateTimeField(auto_now_add=True)
+    # default em vez de auto_now_add para preservar o horário dos eventos enviados em lote
+    data_hora_checkin = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['aluno', 'data_hora_checkin'], name='checkin_aluno_data_idx'),
+            # Janelas de tempo (recompactação dos rollups e arquivamento mensal)
+            models.Index(fields=['data_hora_checkin'], name='checkin_data_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.aluno.nome} - {self.data_hora_checkin.strftime('%d/%m/%Y %H:%M')}" #Ajuste no formato de data/hora
+
+
+class ArquivoCheckIn(models.Model):
+    """Check-ins de um mês já arquivado, em colunas comprimidas; mantido por ``gym/arquivamento.py``."""
+    mes = models.DateField(unique=True)  # Primeiro dia do mês, no fuso local
+    total = models.PositiveIntegerField(default=0)
+    alunos_distintos = models.PositiveIntegerField(default=0)
+    alunos = models.BinaryField()  # ids dos alunos, na ordem dos horários
+    instantes = models.BinaryField()  # Segundos (epoch) em deltas a partir do início do mês
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.mes.strftime('%m/%Y')} - {self.total} check-ins arquivados"
+
+
+class OcupacaoHoraria(models.Model):
+    """Rollup com o total de check-ins de cada hora, mantido por ``gym/ocupacao.py``."""
+    hora = models.DateTimeField(unique=True)  # Início da hora, no fuso local
+    total = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.hora.strftime('%d/%m/%Y %H:00')} - {self.total} check-ins"
+
+
+class FrequenciaDiaria(models.Model):
+    """Rollup com o total de check-ins de cada aluno por dia."""
+    aluno = models.ForeignKey(Usuario, on_delete=models.CASCADE, related_name="frequencias")
+    dia = models.DateField()
+    total = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['aluno', 'dia'], name='frequencia_aluno_dia_unica'),
+        ]
+
+    def __str__(self):
+        return f"{self.aluno_id} - {self.dia.strftime('%d/%m/%Y')}: {self.total}"
+
+
+class VinculoPersonalAluno(models.Model):
+    """Par personal/aluno com pelo menos um treino em comum, mantido por ``gym/ranking.py``."""
+    personal = models.ForeignKey(Usuario, on_delete=models.CASCADE, related_name="vinculos_como_personal")
+    aluno = models.ForeignKey(Usuario, on_delete=models.CASCADE, related_name="vinculos_como_aluno")
+    total_treinos = models.PositiveIntegerField(default=0)
+    ultimo_treino = models.DateTimeField()  # data_criacao do treino mais recente do par
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['personal', 'aluno'], name='vinculo_personal_aluno_unico'),
+        ]
+        indexes = [
+            # Janelas de tempo do ranking (últimos 30/90 dias)
+            models.Index(fields=['ultimo_treino', 'personal'], name='vinculo_ultimo_treino_idx'),
+        ]
+
+    def __str__(self):
+        return f"Personal {self.personal_id} - Aluno {self.aluno_id} ({self.total_treinos} treinos)"
+
+
+class RankingPersonal(models.Model):
+    """Número de alunos distintos de cada personal, mantido por ``gym/ranking.py``."""
+    personal = models.OneToOneField(Usuario, on_delete=models.CASCADE, primary_key=True, related_name="ranking")
+    total_alunos = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-total_alunos', '-personal'], name='ranking_total_alunos_idx'),
+        ]
+
+    def __str__(self):
+        return f"Personal {self.personal_id}: {self.total_alunos} alunos"
+
+
+class Alteracao(models.Model):
+    """
+    Log de alterações para a sincronização incremental, mantido por ``gym/sync.py``.
+
+    ``id`` é o cursor. Uma exclusão (ou a saída do objeto do escopo de um
+    aluno) fica registrada como lápide, com ``excluido``.
+    """
+    modelo = models.CharField(max_length=20)
+    objeto_id = models.BigIntegerField()
+    aluno_id = models.BigIntegerField(null=True)  # Sem FK: as lápides sobrevivem ao aluno
+    excluido = models.BooleanField(default=False)
+    criado_em = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['aluno_id', 'id'], name='alteracao_aluno_idx'),
+            models.Index(fields=['criado_em'], name='alteracao_criado_em_idx'),
+        ]
+
+    def __str__(self):
+        return f"#{self.pk} {self.modelo} {self.objeto_id}{' (excluído)' if self.excluido else ''}"
+
+
+class ProgressoImportacao(models.Model):
+    """
+    Linhas já gravadas de um CSV do ``importar_legado`` (``gym/importacao.py``),
+    atualizadas na mesma transação de cada lote.
+    """
+    checkpoint = models.CharField(max_length=255)
+    origem = models.CharField(max_length=500)  # Caminho absoluto do CSV
+    linhas = models.PositiveBigIntegerField(default=0)
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['checkpoint', 'origem'], name='progresso_importacao_unico'),
+        ]
 
     def __str__(self):
-        return f"{self.aluno.nome} - {self.data_hora_checkin.strftime('%d/%m/%Y %H:%M')}" #Ajuste no formato de data/hora
\ No newline at end of file
+        return f"{self.checkpoint}: {self.origem} ({self.linhas} linhas)"
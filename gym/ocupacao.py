@@ -0,0 +1,169 @@
+"""
+Rollups de check-in por hora (ocupação) e por aluno/dia (frequência).
+
+Os rollups são incrementados a cada check-in gravado (sinal de CheckIn e
+ingestão em lote) e podem ser refeitos a partir da tabela bruta e do arquivo
+mensal pelo comando ``compactar_checkins``. As consultas analíticas leem apenas os rollups: um
+ano inteiro tem no máximo 8.760 linhas de ocupação, qualquer que seja o
+número de check-ins.
+"""
+import heapq
+from collections import Counter
+from datetime import datetime, time, timedelta
+from django.db import connection, transaction
+from django.db.models import Count, Max, Sum
+from django.db.models.functions import TruncDate, TruncHour
+from django.utils import timezone
+from . import arquivamento
+from .models import CheckIn, OcupacaoHoraria, FrequenciaDiaria
+
+DIAS_DA_SEMANA = ['segunda', 'terça', 'quarta', 'quinta', 'sexta', 'sábado', 'domingo']
+
+
+def inicio_da_hora(data_hora):
+    return timezone.localtime(data_hora).replace(minute=0, second=0, microsecond=0)
+
+
+def somar(model, campos, contagens, tamanho_bloco=500):
+    """
+    Soma ``{(valores dos campos): n}`` aos totais do rollup.
+
+    Usa ``INSERT ... ON CONFLICT DO UPDATE`` (SQLite e PostgreSQL) para criar
+    ou incrementar todas as linhas de um bloco num único comando.
+    """
+    if not contagens:
+        return
+    opts = model._meta
+    quote = connection.ops.quote_name
+    tabela = quote(opts.db_table)
+    fields = [opts.get_field(campo) for campo in campos]
+    colunas = ', '.join(quote(field.column) for field in fields)
+    linha = '(' + ', '.join(['%s'] * (len(fields) + 1)) + ')'
+
+    itens = list(contagens.items())
+    with connection.cursor() as cursor:
+        for inicio in range(0, len(itens), tamanho_bloco):
+            bloco = itens[inicio:inicio + tamanho_bloco]
+            params = []
+            for chave, n in bloco:
+                params.extend(field.get_db_prep_value(valor, connection) for field, valor in zip(fields, chave))
+                params.append(n)
+            cursor.execute(
+                f"INSERT INTO {tabela} ({colunas}, total) VALUES {', '.join([linha] * len(bloco))} "
+                f"ON CONFLICT ({colunas}) DO UPDATE SET total = {tabela}.total + EXCLUDED.total",
+                params
+            )
+
+
+def acumular(registros):
+    """Incrementa os rollups com uma sequência de ``(aluno_id, data_hora)``."""
+    por_hora = Counter()
+    por_aluno_dia = Counter()
+    for aluno_id, data_hora in registros:
+        hora = inicio_da_hora(data_hora)
+        por_hora[(hora,)] += 1
+        por_aluno_dia[(aluno_id, hora.date())] += 1
+
+    with transaction.atomic():
+        somar(OcupacaoHoraria, ['hora'], por_hora)
+        somar(FrequenciaDiaria, ['aluno', 'dia'], por_aluno_dia)
+
+
+def limites(inicio, fim):
+    """Converte o intervalo de datas [inicio, fim] em datetimes locais."""
+    return (
+        timezone.make_aware(datetime.combine(inicio, time.min)),
+        timezone.make_aware(datetime.combine(fim + timedelta(days=1), time.min)),
+    )
+
+
+def recompactar(inicio, fim, batch_size=1000):
+    """
+    Refaz os rollups do intervalo de datas agregando a tabela quente de
+    CheckIn e os meses arquivados do intervalo.
+    """
+    de, ate = limites(inicio, fim)
+    checkins = CheckIn.objects.filter(data_hora_checkin__gte=de, data_hora_checkin__lt=ate)
+
+    por_hora = Counter()
+    por_aluno_dia = Counter()
+    for aluno_id, data_hora in arquivamento.registros(de, ate):
+        hora = inicio_da_hora(data_hora)
+        por_hora[hora] += 1
+        por_aluno_dia[(aluno_id, hora.date())] += 1
+
+    horas = (
+        checkins.annotate(hora=TruncHour('data_hora_checkin'))
+        .values('hora').annotate(total=Count('id')).order_by()
+    )
+    dias = (
+        checkins.annotate(dia=TruncDate('data_hora_checkin'))
+        .values('aluno_id', 'dia').annotate(total=Count('id')).order_by()
+    )
+
+    def linhas_horas():
+        for linha in horas.iterator():
+            yield OcupacaoHoraria(hora=linha['hora'], total=linha['total'] + por_hora.pop(linha['hora'], 0))
+        yield from (OcupacaoHoraria(hora=hora, total=total) for hora, total in por_hora.items())
+
+    def linhas_dias():
+        for linha in dias.iterator():
+            total = linha['total'] + por_aluno_dia.pop((linha['aluno_id'], linha['dia']), 0)
+            yield FrequenciaDiaria(aluno_id=linha['aluno_id'], dia=linha['dia'], total=total)
+        yield from (
+            FrequenciaDiaria(aluno_id=aluno_id, dia=dia, total=total) for (aluno_id, dia), total in por_aluno_dia.items()
+        )
+
+    with transaction.atomic():
+        OcupacaoHoraria.objects.filter(hora__gte=de, hora__lt=ate).delete()
+        FrequenciaDiaria.objects.filter(dia__gte=inicio, dia__lte=fim).delete()
+        total_horas = len(OcupacaoHoraria.objects.bulk_create(linhas_horas(), batch_size=batch_size))
+        total_dias = len(FrequenciaDiaria.objects.bulk_create(linhas_dias(), batch_size=batch_size))
+    return total_horas, total_dias
+
+
+def mapa_semanal(inicio, fim):
+    """Matriz 7x24 (segunda a domingo x hora do dia) com os check-ins do intervalo."""
+    de, ate = limites(inicio, fim)
+    matriz = [[0] * 24 for _ in DIAS_DA_SEMANA]
+    horas = OcupacaoHoraria.objects.filter(hora__gte=de, hora__lt=ate).values_list('hora', 'total')
+    for hora, total in horas.iterator():
+        hora = timezone.localtime(hora)
+        matriz[hora.weekday()][hora.hour] += total
+    return matriz
+
+
+def picos(inicio, fim, top=5):
+    """Faixas da semana e horas individuais mais movimentadas do intervalo."""
+    matriz = mapa_semanal(inicio, fim)
+    faixas = heapq.nlargest(
+        top,
+        ((total, dia, hora) for dia, linha in enumerate(matriz) for hora, total in enumerate(linha) if total),
+    )
+    de, ate = limites(inicio, fim)
+    horas = heapq.nlargest(
+        top,
+        OcupacaoHoraria.objects.filter(hora__gte=de, hora__lt=ate).values_list('total', 'hora').iterator(),
+    )
+    return {
+        'faixas_semanais': [
+            {'dia_semana': DIAS_DA_SEMANA[dia], 'hora': hora, 'total': total}
+            for total, dia, hora in faixas
+        ],
+        'horas_mais_movimentadas': [
+            {'hora': timezone.localtime(hora), 'total': total} for total, hora in horas
+        ],
+    }
+
+
+def frequencia(aluno_id, inicio, fim):
+    """Resumo de presença de um aluno no intervalo de datas."""
+    dados = FrequenciaDiaria.objects.filter(aluno_id=aluno_id, dia__gte=inicio, dia__lte=fim).aggregate(
+        dias_frequentados=Count('id'),
+        total_checkins=Sum('total'),
+        ultimo_dia=Max('dia'),
+    )
+    semanas = max(((fim - inicio).days + 1) / 7, 1)
+    dados['total_checkins'] = dados['total_checkins'] or 0
+    dados['media_semanal'] = round(dados['dias_frequentados'] / semanas, 2)
+    return dados
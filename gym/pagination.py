@@ -0,0 +1,121 @@
+import json
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, _reverse_ordering
+
+
+class CursorOpcionalPagination(CursorPagination):
+    """
+    Paginação por cursor (keyset) ativada apenas sob demanda.
+
+    Sem ``?cursor=`` ou ``?page_size=`` na URL a listagem continua devolvendo
+    a lista completa, como antes. Quando ativada, cada página é obtida com
+    ``WHERE chave > posição ORDER BY chave LIMIT n`` sobre um índice, então o
+    custo não cresce com o tamanho da tabela.
+
+    Com ordenação composta (ex.: ``('validade', 'id')``) a posição guarda os
+    valores de todas as colunas e o filtro é o da chave inteira. O
+    ``CursorPagination`` do DRF filtra só pela primeira coluna e desempata
+    com OFFSET, limitado a ``offset_cutoff``: num grupo de empates maior que
+    isso as páginas se repetiriam sem chegar ao fim.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+    def paginate_queryset(self, queryset, request, view=None):
+        params = request.query_params
+        if self.cursor_query_param not in params and self.page_size_query_param not in params:
+            return None
+        if len(self.ordering) == 1:
+            return super().paginate_queryset(queryset, request, view)
+        return self.paginar_por_chave(queryset, request)
+
+    # ============= CHAVE COMPOSTA =============
+    def _get_position_from_instance(self, instance, ordering):
+        if len(ordering) == 1:
+            return super()._get_position_from_instance(instance, ordering)
+        campos = [campo.lstrip('-') for campo in ordering]
+        if isinstance(instance, dict):
+            valores = [instance[campo] for campo in campos]
+        else:
+            valores = [getattr(instance, campo) for campo in campos]
+        return json.dumps([str(valor) for valor in valores])
+
+    def apos_a_posicao(self, model, posicao, reverso):
+        """
+        Linhas depois de ``posicao`` na ordenação (antes dela com ``reverso``):
+        ``a >= v1 AND (a > v1 OR (a = v1 AND b > v2))``. O limite da primeira
+        coluna dá a faixa do índice; o resto só descarta os empates já vistos.
+        """
+        try:
+            textos = json.loads(posicao)
+            if not isinstance(textos, list) or len(textos) != len(self.ordering):
+                raise ValueError
+            valores = [
+                model._meta.get_field(campo.lstrip('-')).to_python(texto)
+                for campo, texto in zip(self.ordering, textos)
+            ]
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+        filtro = Q()
+        iguais = {}
+        for campo, valor in zip(self.ordering, valores):
+            nome = campo.lstrip('-')
+            operador = 'lt' if campo.startswith('-') != reverso else 'gt'
+            filtro |= Q(**iguais, **{f'{nome}__{operador}': valor})
+            iguais[nome] = valor
+        primeiro = self.ordering[0]
+        limite = 'lte' if primeiro.startswith('-') != reverso else 'gte'
+        return Q(**{f'{primeiro.lstrip("-")}__{limite}': valores[0]}) & filtro
+
+    def paginar_por_chave(self, queryset, request):
+        """O ``paginate_queryset`` do DRF com o filtro pela chave inteira."""
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        self.cursor = self.decode_cursor(request)
+        offset, reverse, posicao = self.cursor if self.cursor is not None else (0, False, None)
+
+        queryset = queryset.order_by(*(_reverse_ordering(self.ordering) if reverse else self.ordering))
+        if posicao is not None:
+            queryset = queryset.filter(self.apos_a_posicao(queryset.model, posicao, reverse))
+
+        resultados = list(queryset[offset:offset + self.page_size + 1])
+        self.page = resultados[:self.page_size]
+        tem_seguinte = len(resultados) > len(self.page)
+        seguinte = self._get_position_from_instance(resultados[-1], self.ordering) if tem_seguinte else None
+
+        if reverse:
+            self.page.reverse()
+            self.has_next = posicao is not None or offset > 0
+            self.has_previous = tem_seguinte
+            self.next_position = posicao
+            self.previous_position = seguinte
+        else:
+            self.has_next = tem_seguinte
+            self.has_previous = posicao is not None or offset > 0
+            self.next_position = seguinte
+            self.previous_position = posicao
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+
+class UsuarioCursorPagination(CursorOpcionalPagination):
+    ordering = ('id',)
+
+
+class MensalidadeCursorPagination(CursorOpcionalPagination):
+    ordering = ('validade', 'id')
+
+
+class TreinoCursorPagination(CursorOpcionalPagination):
+    ordering = ('data_criacao', 'id')
+
+
+class ExercicioCursorPagination(CursorOpcionalPagination):
+    ordering = ('id',)
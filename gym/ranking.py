@@ -0,0 +1,113 @@
+"""
+Ranking materializado de personals por número de alunos distintos.
+
+``VinculoPersonalAluno`` guarda cada par personal/aluno com treinos em comum e
+``RankingPersonal`` o total de alunos de cada personal. Os dois são
+recalculados para o par afetado a cada criação, troca ou exclusão de Treino
+(ver ``gym/signals.py``), com consultas limitadas aos treinos do par e aos
+alunos do personal. A leitura do ranking não depende do tamanho de Treino.
+"""
+from datetime import timedelta
+from django.db import transaction
+from django.db.models import Count, Max
+from django.utils import timezone
+from .models import Usuario, Treino, VinculoPersonalAluno, RankingPersonal
+
+
+def sincronizar_personal(personal_id):
+    """Recalcula o total de alunos de um personal a partir dos seus vínculos."""
+    with transaction.atomic():
+        total = 0
+        if Usuario.objects.filter(pk=personal_id, is_personal=True).exists():
+            total = VinculoPersonalAluno.objects.filter(personal_id=personal_id).count()
+        if total:
+            RankingPersonal.objects.update_or_create(personal_id=personal_id, defaults={'total_alunos': total})
+        else:
+            RankingPersonal.objects.filter(personal_id=personal_id).delete()
+
+
+def sincronizar_vinculo(personal_id, aluno_id):
+    """Recalcula o vínculo de um par personal/aluno e o total do personal."""
+    if personal_id is None:
+        return
+    with transaction.atomic():
+        dados = Treino.objects.filter(personal_id=personal_id, aluno_id=aluno_id).aggregate(
+            total=Count('id'), ultimo=Max('data_criacao')
+        )
+        if dados['total']:
+            VinculoPersonalAluno.objects.update_or_create(
+                personal_id=personal_id, aluno_id=aluno_id,
+                defaults={'total_treinos': dados['total'], 'ultimo_treino': dados['ultimo']}
+            )
+        else:
+            VinculoPersonalAluno.objects.filter(personal_id=personal_id, aluno_id=aluno_id).delete()
+        sincronizar_personal(personal_id)
+
+
+def reconstruir(batch_size=1000):
+    """Reconstrói vínculos e ranking a partir de toda a tabela de Treino."""
+    pares = (
+        Treino.objects.filter(personal__isnull=False, personal__is_personal=True)
+        .values('personal_id', 'aluno_id')
+        .annotate(total_treinos=Count('id'), ultimo_treino=Max('data_criacao'))
+        .order_by()
+    )
+    with transaction.atomic():
+        VinculoPersonalAluno.objects.all().delete()
+        RankingPersonal.objects.all().delete()
+        VinculoPersonalAluno.objects.bulk_create(
+            (VinculoPersonalAluno(**par) for par in pares.iterator()), batch_size=batch_size
+        )
+        totais = (
+            VinculoPersonalAluno.objects.values('personal_id')
+            .annotate(total_alunos=Count('aluno_id')).order_by()
+        )
+        RankingPersonal.objects.bulk_create(
+            (RankingPersonal(**linha) for linha in totais.iterator()), batch_size=batch_size
+        )
+    return RankingPersonal.objects.count()
+
+
+def classificar(linhas, top):
+    """
+    Numera as linhas (já ordenadas por total decrescente) com empates
+    (1, 1, 3...) e para assim que a posição passar de ``top``.
+    """
+    ranking = []
+    anterior = None
+    for indice, linha in enumerate(linhas, start=1):
+        posicao = ranking[-1]['posicao'] if linha['total_alunos'] == anterior else indice
+        if posicao > top:
+            break
+        ranking.append({'posicao': posicao, **linha})
+        anterior = linha['total_alunos']
+    return ranking
+
+
+def ranking(top=10, dias=None):
+    """Personals com mais alunos distintos, no total ou nos últimos ``dias``."""
+    if dias is None:
+        linhas = RankingPersonal.objects.order_by('-total_alunos', '-personal_id')
+        # Total da N-ésima posição: tudo acima dele (e os empatados) é uma faixa do índice
+        corte = list(linhas.values_list('total_alunos', flat=True)[top - 1:top])
+        linhas = linhas.values('personal_id', 'personal__nome', 'total_alunos')
+        # Sem corte, há menos de N personals no ranking
+        linhas = linhas.filter(total_alunos__gte=corte[0]) if corte else linhas[:top]
+    else:
+        inicio = timezone.now() - timedelta(days=dias)
+        linhas = (
+            # Os vínculos de quem deixou de ser personal ficam (voltam a contar se ele voltar)
+            VinculoPersonalAluno.objects.filter(ultimo_treino__gte=inicio, personal__is_personal=True)
+            .values('personal_id', 'personal__nome')
+            .annotate(total_alunos=Count('aluno_id'))
+            .order_by('-total_alunos', '-personal_id')
+        )
+    return [
+        {
+            'posicao': item['posicao'],
+            'personal': item['personal_id'],
+            'nome': item['personal__nome'],
+            'total_alunos': item['total_alunos'],
+        }
+        for item in classificar(linhas.iterator(chunk_size=max(top, 100)), top)
+    ]
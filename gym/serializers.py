@@ -1,24 +1,115 @@
 from rest_framework import serializers
+from rest_framework.exceptions import ErrorDetail
+from django.db import transaction
+from django.db.models import prefetch_related_objects
+from django.utils import timezone
 from .models import Usuario, Mensalidade, Treino, Exercicio
+from .signals import treinos_criados_em_lote, exercicios_gravados_em_lote
 from datetime import date
+from functools import lru_cache
 
-class UsuarioSerializer(serializers.ModelSerializer):
+
+# ============= CAMPOS SOB DEMANDA =============
+def nomes_do_parametro(valor):
+    return [nome.strip() for nome in (valor or '').split(',') if nome.strip()]
+
+
+@lru_cache(maxsize=None)
+def relacoes_dos_campos(serializer_class):
+    """``{campo: (select_related, prefetch_related)}`` de cada campo que lê uma relação."""
+    relacoes = {}
+    for nome, campo in serializer_class().fields.items():
+        if isinstance(campo, serializers.ListSerializer):
+            relacoes[nome] = (None, campo.source)
+        elif len(campo.source_attrs) > 1:
+            relacoes[nome] = ('__'.join(campo.source_attrs[:-1]), None)
+    return relacoes
+
+
+class CamposSobDemandaMixin:
+    """
+    Respostas só com os campos pedidos. ``?fields=id,nome`` limita a resposta
+    a esses campos e ``?expand=`` acrescenta os grupos de ``Meta.expansoes``,
+    os campos que dependem de relações (ex.: ``expand=exercicios,aluno``).
+    Sem ``fields`` a resposta traz todos os campos, como antes.
+
+    ``campos`` (conjunto de nomes) recorta o serializer, e ``otimizar`` deixa
+    no queryset só os ``select_related``/``prefetch_related`` desses campos.
+    """
+    def __init__(self, *args, campos=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if campos is not None:
+            for nome in [nome for nome in self.fields if nome not in campos]:
+                self.fields.pop(nome)
+
+    @classmethod
+    def campos_pedidos(cls, params):
+        """Conjunto de campos de ``?fields=``/``?expand=``, ou ``None`` (todos) sem ``fields``."""
+        pedidos = nomes_do_parametro(params.get('fields'))
+        if not pedidos:
+            return None
+        expansoes = getattr(cls.Meta, 'expansoes', {})
+        expandir = nomes_do_parametro(params.get('expand'))
+        disponiveis = cls().fields
+        desconhecidos = [nome for nome in pedidos if nome not in disponiveis]
+        desconhecidos += [nome for nome in expandir if nome not in expansoes]
+        if desconhecidos:
+            raise serializers.ValidationError({
+                'error': f"Campos desconhecidos: {', '.join(desconhecidos)}. "
+                         f"Disponíveis: {', '.join(disponiveis)}; expand: {', '.join(expansoes) or '-'}."
+            })
+        campos = set(pedidos)
+        for nome in expandir:
+            campos.update(expansoes[nome])
+        return frozenset(campos)
+
+    @classmethod
+    def otimizar(cls, queryset, campos):
+        """Troca os ``select_related``/``prefetch_related`` do queryset pelos que ``campos`` usam."""
+        select, prefetch = set(), set()
+        for nome, (relacao, lista) in relacoes_dos_campos(cls).items():
+            if nome in campos:
+                if relacao:
+                    select.add(relacao)
+                if lista:
+                    prefetch.add(lista)
+        queryset = queryset.select_related(None).prefetch_related(None)
+        if select:
+            queryset = queryset.select_related(*sorted(select))
+        if prefetch:
+            queryset = queryset.prefetch_related(*sorted(prefetch))
+        return queryset
+
+
+class UsuarioSerializer(CamposSobDemandaMixin, serializers.ModelSerializer):
     class Meta:
         model = Usuario
-        fields = '__all__'
-        
+        # Fora da API: atualizado_em só deriva o ETag das views de detalhe e
+        # id_externo é a chave do importar_legado, não editável por aqui
+        fields = ['id', 'nome', 'data_nascimento', 'sexo', 'is_personal', 'data_inscricao']
+
     def validate_data_nascimento(self, value):
         if value and value > date.today():
             raise serializers.ValidationError("Data de nascimento não pode ser futura.")
         return value
 
 
-class MensalidadeSerializer(serializers.ModelSerializer):
+class AlunoDoPersonalSerializer(UsuarioSerializer):
+    """Aluno de um personal, com as anotações calculadas em ``alunos_personal``"""
+    total_treinos = serializers.IntegerField(read_only=True)
+    ultimo_treino = serializers.DateTimeField(read_only=True)
+
+    class Meta(UsuarioSerializer.Meta):
+        fields = UsuarioSerializer.Meta.fields + ['total_treinos', 'ultimo_treino']
+
+
+class MensalidadeSerializer(CamposSobDemandaMixin, serializers.ModelSerializer):
     aluno_nome = serializers.CharField(source='aluno.nome', read_only=True)
     
     class Meta:
         model = Mensalidade
         fields = ['id', 'aluno', 'aluno_nome', 'data_pagamento', 'valor', 'validade']
+        expansoes = {'aluno': ['aluno_nome']}
     
     def validate(self, data):
         if data['validade'] < data['data_pagamento']:
@@ -26,13 +117,13 @@ class MensalidadeSerializer(serializers.ModelSerializer):
         return data
 
 
-class ExercicioSerializer(serializers.ModelSerializer):
+class ExercicioSerializer(CamposSobDemandaMixin, serializers.ModelSerializer):
     class Meta:
         model = Exercicio
-        fields = '__all__'
+        fields = ['id', 'treino', 'nome', 'series', 'repeticoes', 'carga_kg']
 
 
-class TreinoSerializer(serializers.ModelSerializer):
+class TreinoSerializer(CamposSobDemandaMixin, serializers.ModelSerializer):
     aluno_nome = serializers.CharField(source='aluno.nome', read_only=True)
     personal_nome = serializers.CharField(source='personal.nome', read_only=True)
     exercicios = ExercicioSerializer(many=True, read_only=True)
@@ -40,6 +131,7 @@ class TreinoSerializer(serializers.ModelSerializer):
     class Meta:
         model = Treino
         fields = ['id', 'aluno', 'aluno_nome', 'personal', 'personal_nome', 'nome', 'descricao', 'data_criacao', 'exercicios']
+        expansoes = {'aluno': ['aluno_nome'], 'personal': ['personal_nome'], 'exercicios': ['exercicios']}
 
 
 class TreinoCreateSerializer(serializers.ModelSerializer):
@@ -51,4 +143,170 @@ class TreinoCreateSerializer(serializers.ModelSerializer):
     def validate_personal(self, value):
         if value and not value.is_personal:
             raise serializers.ValidationError("O usuário selecionado não é um personal trainer.")
-        return value
\ No newline at end of file
+        return value
+
+
+# ============= ESCRITA ANINHADA DE TREINOS =============
+class UsuarioPorIdField(serializers.PrimaryKeyRelatedField):
+    """
+    Resolve o usuário pelo dicionário ``usuarios`` do contexto, carregado de
+    uma vez pela view para todo o payload, antes de recorrer ao banco.
+    """
+    def to_internal_value(self, data):
+        usuarios = self.context.get('usuarios')
+        if usuarios is None:
+            return super().to_internal_value(data)
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            return usuarios[int(data)]
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        except KeyError:
+            self.fail('does_not_exist', pk_value=data)
+
+
+class ExercicioAninhadoSerializer(serializers.ModelSerializer):
+    """Exercício dentro de um treino; ``id`` identifica exercícios já existentes na substituição"""
+    id = serializers.IntegerField(required=False)
+
+    class Meta:
+        model = Exercicio
+        fields = ['id', 'nome', 'series', 'repeticoes', 'carga_kg']
+
+    def validate(self, attrs):
+        # No PATCH o partial chega aos itens; um exercício novo (sem id) ainda
+        # precisa de todos os campos obrigatórios
+        if attrs.get('id') is None:
+            faltando = {
+                nome: [ErrorDetail(campo.error_messages['required'], code='required')]
+                for nome, campo in self.fields.items()
+                if campo.required and not campo.read_only and nome not in attrs
+            }
+            if faltando:
+                raise serializers.ValidationError(faltando)
+        return attrs
+
+
+class TreinoLoteListSerializer(serializers.ListSerializer):
+    """Cria vários treinos e todos os seus exercícios com bulk_create numa única transação"""
+    def create(self, validated_data):
+        with transaction.atomic():
+            treinos = [
+                Treino(**{campo: valor for campo, valor in item.items() if campo != 'exercicios'})
+                for item in validated_data
+            ]
+            Treino.objects.bulk_create(treinos)
+            Exercicio.objects.bulk_create(
+                [
+                    Exercicio(treino=treino, **TreinoComExerciciosSerializer.campos_do_exercicio(dados))
+                    for treino, item in zip(treinos, validated_data)
+                    for dados in item.get('exercicios', [])
+                ],
+                batch_size=500
+            )
+            treinos_criados_em_lote(treinos)
+        prefetch_related_objects(treinos, 'exercicios')
+        return treinos
+
+
+class TreinoComExerciciosSerializer(TreinoCreateSerializer):
+    """
+    Cria ou substitui um treino junto com todos os seus exercícios.
+
+    Os exercícios são gravados com bulk_create/bulk_update na mesma transação
+    do treino. No PUT a lista substitui a coleção (os exercícios que ficam de
+    fora são excluídos); no PATCH só os listados são atualizados (com ``id``)
+    ou criados (sem ``id``). A resposta tem o mesmo formato de
+    ``TreinoSerializer``.
+    """
+    aluno = UsuarioPorIdField(queryset=Usuario.objects.all())
+    personal = UsuarioPorIdField(queryset=Usuario.objects.all(), allow_null=True, required=False)
+    exercicios = ExercicioAninhadoSerializer(many=True, required=False)
+
+    class Meta:
+        model = Treino
+        fields = ['aluno', 'personal', 'nome', 'descricao', 'exercicios']
+        list_serializer_class = TreinoLoteListSerializer
+
+    def to_internal_value(self, data):
+        try:
+            return super().to_internal_value(data)
+        except serializers.ValidationError as exc:
+            erros = exc.detail.get('exercicios') if isinstance(exc.detail, dict) else None
+            if isinstance(erros, dict) and isinstance(data.get('exercicios'), list):
+                # No PATCH o DRF indexa os erros dos itens num dict; a lista mantém o formato do POST/PUT
+                exc.detail['exercicios'] = [erros.get(indice, {}) for indice in range(len(data['exercicios']))]
+            raise
+
+    @staticmethod
+    def campos_do_exercicio(dados):
+        return {campo: valor for campo, valor in dados.items() if campo != 'id'}
+
+    def create(self, validated_data):
+        exercicios = validated_data.pop('exercicios', [])
+        with transaction.atomic():
+            treino = Treino.objects.create(**validated_data)
+            Exercicio.objects.bulk_create(
+                [Exercicio(treino=treino, **self.campos_do_exercicio(dados)) for dados in exercicios],
+                batch_size=500
+            )
+            exercicios_gravados_em_lote(treino)
+        prefetch_related_objects([treino], 'exercicios')
+        return treino
+
+    def update(self, instance, validated_data):
+        exercicios = validated_data.pop('exercicios', None)
+        with transaction.atomic():
+            instance = super().update(instance, validated_data)
+            if exercicios is not None:
+                self.substituir_exercicios(instance, exercicios)
+                exercicios_gravados_em_lote(instance)
+        if hasattr(instance, '_prefetched_objects_cache'):
+            instance._prefetched_objects_cache.pop('exercicios', None)
+        prefetch_related_objects([instance], 'exercicios')
+        return instance
+
+    def substituir_exercicios(self, treino, exercicios):
+        """
+        Atualiza os exercícios com id, cria os novos e, fora do PATCH, exclui
+        os que ficaram de fora.
+        """
+        existentes = {exercicio.id: exercicio for exercicio in Exercicio.objects.filter(treino=treino)}
+        # Erros por item, como os da validação da lista
+        erros, vistos = [], set()
+        for dados in exercicios:
+            exercicio_id = dados.get('id')
+            if exercicio_id is not None and exercicio_id not in existentes:
+                erros.append({'id': [f"O exercício {exercicio_id} não pertence a este treino."]})
+            elif exercicio_id is not None and exercicio_id in vistos:
+                erros.append({'id': [f"O exercício {exercicio_id} aparece mais de uma vez."]})
+            else:
+                erros.append({})
+            vistos.add(exercicio_id)
+        if any(erros):
+            raise serializers.ValidationError({'exercicios': erros})
+
+        campos = ['nome', 'series', 'repeticoes', 'carga_kg']
+        agora = timezone.now()
+        mantidos, novos = [], []
+        for dados in exercicios:
+            exercicio_id = dados.get('id')
+            if exercicio_id is None:
+                novos.append(Exercicio(treino=treino, **self.campos_do_exercicio(dados)))
+                continue
+            exercicio = existentes.pop(exercicio_id)
+            for campo in campos:
+                if campo in dados:
+                    setattr(exercicio, campo, dados[campo])
+            # bulk_update não aplica auto_now
+            exercicio.atualizado_em = agora
+            mantidos.append(exercicio)
+
+        if existentes and not self.partial:
+            Exercicio.objects.filter(id__in=list(existentes)).delete()
+        Exercicio.objects.bulk_update(mantidos, campos + ['atualizado_em'], batch_size=500)
+        Exercicio.objects.bulk_create(novos, batch_size=500)
+
+    def to_representation(self, instance):
+        return TreinoSerializer(instance, context=self.context).data
@@ -0,0 +1,283 @@
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver
+from . import alteracoes, busca, elegibilidade, estatisticas, ocupacao, ranking, volume
+from django.utils import timezone
+from .models import Usuario, Mensalidade, ResumoMensalidade, Treino, Exercicio, CheckIn
+
+
+def sincronizar_resumo(aluno_id):
+    """Atualiza o resumo do aluno e ajusta o contador de alunos ativos."""
+    anterior, nova = ResumoMensalidade.objects.sincronizar(aluno_id)
+    estatisticas.ajustar(alunos_ativos=int(bool(nova)) - int(bool(anterior)))
+
+
+# ============= RESUMO DE MENSALIDADE =============
+@receiver(pre_save, sender=Mensalidade)
+def guardar_aluno_anterior(sender, instance, raw=False, **kwargs):
+    """Guarda o aluno original para atualizar os dois resumos se a mensalidade mudar de aluno."""
+    if raw or instance.pk is None:
+        return
+    instance._aluno_anterior_id = (
+        Mensalidade.objects.filter(pk=instance.pk).values_list('aluno_id', flat=True).first()
+    )
+
+
+@receiver(post_save, sender=Mensalidade)
+def atualizar_resumo_apos_salvar(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    sincronizar_resumo(instance.aluno_id)
+    aluno_anterior_id = getattr(instance, '_aluno_anterior_id', None)
+    if aluno_anterior_id and aluno_anterior_id != instance.aluno_id:
+        sincronizar_resumo(aluno_anterior_id)
+
+
+@receiver(post_delete, sender=Mensalidade)
+def atualizar_resumo_apos_excluir(sender, instance, **kwargs):
+    sincronizar_resumo(instance.aluno_id)
+
+
+# ============= ESTATÍSTICAS DO DASHBOARD =============
+def deltas_usuario(is_personal, sinal):
+    return {
+        'total_usuarios': sinal,
+        'total_personals': sinal if is_personal else 0,
+        'total_alunos': 0 if is_personal else sinal,
+    }
+
+
+@receiver(pre_save, sender=Usuario)
+def guardar_tipo_anterior(sender, instance, raw=False, **kwargs):
+    if raw or instance.pk is None:
+        return
+    instance._is_personal_anterior, instance._nome_anterior = (
+        Usuario.objects.filter(pk=instance.pk).values_list('is_personal', 'nome').first() or (None, None)
+    )
+
+
+@receiver(post_save, sender=Usuario)
+def contar_usuario_salvo(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        estatisticas.ajustar(**deltas_usuario(instance.is_personal, 1))
+        return
+    anterior = getattr(instance, '_is_personal_anterior', None)
+    if anterior is not None and anterior != instance.is_personal:
+        estatisticas.ajustar(
+            total_personals=1 if instance.is_personal else -1,
+            total_alunos=-1 if instance.is_personal else 1,
+        )
+        ranking.sincronizar_personal(instance.pk)
+
+
+@receiver(post_delete, sender=Usuario)
+def contar_usuario_excluido(sender, instance, **kwargs):
+    estatisticas.ajustar(**deltas_usuario(instance.is_personal, -1))
+
+
+@receiver(post_save, sender=Treino)
+def contar_treino_criado(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        estatisticas.ajustar(total_treinos=1)
+
+
+@receiver(post_delete, sender=Treino)
+def contar_treino_excluido(sender, instance, **kwargs):
+    estatisticas.ajustar(total_treinos=-1)
+
+
+# ============= ROLLUPS DE CHECK-IN =============
+@receiver(post_save, sender=CheckIn)
+def acumular_checkin(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        ocupacao.acumular([(instance.aluno_id, instance.data_hora_checkin)])
+
+
+# ============= RANKING DE PERSONALS =============
+@receiver(pre_save, sender=Treino)
+def guardar_par_anterior(sender, instance, raw=False, **kwargs):
+    if raw or instance.pk is None:
+        return
+    instance._par_anterior = (
+        Treino.objects.filter(pk=instance.pk).values_list('personal_id', 'aluno_id').first()
+    )
+
+
+@receiver(post_save, sender=Treino)
+def atualizar_ranking_apos_salvar(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    ranking.sincronizar_vinculo(instance.personal_id, instance.aluno_id)
+    par_anterior = getattr(instance, '_par_anterior', None)
+    if par_anterior and par_anterior != (instance.personal_id, instance.aluno_id):
+        ranking.sincronizar_vinculo(*par_anterior)
+
+
+@receiver(post_delete, sender=Treino)
+def atualizar_ranking_apos_excluir(sender, instance, **kwargs):
+    ranking.sincronizar_vinculo(instance.personal_id, instance.aluno_id)
+
+
+# ============= VERSÃO DO TREINO =============
+@receiver(post_save, sender=Exercicio)
+@receiver(post_delete, sender=Exercicio)
+def tocar_treino(sender, instance, raw=False, **kwargs):
+    """Exercícios fazem parte da representação do treino: mudam o seu ETag."""
+    if not raw:
+        Treino.objects.filter(pk=instance.treino_id).update(atualizado_em=timezone.now())
+
+
+# ============= BUSCA TEXTUAL =============
+@receiver(post_save, sender=Treino)
+@receiver(post_delete, sender=Treino)
+def indexar_treino(sender, instance, raw=False, **kwargs):
+    if not raw:
+        busca.indexar([instance.pk])
+
+
+@receiver(post_save, sender=Exercicio)
+@receiver(post_delete, sender=Exercicio)
+def indexar_treino_do_exercicio(sender, instance, raw=False, **kwargs):
+    if not raw:
+        busca.indexar([instance.treino_id])
+
+
+# ============= VOLUME DE TREINO =============
+@receiver(post_save, sender=Treino)
+@receiver(post_delete, sender=Treino)
+def invalidar_volume_do_treino(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    par_anterior = getattr(instance, '_par_anterior', None)
+    volume.invalidar(instance.aluno_id, par_anterior[1] if par_anterior else None)
+
+
+@receiver(post_save, sender=Exercicio)
+@receiver(post_delete, sender=Exercicio)
+def invalidar_volume_do_exercicio(sender, instance, raw=False, **kwargs):
+    if not raw:
+        volume.invalidar(Treino.objects.filter(pk=instance.treino_id).values_list('aluno_id', flat=True).first())
+
+
+# ============= ELEGIBILIDADE DE CHECK-IN =============
+@receiver(post_save, sender=Usuario)
+@receiver(post_delete, sender=Usuario)
+def invalidar_elegibilidade_do_usuario(sender, instance, raw=False, **kwargs):
+    if not raw:
+        elegibilidade.invalidar(instance.pk)
+
+
+@receiver(post_save, sender=Mensalidade)
+@receiver(post_delete, sender=Mensalidade)
+def invalidar_elegibilidade_da_mensalidade(sender, instance, raw=False, **kwargs):
+    if not raw:
+        elegibilidade.invalidar(instance.aluno_id, getattr(instance, '_aluno_anterior_id', None))
+
+
+# ============= LOG DE ALTERAÇÕES (SINCRONIZAÇÃO) =============
+def aluno_do_treino(treino_id):
+    return Treino.objects.filter(pk=treino_id).values_list('aluno_id', flat=True).first()
+
+
+@receiver(post_save, sender=Usuario)
+def registrar_usuario(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    alteracoes.registrar(alteracoes.USUARIO, [(instance.pk, instance.pk)])
+    nome_anterior = getattr(instance, '_nome_anterior', None)
+    if not created and nome_anterior is not None and nome_anterior != instance.nome:
+        alteracoes.registrar_exibicoes_do_nome(instance.pk)
+
+
+@receiver(pre_delete, sender=Usuario)
+def registrar_treinos_sem_personal(sender, instance, **kwargs):
+    # O SET_NULL de Treino.personal é um UPDATE em lote, sem sinais; os treinos
+    # do próprio usuário como aluno são excluídos em cascata e viram lápides
+    treinos = Treino.objects.filter(personal_id=instance.pk).exclude(aluno_id=instance.pk)
+    alteracoes.registrar(alteracoes.TREINO, list(treinos.values_list('id', 'aluno_id')))
+
+
+@receiver(post_delete, sender=Usuario)
+def registrar_usuario_excluido(sender, instance, **kwargs):
+    alteracoes.registrar(alteracoes.USUARIO, [(instance.pk, instance.pk)], excluido=True)
+
+
+@receiver(post_save, sender=Treino)
+def registrar_treino(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    par_anterior = getattr(instance, '_par_anterior', None)
+    if par_anterior and par_anterior[1] != instance.aluno_id:
+        # O treino e os seus exercícios saem do escopo do aluno anterior e entram no do novo
+        alteracoes.registrar(alteracoes.TREINO, [(instance.pk, par_anterior[1])], excluido=True)
+        alteracoes.registrar_exercicios([instance.pk], excluido=True, aluno_id=par_anterior[1])
+        alteracoes.registrar_exercicios([instance.pk], aluno_id=instance.aluno_id)
+    alteracoes.registrar(alteracoes.TREINO, [(instance.pk, instance.aluno_id)])
+
+
+@receiver(post_delete, sender=Treino)
+def registrar_treino_excluido(sender, instance, **kwargs):
+    alteracoes.registrar(alteracoes.TREINO, [(instance.pk, instance.aluno_id)], excluido=True)
+
+
+@receiver(pre_save, sender=Exercicio)
+def guardar_treino_anterior(sender, instance, raw=False, **kwargs):
+    if raw or instance.pk is None:
+        return
+    instance._treino_anterior_id = (
+        Exercicio.objects.filter(pk=instance.pk).values_list('treino_id', flat=True).first()
+    )
+
+
+@receiver(post_save, sender=Exercicio)
+def registrar_exercicio(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    aluno_id = aluno_do_treino(instance.treino_id)
+    treino_anterior_id = getattr(instance, '_treino_anterior_id', None)
+    if treino_anterior_id and treino_anterior_id != instance.treino_id:
+        aluno_anterior_id = aluno_do_treino(treino_anterior_id)
+        if aluno_anterior_id != aluno_id:
+            alteracoes.registrar(alteracoes.EXERCICIO, [(instance.pk, aluno_anterior_id)], excluido=True)
+    alteracoes.registrar(alteracoes.EXERCICIO, [(instance.pk, aluno_id)])
+
+
+@receiver(post_delete, sender=Exercicio)
+def registrar_exercicio_excluido(sender, instance, **kwargs):
+    alteracoes.registrar(alteracoes.EXERCICIO, [(instance.pk, aluno_do_treino(instance.treino_id))], excluido=True)
+
+
+@receiver(post_save, sender=Mensalidade)
+def registrar_mensalidade(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    aluno_anterior_id = getattr(instance, '_aluno_anterior_id', None)
+    if aluno_anterior_id and aluno_anterior_id != instance.aluno_id:
+        alteracoes.registrar(alteracoes.MENSALIDADE, [(instance.pk, aluno_anterior_id)], excluido=True)
+    alteracoes.registrar(alteracoes.MENSALIDADE, [(instance.pk, instance.aluno_id)])
+
+
+@receiver(post_delete, sender=Mensalidade)
+def registrar_mensalidade_excluida(sender, instance, **kwargs):
+    alteracoes.registrar(alteracoes.MENSALIDADE, [(instance.pk, instance.aluno_id)], excluido=True)
+
+
+# ============= GRAVAÇÕES EM LOTE =============
+def treinos_criados_em_lote(treinos):
+    """Equivalente aos post_save acima para treinos gravados com bulk_create."""
+    estatisticas.ajustar(total_treinos=len(treinos))
+    for personal_id, aluno_id in {(treino.personal_id, treino.aluno_id) for treino in treinos}:
+        ranking.sincronizar_vinculo(personal_id, aluno_id)
+    busca.indexar(treino.pk for treino in treinos)
+    volume.invalidar(*{treino.aluno_id for treino in treinos})
+    alteracoes.registrar(alteracoes.TREINO, [(treino.pk, treino.aluno_id) for treino in treinos])
+    alteracoes.registrar_exercicios([treino.pk for treino in treinos])
+
+
+def exercicios_gravados_em_lote(treino):
+    """Equivalente aos sinais de Exercicio para exercícios gravados com bulk_create/bulk_update."""
+    busca.indexar([treino.pk])
+    volume.invalidar(treino.aluno_id)
+    # Os excluídos já passaram pelo post_delete
+    alteracoes.registrar_exercicios([treino.pk], aluno_id=treino.aluno_id)
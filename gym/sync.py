@@ -0,0 +1,146 @@
+"""
+Sincronização incremental para clientes offline (``/api/sync/``).
+
+Toda gravação de Usuario, Treino, Exercicio e Mensalidade acrescenta, na
+mesma transação, uma linha ao log ``Alteracao`` (sinais e gravações em
+lote). O ``id`` do log é o cursor:
+
+- sem ``since``, o cliente recebe o retrato atual dos dados de um aluno
+  (``aluno=``, obrigatório: o retrato não é paginado e, sem ele, seria a
+  base inteira numa resposta) e o cursor do fim do log;
+- com ``since``, recebe só os objetos alterados ou excluídos depois do
+  cursor, lidos pelo índice ``(aluno_id, id)`` do log. O custo depende do
+  número de alterações, não do tamanho do histórico.
+
+Cada objeto é registrado com o aluno a que pertence (o próprio usuário, o
+aluno do treino, da mensalidade ou do treino do exercício). Quando um objeto
+muda de aluno, o anterior recebe uma lápide. Mudanças no nome de um usuário
+também registram os treinos e mensalidades que o exibem (``aluno_nome``,
+``personal_nome``), e a exclusão de um personal, os treinos que ficam sem ele.
+
+O cursor devolvido não passa das alterações dos últimos
+``SYNC_MARGEM_SEGUNDOS``: uma transação mais antiga ainda em andamento pode
+confirmar um id menor depois da leitura. Essas alterações voltam na chamada
+seguinte, e aplicar a mesma alteração duas vezes não muda nada no cliente.
+
+A margem é uma garantia de tempo, não de ordem, e o seu limite depende do
+banco:
+
+- no SQLite as transações de escrita são IMMEDIATE (ver ``DATABASES``) e
+  não se sobrepõem, então os ids são confirmados na ordem e a margem nem é
+  necessária;
+- no PostgreSQL o id vem da sequência no INSERT da entrada, não no commit.
+  Uma transação que demore mais que a margem entre gravar a entrada e
+  confirmar pode ter o id ultrapassado por um cliente, que então não recebe
+  essa alteração até refazer o retrato. As gravações da aplicação registram
+  o log no fim da transação (sinais, gravações em lote, cada lote do
+  ``importar_legado``), mas código que altere esses modelos dentro de uma
+  transação longa (scripts, migrações de dados) precisa de uma margem maior
+  que ela, ou de rodar com a API de sincronização parada.
+
+O log é gravado por ``gym/alteracoes.py`` e podado pelo comando
+``podar_alteracoes``; um cursor anterior à poda recebe 410 e o cliente
+refaz o retrato.
+"""
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import Max
+from django.utils import timezone
+from .alteracoes import USUARIO, TREINO, EXERCICIO, MENSALIDADE
+from .leitura import LeituraRapida
+from .models import Alteracao, Usuario, Treino, Exercicio, Mensalidade
+from .serializers import UsuarioSerializer, TreinoSerializer, ExercicioSerializer, MensalidadeSerializer
+
+LIMITE_PADRAO = 1000
+LIMITE_MAXIMO = 5000
+
+
+class CursorExpirado(Exception):
+    pass
+
+
+# ============= LEITURA =============
+def leituras():
+    """``{modelo: (chave da resposta, model, leitura rápida)}``; treinos sem os exercícios aninhados."""
+    treino = LeituraRapida(TreinoSerializer)
+    campos_treino = [chave for chave in TreinoSerializer().fields if chave != 'exercicios']
+    return {
+        USUARIO: ('usuarios', Usuario, LeituraRapida(UsuarioSerializer)),
+        TREINO: ('treinos', Treino, treino.recorte(campos_treino)),
+        EXERCICIO: ('exercicios', Exercicio, LeituraRapida(ExercicioSerializer)),
+        MENSALIDADE: ('mensalidades', Mensalidade, LeituraRapida(MensalidadeSerializer)),
+    }
+
+
+LEITURAS = leituras()
+
+
+def escopo(modelo, aluno_id):
+    """Queryset do retrato de um modelo, limitado ao aluno."""
+    _, model, _ = LEITURAS[modelo]
+    filtro = {
+        USUARIO: {'pk': aluno_id},
+        TREINO: {'aluno_id': aluno_id},
+        EXERCICIO: {'treino__aluno_id': aluno_id},
+        MENSALIDADE: {'aluno_id': aluno_id},
+    }[modelo]
+    return model.objects.filter(**filtro)
+
+
+def resposta_vazia(cursor, completo, mais=False):
+    dados = {'cursor': cursor, 'completo': completo, 'mais': mais}
+    for chave, _, _ in LEITURAS.values():
+        dados[chave] = {'alterados': [], 'excluidos': []}
+    return dados
+
+
+def retrato(aluno_id):
+    """Todos os objetos do aluno e o cursor do fim do log, lido antes dos dados."""
+    cursor = Alteracao.objects.aggregate(ultimo=Max('id'))['ultimo'] or 0
+    dados = resposta_vazia(cursor, completo=True)
+    for modelo, (chave, _, leitura) in LEITURAS.items():
+        dados[chave]['alterados'] = leitura.representar(leitura.valores(escopo(modelo, aluno_id)))
+    return dados
+
+
+def alteracoes(since, aluno_id=None, limite=LIMITE_PADRAO):
+    """Objetos alterados e excluídos depois do cursor ``since``, no máximo ``limite`` entradas do log."""
+    primeiro = Alteracao.objects.order_by('id').values_list('id', flat=True).first()
+    if primeiro is not None and since < primeiro - 1:
+        raise CursorExpirado()
+
+    entradas = Alteracao.objects.filter(id__gt=since)
+    if aluno_id is not None:
+        entradas = entradas.filter(aluno_id=aluno_id)
+    entradas = list(
+        entradas.order_by('id').values_list('id', 'modelo', 'objeto_id', 'excluido', 'criado_em')[:limite + 1]
+    )
+    mais = len(entradas) > limite
+    entradas = entradas[:limite]
+
+    # Cursor até a última entrada fora da margem; depois dela tudo volta na próxima chamada
+    seguro = timezone.now() - timedelta(seconds=settings.SYNC_MARGEM_SEGUNDOS)
+    cursor = since
+    for entrada_id, _, _, _, criado_em in entradas:
+        if criado_em > seguro:
+            break
+        cursor = entrada_id
+    # Com o cursor retido pela margem, pedir a próxima página agora traria as mesmas entradas
+    mais = mais and cursor == entradas[-1][0]
+
+    # A última entrada de cada objeto decide se ele foi alterado ou excluído
+    estados = {}
+    for _, modelo, objeto_id, excluido, _ in entradas:
+        estados[(modelo, objeto_id)] = excluido
+
+    dados = resposta_vazia(cursor, completo=False, mais=mais)
+    for modelo, (chave, model, leitura) in LEITURAS.items():
+        alterados = [objeto_id for (tipo, objeto_id), excluido in estados.items() if tipo == modelo and not excluido]
+        dados[chave]['excluidos'] = sorted(
+            objeto_id for (tipo, objeto_id), excluido in estados.items() if tipo == modelo and excluido
+        )
+        if alterados:
+            dados[chave]['alterados'] = leitura.representar(
+                leitura.valores(model.objects.filter(pk__in=alterados).order_by('pk'))
+            )
+    return dados
@@ -1,9 +1,41 @@
+import csv
+import json
+import os
+import re
+import tempfile
+import time as time_module
+from io import StringIO
+from unittest import mock, skipUnless
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import Max, Min
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
 from django.utils import timezone
-from datetime import date, timedelta
-from .models import Usuario, Mensalidade, Treino, Exercicio, CheckIn
+from datetime import date, datetime, time, timedelta
+from core import db_router
+from core.middleware import OrcamentoQueriesExcedido, histograma
+from . import arquivamento, benchmark, elegibilidade, estatisticas, ocupacao, ranking, vencimentos, volume
+from .admin import AdminEscalavel, ContagemEstimadaPaginator, QuerySetDoAdmin
+from .serializers import UsuarioSerializer, MensalidadeSerializer, TreinoSerializer, ExercicioSerializer
+from .views import UsuarioListCreateView
+from .models import (
+    Usuario, Mensalidade, ResumoMensalidade, Treino, Exercicio, CheckIn,
+    OcupacaoHoraria, FrequenciaDiaria, VinculoPersonalAluno, RankingPersonal, ArquivoCheckIn, Alteracao,
+    ProgressoImportacao
+)
+
+
+def limpar_caches():
+    for cache in caches.all():
+        cache.clear()
+
 
 class UsuarioCrudTest(APITestCase):
     def setUp(self):
@@ -25,6 +57,18 @@ class UsuarioCrudTest(APITestCase):
         self.assertEqual(Usuario.objects.count(), 1)
         self.assertEqual(Usuario.objects.get().nome, "João Aluno")
 
+    def test_id_externo_fica_fora_da_api(self):
+        response = self.client.post(self.url, {**self.aluno_data, "id_externo": "A1"}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertNotIn('id_externo', response.data)
+        self.assertIsNone(Usuario.objects.get().id_externo)
+
+        Usuario.objects.update(id_externo='A1')
+        url = reverse('usuario-detail', kwargs={'pk': response.data['id']})
+        self.client.patch(url, {"id_externo": "B2"}, format='json')
+        self.assertEqual(Usuario.objects.get().id_externo, 'A1')
+        self.assertNotIn('id_externo', self.client.get(self.url).data[0])
+
     def test_listar_usuarios(self):
         Usuario.objects.create(**self.aluno_data)
         response = self.client.get(self.url, format='json')
@@ -106,6 +150,7 @@ class MensalidadeCrudTest(APITestCase):
 
 class CustomViewsTest(APITestCase):
     def setUp(self):
+        limpar_caches()
         self.personal = Usuario.objects.create(nome="Personal X", is_personal=True)
         self.aluno1 = Usuario.objects.create(nome="Aluno A", is_personal=False)
         self.aluno2 = Usuario.objects.create(nome="Aluno B", is_personal=False)
@@ -123,6 +168,23 @@ class CustomViewsTest(APITestCase):
         self.assertIn("Aluno A", nomes_alunos)
         self.assertIn("Aluno B", nomes_alunos)
 
+    def test_alunos_personal_sem_repeticao_e_com_estatisticas(self):
+        Treino.objects.create(aluno=self.aluno1, personal=self.personal, nome="Treino A2")
+        url = reverse('alunos-personal', kwargs={'personal_id': self.personal.pk})
+        response = self.client.get(url, {'estatisticas': '1'})
+        self.assertEqual([aluno['id'] for aluno in response.data], [self.aluno1.pk, self.aluno2.pk])
+        self.assertEqual(response.data[0]['total_treinos'], 2)
+        self.assertEqual(response.data[1]['total_treinos'], 1)
+        self.assertIsNotNone(response.data[0]['ultimo_treino'])
+
+    def test_alunos_personal_paginado(self):
+        url = reverse('alunos-personal', kwargs={'personal_id': self.personal.pk})
+        response = self.client.get(url, {'page_size': 1})
+        self.assertEqual(response.data['results'][0]['nome'], "Aluno A")
+        response = self.client.get(response.data['next'])
+        self.assertEqual(response.data['results'][0]['nome'], "Aluno B")
+        self.assertIsNone(response.data['next'])
+
     def test_status_mensalidade_ativo(self):
         mensalidade_ativa = Mensalidade.objects.create(
             aluno=self.aluno1,
@@ -226,4 +288,2078 @@ class CheckInViewTest(APITestCase):
         
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertIn("Apenas alunos podem fazer check-in", response.data['error'])
-        self.assertEqual(CheckIn.objects.count(), 0)
\ No newline at end of file
+        self.assertEqual(CheckIn.objects.count(), 0)
+
+class PaginacaoStreamingTest(APITestCase):
+    def setUp(self):
+        self.aluno = Usuario.objects.create(nome="Aluno Paginado", is_personal=False)
+        for dias in range(5):
+            Mensalidade.objects.create(
+                aluno=self.aluno,
+                data_pagamento=date.today(),
+                validade=date.today() + timedelta(days=dias),
+                valor=100
+            )
+        self.url = reverse('mensalidade-list-create')
+
+    def test_listagem_sem_parametros_nao_pagina(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 5)
+
+    def test_paginacao_por_cursor(self):
+        response = self.client.get(self.url, {'page_size': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 2)
+        validades = [m['validade'] for m in response.data['results']]
+
+        # Percorre as páginas seguintes pelo link "next"
+        proxima = response.data['next']
+        while proxima:
+            response = self.client.get(proxima)
+            validades += [m['validade'] for m in response.data['results']]
+            proxima = response.data['next']
+
+        self.assertEqual(len(validades), 5)
+        self.assertEqual(validades, sorted(validades))
+
+    def test_cursor_percorre_empates_alem_do_offset_cutoff(self):
+        # Mais linhas com a mesma validade que o offset_cutoff (1000) do DRF
+        vencimento = date.today() + timedelta(days=60)
+        Mensalidade.objects.bulk_create([
+            Mensalidade(aluno=self.aluno, data_pagamento=date.today(), validade=vencimento, valor=100)
+            for _ in range(1200)
+        ])
+        esperados = list(Mensalidade.objects.order_by('validade', 'id').values_list('id', flat=True))
+
+        ids, paginas = [], []
+        proxima = f"{self.url}?page_size=500"
+        while proxima:
+            response = self.client.get(proxima)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            paginas.append(response.data)
+            ids += [m['id'] for m in response.data['results']]
+            proxima = response.data['next']
+        self.assertEqual(ids, esperados)
+
+        # E de volta pelo link "previous"
+        response = self.client.get(paginas[-1]['previous'])
+        self.assertEqual([m['id'] for m in response.data['results']], esperados[500:1000])
+
+    def test_cursor_invalido(self):
+        response = self.client.get(self.url, {'cursor': 'cD1ub3Bl'})  # p=nope
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_stream_ndjson(self):
+        response = self.client.get(self.url, {'stream': '1'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        linhas = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(linhas), 5)
+        primeira = json.loads(linhas[0])
+        self.assertEqual(primeira['aluno_nome'], "Aluno Paginado")
+
+    def test_stream_treinos_com_exercicios(self):
+        treino = Treino.objects.create(aluno=self.aluno, nome="Treino Stream")
+        Exercicio.objects.create(treino=treino, nome="Supino")
+        response = self.client.get(reverse('treino-list-create'), {'stream': 'true'})
+        linhas = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(linhas), 1)
+        self.assertEqual(json.loads(linhas[0])['exercicios'][0]['nome'], "Supino")
+
+
+class ResumoMensalidadeTest(APITestCase):
+    def setUp(self):
+        self.aluno = Usuario.objects.create(nome="Aluno Resumo", is_personal=False)
+        self.outro_aluno = Usuario.objects.create(nome="Outro Resumo", is_personal=False)
+
+    def criar_mensalidade(self, aluno, dias):
+        return Mensalidade.objects.create(
+            aluno=aluno,
+            data_pagamento=date.today() - timedelta(days=60),
+            validade=date.today() + timedelta(days=dias),
+            valor=100
+        )
+
+    def test_resumo_acompanha_criacao_e_exclusao(self):
+        antiga = self.criar_mensalidade(self.aluno, -10)
+        recente = self.criar_mensalidade(self.aluno, 20)
+        resumo = ResumoMensalidade.objects.get(aluno=self.aluno)
+        self.assertEqual(resumo.ultima_mensalidade, recente)
+
+        recente.delete()
+        resumo.refresh_from_db()
+        self.assertEqual(resumo.ultima_mensalidade, antiga)
+
+        antiga.delete()
+        self.assertFalse(ResumoMensalidade.objects.filter(aluno=self.aluno).exists())
+
+    def test_resumo_ao_trocar_aluno_da_mensalidade(self):
+        mensalidade = self.criar_mensalidade(self.aluno, 10)
+        mensalidade.aluno = self.outro_aluno
+        mensalidade.save()
+        self.assertFalse(ResumoMensalidade.objects.filter(aluno=self.aluno).exists())
+        self.assertEqual(ResumoMensalidade.objects.get(aluno=self.outro_aluno).ultima_mensalidade, mensalidade)
+
+    def test_falha_no_resumo_desfaz_a_mensalidade(self):
+        with mock.patch.object(ResumoMensalidade.objects, 'sincronizar', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.criar_mensalidade(self.aluno, 10)
+        self.assertFalse(Mensalidade.objects.exists())
+
+    def test_resumo_criado_por_transacao_concorrente(self):
+        mensalidade, = Mensalidade.objects.bulk_create([Mensalidade(
+            aluno=self.aluno, data_pagamento=date.today(), validade=date.today() + timedelta(days=30), valor=100
+        )])
+        original = ResumoMensalidade.objects.select_for_update
+        chamadas = []
+
+        def concorrente():
+            chamadas.append(1)
+            if len(chamadas) == 1:
+                # O outro pagamento confirma o resumo logo depois da nossa leitura
+                ResumoMensalidade.objects.bulk_create([
+                    ResumoMensalidade(aluno=self.aluno, validade=date.today() - timedelta(days=1), ativa=False)
+                ])
+                return ResumoMensalidade.objects.none()
+            return original()
+
+        with mock.patch.object(ResumoMensalidade.objects, 'select_for_update', side_effect=concorrente):
+            self.assertEqual(ResumoMensalidade.objects.sincronizar(self.aluno.pk), (False, True))
+        resumo = ResumoMensalidade.objects.get(aluno=self.aluno)
+        self.assertEqual((resumo.ultima_mensalidade_id, resumo.ativa), (mensalidade.pk, True))
+
+    def test_exclusao_do_aluno_remove_resumo(self):
+        self.criar_mensalidade(self.aluno, 10)
+        self.aluno.delete()
+        self.assertEqual(ResumoMensalidade.objects.count(), 0)
+
+    def test_comando_reconstruir(self):
+        self.criar_mensalidade(self.aluno, -5)
+        recente = self.criar_mensalidade(self.aluno, 5)
+        ResumoMensalidade.objects.all().delete()
+        call_command('reconstruir_resumo_mensalidades', stdout=StringIO())
+        self.assertEqual(ResumoMensalidade.objects.get(aluno=self.aluno).ultima_mensalidade, recente)
+
+    def test_checkin_consulta_apenas_o_resumo(self):
+        self.criar_mensalidade(self.aluno, 10)
+        url = reverse('aluno-checkin', kwargs={'aluno_id': self.aluno.pk})
+        # Uma leitura (usuário + resumo), a inserção do check-in e os dois
+        # upserts dos rollups de ocupação dentro de um savepoint
+        with self.assertNumQueries(6):
+            response = self.client.post(url)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+
+@skipUnless(connection.vendor == 'sqlite', "Planos de consulta verificados apenas no SQLite")
+class PlanoDeConsultaTest(APITestCase):
+    """
+    Executa cada rota de gym/urls.py, captura as consultas e roda EXPLAIN QUERY
+    PLAN em cada SELECT. Falha se alguma delas varrer uma tabela inteira ou
+    precisar de uma B-tree temporária para ordenar/agrupar.
+    """
+    # Rotas cujas consultas ainda dependem de varredura completa, com o motivo
+    VARREDURAS_CONHECIDAS = {}
+
+    def setUp(self):
+        self.personal = Usuario.objects.create(nome="Personal Plano", is_personal=True)
+        self.aluno = Usuario.objects.create(nome="Aluno Plano", is_personal=False)
+        self.mensalidade = Mensalidade.objects.create(
+            aluno=self.aluno, data_pagamento=date.today(),
+            validade=date.today() + timedelta(days=30), valor=100
+        )
+        self.treino = Treino.objects.create(aluno=self.aluno, personal=self.personal, nome="Treino Plano")
+        self.exercicio = Exercicio.objects.create(treino=self.treino, nome="Remada")
+
+    def rotas(self):
+        pagina = {'page_size': 20}
+        return [
+            ('usuario-list-create', {}, pagina),
+            ('usuario-list-create', {}, {**pagina, 'is_personal': 'true'}),
+            ('usuario-detail', {'pk': self.aluno.pk}, {}),
+            ('mensalidade-list-create', {}, pagina),
+            ('mensalidade-list-create', {}, {**pagina, 'aluno': self.aluno.pk}),
+            ('mensalidade-detail', {'pk': self.mensalidade.pk}, {}),
+            ('mensalidade-vencendo', {}, {'dias': 30}),
+            ('treino-list-create', {}, pagina),
+            ('treino-list-create', {}, {**pagina, 'aluno': self.aluno.pk}),
+            ('treino-list-create', {}, {**pagina, 'personal': self.personal.pk}),
+            ('treino-list-create', {}, {**pagina, 'fields': 'id,nome', 'expand': 'aluno'}),
+            ('treino-detail', {'pk': self.treino.pk}, {}),
+            ('treino-busca', {}, {'q': 'remada'}),
+            ('treino-volume', {'pk': self.treino.pk}, {}),
+            ('exercicio-list-create', {}, pagina),
+            ('exercicio-list-create', {}, {**pagina, 'treino': self.treino.pk}),
+            ('exercicio-detail', {'pk': self.exercicio.pk}, {}),
+            ('alunos-personal', {'personal_id': self.personal.pk}, {}),
+            ('alunos-personal', {'personal_id': self.personal.pk}, {**pagina, 'estatisticas': '1'}),
+            ('status-mensalidade', {'aluno_id': self.aluno.pk}, {}),
+            ('dashboard-stats', {}, {}),
+            ('personal-mais-popular', {}, {}),
+            ('personal-ranking', {}, {}),
+            ('checkin-ocupacao', {}, {}),
+            ('checkin-picos', {}, {}),
+            ('aluno-frequencia', {'aluno_id': self.aluno.pk}, {}),
+            ('aluno-volume', {'aluno_id': self.aluno.pk}, {}),
+            ('financeiro-receita', {}, {}),
+            ('financeiro-receita', {}, {'aluno': self.aluno.pk}),
+            ('financeiro-export-csv', {}, {}),
+            ('financeiro-export-csv', {}, {'aluno': self.aluno.pk}),
+            ('sync', {}, {'aluno': self.aluno.pk}),
+            ('sync', {}, {'aluno': self.aluno.pk, 'since': 0}),
+            ('sync', {}, {'since': 0}),
+        ]
+
+    def indice_parcial(self, nome):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'index' AND name = %s", [nome])
+            linha = cursor.fetchone()
+        return bool(linha and linha[0] and ' WHERE ' in linha[0])
+
+    def problemas_do_plano(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+            linhas = [linha[-1] for linha in cursor.fetchall()]
+
+        problemas = []
+        # Busca textual: o MATCH consulta o índice invertido do FTS5 e a
+        # ordenação por relevância vale só para os documentos encontrados
+        if re.search(r'VIRTUAL TABLE INDEX \d+:M', ' '.join(linhas)):
+            return [linha for linha in linhas if 'VIRTUAL TABLE' not in linha and 'FOR ORDER BY' not in linha]
+        for linha in linhas:
+            if 'USE TEMP B-TREE' in linha:
+                problemas.append(linha)
+            elif linha == 'SCAN subquery':
+                # COUNT sobre uma subconsulta com LIMIT (admin): percorre só o
+                # resultado dela, cujo plano vem nas linhas seguintes
+                continue
+            elif linha.startswith('SCAN ') and not self.varredura_limitada(sql, linha):
+                problemas.append(linha)
+        return problemas
+
+    def varredura_limitada(self, sql, linha):
+        """
+        Uma varredura em ordem de índice com LIMIT para na primeira página,
+        desde que todas as linhas percorridas satisfaçam o filtro: sem WHERE,
+        ou percorrendo um índice parcial cuja condição é o próprio filtro.
+        """
+        if ' LIMIT ' not in sql:
+            return False
+        if ' WHERE ' not in sql:
+            return True
+        indice = re.search(r'USING (?:COVERING )?INDEX (\w+)', linha)
+        return bool(indice and self.indice_parcial(indice.group(1)))
+
+    def test_consultas_das_views_usam_indices(self):
+        for nome, kwargs, params in self.rotas():
+            if nome in self.VARREDURAS_CONHECIDAS:
+                continue
+            with self.subTest(rota=nome, params=params):
+                # A primeira chamada aquece os caches; mede-se a seguinte
+                self.client.get(reverse(nome, kwargs=kwargs), params)
+                with CaptureQueriesContext(connection) as ctx:
+                    response = self.client.get(reverse(nome, kwargs=kwargs), params)
+                    if response.streaming:
+                        b''.join(response.streaming_content)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                for query in ctx.captured_queries:
+                    sql = query['sql']
+                    if not sql.startswith('SELECT'):
+                        continue
+                    self.assertEqual(self.problemas_do_plano(sql), [], sql)
+
+    def test_paginas_seguintes_do_cursor_usam_indices(self):
+        Mensalidade.objects.create(aluno=self.aluno, data_pagamento=date.today(), validade=date.today(), valor=100)
+        Treino.objects.create(aluno=self.aluno, nome="Outro Treino")
+        for nome in ('mensalidade-list-create', 'treino-list-create'):
+            with self.subTest(rota=nome):
+                proxima = self.client.get(reverse(nome), {'page_size': 1}).data['next']
+                with CaptureQueriesContext(connection) as ctx:
+                    response = self.client.get(proxima)
+                self.assertEqual(len(response.data['results']), 1)
+                for query in ctx.captured_queries:
+                    if query['sql'].startswith('SELECT'):
+                        self.assertEqual(self.problemas_do_plano(query['sql']), [], query['sql'])
+
+    def test_consultas_do_admin_usam_indices(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@gym.local', 'senha'))
+        # Uma página só é lida sem LIMIT; com duas linhas por tabela e uma por página, paginada
+        Mensalidade.objects.create(aluno=self.aluno, data_pagamento=date.today(), validade=date.today(), valor=100)
+        treino = Treino.objects.create(aluno=self.aluno, nome="Outro Treino")
+        Exercicio.objects.create(treino=treino, nome="Agachamento")
+        CheckIn.objects.create(aluno=self.aluno)
+        CheckIn.objects.create(aluno=self.aluno)
+        hoje = timezone.localdate()
+        paginas = [
+            (reverse('admin:gym_usuario_changelist'), {}),
+            (reverse('admin:gym_usuario_changelist'), {'q': 'alu'}),
+            (reverse('admin:gym_mensalidade_changelist'), {}),
+            (reverse('admin:gym_mensalidade_changelist'), {'data_pagamento__year': hoje.year, 'data_pagamento__month': hoje.month}),
+            (reverse('admin:gym_treino_changelist'), {}),
+            (reverse('admin:gym_treino_changelist'), {'q': self.aluno.pk}),
+            (reverse('admin:gym_exercicio_changelist'), {}),
+            (reverse('admin:gym_exercicio_changelist'), {'q': 'alu'}),
+            (reverse('admin:gym_checkin_changelist'), {'data_hora_checkin__year': hoje.year}),
+            (reverse('admin:autocomplete'), {'app_label': 'gym', 'model_name': 'treino', 'field_name': 'aluno', 'term': 'alu'}),
+        ]
+        # Os exercícios dos alunos encontrados vêm pelos índices de treino e são
+        # ordenados depois: nenhum índice dá a ordem por id entre vários treinos
+        ordenam_o_resultado = {reverse('admin:gym_exercicio_changelist')}
+        for url, params in paginas:
+            with self.subTest(url=url, params=params), mock.patch.object(AdminEscalavel, 'list_per_page', 1):
+                with CaptureQueriesContext(connection) as ctx:
+                    response = self.client.get(url, params)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                for query in ctx.captured_queries:
+                    sql = query['sql']
+                    if sql.startswith('SELECT') and ' "gym_' in sql:
+                        problemas = self.problemas_do_plano(sql)
+                        if url in ordenam_o_resultado and 'q' in params:
+                            problemas = [linha for linha in problemas if linha != 'USE TEMP B-TREE FOR ORDER BY']
+                        self.assertEqual(problemas, [], sql)
+
+
+class EstatisticasCacheTest(APITestCase):
+    def setUp(self):
+        limpar_caches()
+        self.url = reverse('dashboard-stats')
+        self.personal = Usuario.objects.create(nome="Personal Cache", is_personal=True)
+        self.aluno = Usuario.objects.create(nome="Aluno Cache", is_personal=False)
+        estatisticas.reconciliar()
+
+    def test_dashboard_nao_consulta_o_banco_com_cache_aquecido(self):
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertEqual(response.data['total_usuarios'], 2)
+        self.assertEqual(response.data['alunos_inativos'], 1)
+
+    def test_contadores_ajustados_por_sinais(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            novo = Usuario.objects.create(nome="Novo Aluno", is_personal=False)
+            Treino.objects.create(aluno=novo, personal=self.personal, nome="Treino Cache")
+            Mensalidade.objects.create(
+                aluno=novo, data_pagamento=date.today(),
+                validade=date.today() + timedelta(days=30), valor=100
+            )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.aluno.is_personal = True
+            self.aluno.save()
+
+        contadores = estatisticas.obter()
+        self.assertEqual(contadores, estatisticas.calcular())
+        self.assertEqual(contadores['total_personals'], 2)
+        self.assertEqual(contadores['alunos_ativos'], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            novo.delete()
+        self.assertEqual(estatisticas.obter(), estatisticas.calcular())
+
+    def test_virada_do_dia_reconta_apenas_alunos_ativos(self):
+        Mensalidade.objects.create(
+            aluno=self.aluno, data_pagamento=date.today() - timedelta(days=31),
+            validade=date.today() - timedelta(days=1), valor=100
+        )
+        estatisticas.armazenamento().set(estatisticas.PREFIXO + 'alunos_ativos', 1, timeout=None)
+        estatisticas.armazenamento().set(estatisticas.CHAVE_DATA, (date.today() - timedelta(days=1)).isoformat(), timeout=None)
+        with self.assertNumQueries(1):
+            contadores = estatisticas.obter()
+        self.assertEqual(contadores['alunos_ativos'], 0)
+
+    def test_testes_nao_usam_o_cache_do_servidor(self):
+        self.assertIn('gym_caches_teste_', estatisticas.armazenamento()._dir)
+
+    @override_settings(ESTATISTICAS_IDADE_MAXIMA=60)
+    def test_contadores_vencidos_sao_recontados(self):
+        estatisticas.armazenamento().set(estatisticas.PREFIXO + 'total_usuarios', 99, timeout=None)
+        self.assertEqual(estatisticas.obter()['total_usuarios'], 99)
+        estatisticas.armazenamento().set(estatisticas.CHAVE_RECONCILIADO, time_module.time() - 61, timeout=None)
+        self.assertEqual(estatisticas.obter()['total_usuarios'], 2)
+
+    def test_comando_reconciliar(self):
+        estatisticas.armazenamento().set(estatisticas.PREFIXO + 'total_usuarios', 99, timeout=None)
+        call_command('reconciliar_estatisticas', stdout=StringIO())
+        self.assertEqual(estatisticas.obter()['total_usuarios'], 2)
+
+
+class CheckInLoteTest(APITestCase):
+    def setUp(self):
+        self.url = reverse('checkin-bulk')
+        self.personal = Usuario.objects.create(nome="Personal Lote", is_personal=True)
+        self.aluno_ativo = Usuario.objects.create(nome="Aluno Ativo Lote", is_personal=False)
+        self.aluno_inativo = Usuario.objects.create(nome="Aluno Inativo Lote", is_personal=False)
+        self.aluno_sem_mensalidade = Usuario.objects.create(nome="Aluno Sem Lote", is_personal=False)
+        Mensalidade.objects.create(
+            aluno=self.aluno_ativo, data_pagamento=date.today() - timedelta(days=10),
+            validade=date.today() + timedelta(days=20), valor=100
+        )
+        Mensalidade.objects.create(
+            aluno=self.aluno_inativo, data_pagamento=date.today() - timedelta(days=60),
+            validade=date.today() - timedelta(days=30), valor=100
+        )
+        self.agora = timezone.now().isoformat()
+
+    def test_regras_aplicadas_por_evento(self):
+        eventos = [
+            {'aluno_id': self.aluno_ativo.pk, 'timestamp': self.agora},
+            {'aluno_id': self.aluno_inativo.pk, 'timestamp': self.agora},
+            {'aluno_id': self.personal.pk, 'timestamp': self.agora},
+            {'aluno_id': self.aluno_sem_mensalidade.pk, 'timestamp': self.agora},
+            {'aluno_id': 9999, 'timestamp': self.agora},
+            {'aluno_id': self.aluno_ativo.pk},
+        ]
+        response = self.client.post(self.url, eventos, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['aceitos'], 1)
+        self.assertEqual(response.data['rejeitados'], 5)
+        self.assertEqual(
+            [resultado['status'] for resultado in response.data['resultados']],
+            [201, 403, 400, 403, 404, 400]
+        )
+        self.assertEqual(CheckIn.objects.count(), 1)
+
+    def test_preserva_horario_do_evento_e_valida_pela_data_dele(self):
+        # Evento de quando a mensalidade vencida ainda estava válida
+        horario = timezone.now() - timedelta(days=40)
+        eventos = [{'aluno_id': self.aluno_inativo.pk, 'timestamp': horario.isoformat()}]
+        response = self.client.post(self.url, eventos, format='json')
+        self.assertEqual(response.data['aceitos'], 1)
+        self.assertEqual(CheckIn.objects.get().data_hora_checkin, horario)
+
+    def test_numero_constante_de_consultas(self):
+        eventos = [
+            {'aluno_id': aluno.pk, 'timestamp': self.agora}
+            for aluno in (self.aluno_ativo, self.aluno_inativo, self.personal)
+        ] * 500
+        # Leitura dos alunos e, num savepoint, duas inserções de 900/600 e os dois
+        # upserts dos rollups (em outro savepoint), independente do tamanho do lote
+        with self.assertNumQueries(9):
+            response = self.client.post(self.url, eventos, format='json')
+        self.assertEqual(response.data['aceitos'], 500)
+
+    def test_corpo_que_nao_e_lista(self):
+        response = self.client.post(self.url, {'aluno_id': 1}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class OcupacaoCheckInTest(APITestCase):
+    def setUp(self):
+        self.aluno = Usuario.objects.create(nome="Aluno Frequente", is_personal=False)
+        Mensalidade.objects.create(
+            aluno=self.aluno, data_pagamento=date.today() - timedelta(days=60),
+            validade=date.today() + timedelta(days=30), valor=100
+        )
+        # Segunda-feira às 7h, três semanas seguidas, e uma terça às 19h
+        segunda = timezone.localdate() - timedelta(days=timezone.localdate().weekday() + 7)
+        self.horarios = [
+            timezone.make_aware(datetime.combine(segunda - timedelta(weeks=semana), time(7, 15)))
+            for semana in range(3)
+        ] + [timezone.make_aware(datetime.combine(segunda + timedelta(days=1), time(19, 5)))]
+        for horario in self.horarios:
+            CheckIn.objects.create(aluno=self.aluno, data_hora_checkin=horario)
+
+    def test_rollups_incrementados_a_cada_checkin(self):
+        self.assertEqual(OcupacaoHoraria.objects.count(), 4)
+        self.assertEqual(FrequenciaDiaria.objects.filter(aluno=self.aluno).count(), 4)
+
+        # Segundo check-in na mesma hora soma na linha existente
+        CheckIn.objects.create(aluno=self.aluno, data_hora_checkin=self.horarios[0] + timedelta(minutes=10))
+        self.assertEqual(OcupacaoHoraria.objects.get(hora=self.horarios[0].replace(minute=0)).total, 2)
+
+    def test_lote_atualiza_rollups(self):
+        eventos = [{'aluno_id': self.aluno.pk, 'timestamp': self.horarios[0].isoformat()}] * 3
+        self.client.post(reverse('checkin-bulk'), eventos, format='json')
+        self.assertEqual(OcupacaoHoraria.objects.get(hora=self.horarios[0].replace(minute=0)).total, 4)
+
+    def test_recompactar_reproduz_rollups_incrementais(self):
+        antes = sorted(OcupacaoHoraria.objects.values_list('hora', 'total'))
+        OcupacaoHoraria.objects.all().delete()
+        FrequenciaDiaria.objects.all().delete()
+        call_command(
+            'compactar_checkins', inicio=(date.today() - timedelta(days=60)).isoformat(), stdout=StringIO()
+        )
+        self.assertEqual(sorted(OcupacaoHoraria.objects.values_list('hora', 'total')), antes)
+        self.assertEqual(FrequenciaDiaria.objects.count(), 4)
+
+    def test_mapa_semanal_e_picos(self):
+        response = self.client.get(reverse('checkin-ocupacao'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['matriz'][0][7], 3)
+        self.assertEqual(response.data['matriz'][1][19], 1)
+
+        response = self.client.get(reverse('checkin-picos'), {'top': 1})
+        self.assertEqual(response.data['faixas_semanais'], [{'dia_semana': 'segunda', 'hora': 7, 'total': 3}])
+        self.assertEqual(len(response.data['horas_mais_movimentadas']), 1)
+
+    def test_frequencia_do_aluno(self):
+        url = reverse('aluno-frequencia', kwargs={'aluno_id': self.aluno.pk})
+        response = self.client.get(url, {'inicio': (date.today() - timedelta(days=27)).isoformat()})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['dias_frequentados'], 4)
+        self.assertEqual(response.data['total_checkins'], 4)
+        self.assertEqual(response.data['media_semanal'], 1.0)
+
+    def test_periodo_invalido(self):
+        for params in (
+            {'inicio': '2025-02-01', 'fim': '2025-01-01'},
+            {'inicio': 'abc'},
+            {'fim': '2025-13-01'},
+            {'fim': '0001-01-01'},
+        ):
+            response = self.client.get(reverse('checkin-ocupacao'), params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, params)
+
+
+class RankingPersonalTest(APITestCase):
+    def setUp(self):
+        self.ana = Usuario.objects.create(nome="Personal Ana", is_personal=True)
+        self.bruno = Usuario.objects.create(nome="Personal Bruno", is_personal=True)
+        self.carla = Usuario.objects.create(nome="Personal Carla", is_personal=True)
+        self.alunos = [Usuario.objects.create(nome=f"Aluno {i}", is_personal=False) for i in range(4)]
+        # Ana: 2 alunos (um com dois treinos), Bruno: 2 alunos, Carla: 1 aluno
+        Treino.objects.create(aluno=self.alunos[0], personal=self.ana, nome="A1")
+        Treino.objects.create(aluno=self.alunos[0], personal=self.ana, nome="A2")
+        Treino.objects.create(aluno=self.alunos[1], personal=self.ana, nome="A3")
+        Treino.objects.create(aluno=self.alunos[2], personal=self.bruno, nome="B1")
+        Treino.objects.create(aluno=self.alunos[3], personal=self.bruno, nome="B2")
+        self.treino_carla = Treino.objects.create(aluno=self.alunos[3], personal=self.carla, nome="C1")
+        self.url = reverse('personal-ranking')
+
+    def test_ranking_com_empates(self):
+        response = self.client.get(self.url, {'top': 1})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['posicao'] for item in response.data['ranking']], [1, 1])
+        self.assertEqual({item['nome'] for item in response.data['ranking']}, {"Personal Ana", "Personal Bruno"})
+
+        response = self.client.get(self.url, {'top': 3})
+        self.assertEqual([item['posicao'] for item in response.data['ranking']], [1, 1, 3])
+
+    def test_troca_e_exclusao_de_treino(self):
+        self.treino_carla.personal = self.ana
+        self.treino_carla.save()
+        self.assertEqual(RankingPersonal.objects.get(personal=self.ana).total_alunos, 3)
+        self.assertFalse(RankingPersonal.objects.filter(personal=self.carla).exists())
+
+        Treino.objects.filter(aluno=self.alunos[0]).delete()
+        Treino.objects.get(aluno=self.alunos[1]).delete()
+        self.alunos[3].delete()
+        vinculos = list(VinculoPersonalAluno.objects.values_list('personal__nome', 'aluno__nome'))
+        self.assertEqual(vinculos, [("Personal Bruno", "Aluno 2")])
+        self.assertEqual(ranking.ranking(10)[0]['nome'], "Personal Bruno")
+
+        call_command('reconstruir_ranking', stdout=StringIO())
+        self.assertEqual(list(VinculoPersonalAluno.objects.values_list('personal__nome', 'aluno__nome')), vinculos)
+        self.assertEqual(list(RankingPersonal.objects.values_list('personal__nome', 'total_alunos')),
+                         [("Personal Bruno", 1)])
+
+    def test_janela_de_tempo(self):
+        Treino.objects.filter(personal=self.ana).update(data_criacao=timezone.now() - timedelta(days=60))
+        ranking.reconstruir()
+        response = self.client.get(self.url, {'dias': 30})
+        self.assertEqual(
+            [(item['nome'], item['total_alunos']) for item in response.data['ranking']],
+            [("Personal Bruno", 2), ("Personal Carla", 1)]
+        )
+
+    def test_parametros_invalidos(self):
+        for params in ({'dias': 0}, {'dias': 3651}, {'dias': 10 ** 12}, {'dias': 'x'}, {'top': 'x'}):
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, params)
+
+    def test_personal_que_vira_aluno_sai_do_ranking(self):
+        self.carla.is_personal = False
+        self.carla.save()
+        self.assertFalse(RankingPersonal.objects.filter(personal=self.carla).exists())
+        for params in ({}, {'dias': 30}):
+            nomes = [item['nome'] for item in self.client.get(self.url, params).data['ranking']]
+            self.assertNotIn("Personal Carla", nomes, params)
+
+    def test_mais_popular_sem_alunos(self):
+        Treino.objects.all().delete()
+        RankingPersonal.objects.all().delete()
+        response = self.client.get(reverse('personal-mais-popular'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['total_alunos'], 0)
+
+
+class TreinoCompletoTest(APITestCase):
+    def setUp(self):
+        self.personal = Usuario.objects.create(nome="Personal Completo", is_personal=True)
+        self.aluno = Usuario.objects.create(nome="Aluno Completo", is_personal=False)
+        self.url = reverse('treino-completo-create')
+
+    def dados_treino(self, nome="Treino Completo", exercicios=12):
+        return {
+            'aluno': self.aluno.pk,
+            'personal': self.personal.pk,
+            'nome': nome,
+            'exercicios': [
+                {'nome': f"Exercício {i}", 'series': 4, 'repeticoes': 12, 'carga_kg': 20.0 + i}
+                for i in range(exercicios)
+            ],
+        }
+
+    def test_cria_treino_com_exercicios(self):
+        response = self.client.post(self.url, self.dados_treino(), format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.data['exercicios']), 12)
+        self.assertEqual(response.data['personal_nome'], "Personal Completo")
+        self.assertEqual(Exercicio.objects.filter(treino_id=response.data['id']).count(), 12)
+        self.assertEqual(RankingPersonal.objects.get(personal=self.personal).total_alunos, 1)
+
+    def test_personal_invalido_nao_grava_nada(self):
+        dados = self.dados_treino()
+        dados['personal'] = self.aluno.pk
+        response = self.client.post(self.url, dados, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("não é um personal trainer", str(response.data))
+        self.assertEqual(Treino.objects.count(), 0)
+        self.assertEqual(Exercicio.objects.count(), 0)
+
+    def test_lote_de_treinos_com_consultas_constantes(self):
+        consultas = []
+        # O primeiro lote cria o vínculo e a linha do ranking; os seguintes só atualizam
+        for tamanho in (1, 5, 20):
+            lote = [self.dados_treino(f"Modelo {i}", exercicios=5) for i in range(tamanho)]
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.post(self.url, lote, format='json')
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            self.assertEqual(len(response.data), tamanho)
+            consultas.append(len(ctx.captured_queries))
+
+        # O número de consultas não cresce com o número de treinos do lote
+        self.assertEqual(consultas[1], consultas[2])
+        self.assertEqual(Treino.objects.count(), 26)
+        self.assertEqual(Exercicio.objects.count(), 130)
+        self.assertEqual(VinculoPersonalAluno.objects.get().total_treinos, 26)
+
+    def test_substitui_exercicios(self):
+        response = self.client.post(self.url, self.dados_treino(exercicios=3), format='json')
+        treino_id = response.data['id']
+        exercicios = response.data['exercicios']
+
+        dados = self.dados_treino(nome="Treino Revisado", exercicios=0)
+        dados['exercicios'] = [
+            {'id': exercicios[0]['id'], 'nome': "Agachamento", 'series': 5, 'repeticoes': 5, 'carga_kg': 100},
+            {'nome': "Leg press", 'series': 3, 'repeticoes': 10},
+        ]
+        url = reverse('treino-completo-update', kwargs={'pk': treino_id})
+        response = self.client.put(url, dados, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['nome'], "Treino Revisado")
+        nomes = sorted(exercicio['nome'] for exercicio in response.data['exercicios'])
+        self.assertEqual(nomes, ["Agachamento", "Leg press"])
+        self.assertEqual(Exercicio.objects.get(pk=exercicios[0]['id']).carga_kg, 100)
+        self.assertFalse(Exercicio.objects.filter(pk=exercicios[1]['id']).exists())
+
+    def test_substituicao_rejeita_exercicio_de_outro_treino(self):
+        outro = Treino.objects.create(aluno=self.aluno, nome="Outro")
+        alheio = Exercicio.objects.create(treino=outro, nome="Alheio")
+        treino = Treino.objects.create(aluno=self.aluno, nome="Meu")
+        url = reverse('treino-completo-update', kwargs={'pk': treino.pk})
+        response = self.client.patch(
+            url, {'exercicios': [{'nome': "Novo"}, {'id': alheio.pk, 'nome': "Roubado"}]}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['exercicios'][0], {})
+        self.assertIn('id', response.data['exercicios'][1])
+        alheio.refresh_from_db()
+        self.assertEqual(alheio.nome, "Alheio")
+        self.assertFalse(treino.exercicios.exists())
+
+    def test_patch_atualiza_so_os_exercicios_listados(self):
+        response = self.client.post(self.url, self.dados_treino(exercicios=3), format='json')
+        exercicios = response.data['exercicios']
+        url = reverse('treino-completo-update', kwargs={'pk': response.data['id']})
+
+        response = self.client.patch(
+            url, {'exercicios': [{'id': exercicios[0]['id'], 'carga_kg': 80}, {'nome': "Remada"}]}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['exercicios']), 4)
+        self.assertEqual(Exercicio.objects.get(pk=exercicios[0]['id']).carga_kg, 80)
+        self.assertEqual(Exercicio.objects.get(pk=exercicios[0]['id']).nome, "Exercício 0")
+
+    def test_patch_exige_nome_dos_exercicios_novos(self):
+        treino = Treino.objects.create(aluno=self.aluno, nome="Meu")
+        url = reverse('treino-completo-update', kwargs={'pk': treino.pk})
+        response = self.client.patch(url, {'exercicios': [{'nome': "Supino"}, {'series': 4}]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['exercicios'][0], {})
+        self.assertIn('nome', response.data['exercicios'][1])
+        self.assertFalse(treino.exercicios.exists())
+
+
+class GetCondicionalTest(APITestCase):
+    def setUp(self):
+        self.aluno = Usuario.objects.create(nome="Aluno ETag", is_personal=False)
+        self.treino = Treino.objects.create(aluno=self.aluno, nome="Treino ETag")
+        self.exercicio = Exercicio.objects.create(treino=self.treino, nome="Supino")
+        self.mensalidade = Mensalidade.objects.create(
+            aluno=self.aluno, data_pagamento=date.today(),
+            validade=date.today() + timedelta(days=30), valor=100
+        )
+        self.url_treino = reverse('treino-detail', kwargs={'pk': self.treino.pk})
+
+    def test_304_sem_serializar(self):
+        response = self.client.get(self.url_treino)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+
+        # Apenas a consulta das versões; nada de treino, exercícios ou usuários
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url_treino, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_etag_muda_com_exercicio_e_com_aluno(self):
+        etag = self.client.get(self.url_treino)['ETag']
+        self.exercicio.carga_kg = 40
+        self.exercicio.save()
+        novo_etag = self.client.get(self.url_treino, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(novo_etag.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(novo_etag['ETag'], etag)
+
+        url_mensalidade = reverse('mensalidade-detail', kwargs={'pk': self.mensalidade.pk})
+        etag = self.client.get(url_mensalidade)['ETag']
+        self.aluno.nome = "Aluno Renomeado"
+        self.aluno.save()
+        response = self.client.get(url_mensalidade, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['aluno_nome'], "Aluno Renomeado")
+
+    def test_if_modified_since_no_usuario(self):
+        url = reverse('usuario-detail', kwargs={'pk': self.aluno.pk})
+        response = self.client.get(url)
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_versao_fica_fora_das_respostas(self):
+        treino = self.client.get(self.url_treino).data
+        self.assertNotIn('atualizado_em', treino['exercicios'][0])
+        usuario = self.client.get(reverse('usuario-detail', kwargs={'pk': self.aluno.pk})).data
+        self.assertNotIn('atualizado_em', usuario)
+        self.assertNotIn('atualizado_em', self.client.get(reverse('exercicio-list-create')).data[0])
+
+    def test_objeto_inexistente(self):
+        response = self.client.get(reverse('treino-detail', kwargs={'pk': 9999}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+# ============= BENCHMARK =============
+
+class BenchmarkTest(APITestCase):
+    """Roda o benchmark em escala mínima para garantir que ele acompanha a API."""
+
+    def test_cobre_todas_as_rotas(self):
+        from .urls import urlpatterns
+        benchmark.gerar_dados(escala=0.0002, semente=1)
+        cobertas = {rota['rota'] for rota in benchmark.rotas(benchmark.amostras())}
+        self.assertEqual(cobertas, {padrao.name for padrao in urlpatterns})
+
+    @override_settings(METRICAS_REQUISICAO=True, ORCAMENTO_QUERIES_ESTRITO=True)
+    def test_relatorio_e_comparacao(self):
+        # Modo estrito: cada rota também precisa respeitar o orçamento de consultas
+        benchmark.gerar_dados(escala=0.0002, semente=1)
+        relatorio = benchmark.executar(repeticoes=3, aquecimento=1)
+        json.dumps(relatorio)
+        for nome, medida in relatorio['rotas'].items():
+            self.assertLessEqual(medida['p50_ms'], medida['p99_ms'], nome)
+            self.assertTrue(all(codigo < 400 for codigo in medida['status']), (nome, medida['status']))
+
+        self.assertEqual(benchmark.comparar(relatorio, relatorio), [])
+        base = json.loads(json.dumps(relatorio))
+        base['rotas']['GET dashboard-stats']['consultas'] = -1
+        self.assertEqual(len(benchmark.comparar(relatorio, base)), 1)
+
+    def test_comparacao_de_serializacao(self):
+        benchmark.gerar_dados(escala=0.0002, semente=1)
+        resultado = benchmark.comparar_serializacao(repeticoes=1, linhas=50)
+        self.assertEqual(set(resultado), {'UsuarioSerializer', 'MensalidadeSerializer', 'TreinoSerializer', 'ExercicioSerializer'})
+        for medida in resultado.values():
+            self.assertGreater(medida['linhas'], 0)
+            self.assertGreater(medida['aceleracao'], 0)
+
+
+# ============= MÉTRICAS POR REQUISIÇÃO =============
+
+@override_settings(METRICAS_REQUISICAO=True, ORCAMENTO_QUERIES_ESTRITO=True)
+class MetricasRequisicaoTest(APITestCase):
+    def setUp(self):
+        histograma.limpar()
+        self.aluno = Usuario.objects.create(nome="Aluno", is_personal=False)
+
+    def test_server_timing(self):
+        response = self.client.get(reverse('usuario-list-create'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="1 queries", serializacao;dur=[\d.]+, total;dur=[\d.]+$')
+
+    def test_orcamento_estrito(self):
+        with mock.patch.object(UsuarioListCreateView, 'orcamento_queries', {'GET': 0}):
+            with self.assertRaises(OrcamentoQueriesExcedido):
+                self.client.get(reverse('usuario-list-create'))
+        # O orçamento é por método: o POST não tem limite declarado
+        response = self.client.post(reverse('usuario-list-create'), {"nome": "Outro", "is_personal": False}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_endpoint_restrito_a_admin(self):
+        self.client.get(reverse('status-mensalidade', kwargs={'aluno_id': self.aluno.id}))
+        self.client.get(reverse('status-mensalidade', kwargs={'aluno_id': self.aluno.id}))
+        self.assertEqual(self.client.get(reverse('metricas')).status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.force_authenticate(User.objects.create_user('admin', is_staff=True))
+        response = self.client.get(reverse('metricas'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        medidas = response.data['GET status-mensalidade']
+        self.assertEqual(medidas['requisicoes'], 2)
+        self.assertEqual(medidas['consultas']['max'], 1)
+        self.assertGreater(medidas['bytes']['p50'], 0)
+
+
+@override_settings(METRICAS_REQUISICAO=False)
+class MetricasDesligadasTest(APITestCase):
+    def test_sem_instrumentacao(self):
+        response = self.client.get(reverse('usuario-list-create'))
+        self.assertNotIn('Server-Timing', response)
+
+
+# ============= RÉPLICA DE LEITURA =============
+
+@override_settings(DATABASE_ROUTERS=['core.db_router.ReplicaRouter'])
+class ReplicaLeituraTest(APITestCase):
+    """
+    Sem uma réplica de verdade no ambiente de testes, o alias da réplica é
+    apontado para o próprio ``default`` e o roteador é espionado.
+    """
+
+    def setUp(self):
+        limpar_caches()
+        self.aluno = Usuario.objects.create(nome="Aluno", is_personal=False)
+        self.decisoes = []
+        original = db_router.ReplicaRouter.db_for_read
+
+        def espiao(router, model, **hints):
+            alias = original(router, model, **hints)
+            self.decisoes.append(alias)
+            return alias
+
+        for patcher in (
+            mock.patch.object(db_router, 'ALIAS_REPLICA', 'default'),
+            mock.patch.object(db_router.ReplicaRouter, 'db_for_read', espiao),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_views_somente_leitura_vao_para_replica(self):
+        for url in (
+            reverse('dashboard-stats'),
+            reverse('status-mensalidade', kwargs={'aluno_id': self.aluno.id}),
+            reverse('usuario-list-create'),
+        ):
+            self.decisoes.clear()
+            self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+            self.assertTrue(self.decisoes)
+            self.assertEqual(set(self.decisoes), {'default'}, url)
+
+    def test_views_assincronas_vao_para_replica(self):
+        url = reverse('async-status-mensalidade', kwargs={'aluno_id': self.aluno.id})
+        response = async_to_sync(self.async_client.get)(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(self.decisoes)
+        self.assertEqual(set(self.decisoes), {'default'})
+        self.assertFalse(db_router.lendo_da_replica.get())
+
+    def test_escritas_e_detalhes_no_principal(self):
+        self.client.post(reverse('usuario-list-create'), {"nome": "Novo", "is_personal": False}, format='json')
+        self.client.get(reverse('usuario-detail', kwargs={'pk': self.aluno.id}))
+        self.assertTrue(self.decisoes)
+        self.assertEqual(set(self.decisoes), {None})
+        self.assertFalse(db_router.lendo_da_replica.get())
+
+
+
+class ReplicaRouterTest(APITestCase):
+    def test_roteador(self):
+        router = db_router.ReplicaRouter()
+        self.assertIsNone(router.db_for_read(Usuario))
+        with db_router.leitura_na_replica():
+            self.assertEqual(router.db_for_read(Usuario), 'replica')
+        self.assertEqual(router.db_for_write(Usuario), 'default')
+        self.assertFalse(router.allow_migrate('replica', 'gym'))
+        self.assertTrue(router.allow_migrate('default', 'gym'))
+
+
+class SQLiteConfiguracaoTest(APITestCase):
+    @skipUnless(connection.vendor == 'sqlite', "pragmas específicos do SQLite")
+    def test_pragmas(self):
+        self.assertEqual(connection.transaction_mode, 'IMMEDIATE')
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA synchronous")
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+
+
+# ============= VIEWS ASSÍNCRONAS =============
+
+class ViewsAssincronasTest(APITestCase):
+    def setUp(self):
+        limpar_caches()
+        self.personal = Usuario.objects.create(nome="Personal Async", is_personal=True)
+        self.aluno = Usuario.objects.create(nome="Aluno Assíncrono", is_personal=False)
+        self.inativo = Usuario.objects.create(nome="Aluno Inativo", is_personal=False)
+        Mensalidade.objects.create(
+            aluno=self.aluno, data_pagamento=date.today(),
+            validade=date.today() + timedelta(days=30), valor=100
+        )
+        Mensalidade.objects.create(
+            aluno=self.inativo, data_pagamento=date.today() - timedelta(days=60),
+            validade=date.today() - timedelta(days=30), valor=100
+        )
+        self.treino = Treino.objects.create(aluno=self.aluno, personal=self.personal, nome="Treino A")
+        Exercicio.objects.create(treino=self.treino, nome="Supino", series=4, repeticoes=10, carga_kg=40)
+
+    def test_mesmo_json_que_as_views_sincronas(self):
+        pares = [
+            ('usuario-list-create', 'async-usuario-list', {}, {}),
+            ('usuario-list-create', 'async-usuario-list', {}, {'is_personal': 'false'}),
+            ('mensalidade-list-create', 'async-mensalidade-list', {}, {'aluno': self.aluno.id}),
+            ('treino-list-create', 'async-treino-list', {}, {'personal': self.personal.id}),
+            ('exercicio-list-create', 'async-exercicio-list', {}, {'treino': self.treino.id}),
+            ('treino-list-create', 'async-treino-list', {}, {'page_size': 1}),
+            ('status-mensalidade', 'async-status-mensalidade', {'aluno_id': self.aluno.id}, {}),
+            ('status-mensalidade', 'async-status-mensalidade', {'aluno_id': self.inativo.id}, {}),
+            ('status-mensalidade', 'async-status-mensalidade', {'aluno_id': 9999}, {}),
+            ('dashboard-stats', 'async-dashboard-stats', {}, {}),
+        ]
+        for sincrona, assincrona, kwargs, params in pares:
+            esperado = self.client.get(reverse(sincrona, kwargs=kwargs), params)
+            obtido = self.client.get(reverse(assincrona, kwargs=kwargs), params)
+            self.assertEqual(obtido.status_code, esperado.status_code, assincrona)
+            self.assertEqual(obtido.content, esperado.content, (assincrona, params))
+
+    def test_checkin_pelo_handler_asgi(self):
+        async def fluxo():
+            aceito = await self.async_client.post(reverse('async-aluno-checkin', kwargs={'aluno_id': self.aluno.id}))
+            recusado = await self.async_client.post(reverse('async-aluno-checkin', kwargs={'aluno_id': self.inativo.id}))
+            inexistente = await self.async_client.post(reverse('async-aluno-checkin', kwargs={'aluno_id': 9999}))
+            return aceito, recusado, inexistente
+
+        aceito, recusado, inexistente = async_to_sync(fluxo)()
+        self.assertEqual(aceito.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(aceito.json()['message'], "Check-in de Aluno Assíncrono realizado com sucesso!")
+        self.assertEqual(recusado.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(inexistente.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(CheckIn.objects.filter(aluno=self.aluno).count(), 1)
+        # O sinal de post_save também alimenta os rollups
+        self.assertEqual(OcupacaoHoraria.objects.get().total, 1)
+
+    def test_dashboard_assincrono_com_cache_frio(self):
+        with self.assertNumQueries(5):
+            contadores = async_to_sync(estatisticas.aobter)()
+        self.assertEqual(contadores, estatisticas.calcular())
+        with self.assertNumQueries(0):
+            async_to_sync(estatisticas.aobter)()
+
+
+# ============= VENCIMENTOS =============
+
+class VencimentosTest(APITestCase):
+    def setUp(self):
+        limpar_caches()
+        self.hoje = date.today()
+        self.vence_hoje = self.criar_aluno("Vence Hoje", self.hoje)
+        self.vence_em_5 = self.criar_aluno("Vence em 5", self.hoje + timedelta(days=5))
+        self.vence_em_20 = self.criar_aluno("Vence em 20", self.hoje + timedelta(days=20))
+        self.vencido = self.criar_aluno("Vencido", self.hoje - timedelta(days=1))
+
+    def criar_aluno(self, nome, validade):
+        aluno = Usuario.objects.create(nome=nome, is_personal=False)
+        Mensalidade.objects.create(
+            aluno=aluno, data_pagamento=validade - timedelta(days=30), validade=validade, valor=100
+        )
+        return aluno
+
+    def test_status_gravado_no_resumo(self):
+        ativos = set(ResumoMensalidade.objects.filter(ativa=True).values_list('aluno_id', flat=True))
+        self.assertEqual(ativos, {self.vence_hoje.id, self.vence_em_5.id, self.vence_em_20.id})
+
+    def test_processamento_diario(self):
+        self.assertEqual(estatisticas.obter()['alunos_ativos'], 3)
+        amanha = self.hoje + timedelta(days=1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(vencimentos.processar(amanha), {'vencidas': 1, 'reativadas': 0})
+        self.assertFalse(ResumoMensalidade.objects.get(aluno=self.vence_hoje).ativa)
+        self.assertEqual(estatisticas.obter()['alunos_ativos'], 2)
+        # Idempotente
+        self.assertEqual(vencimentos.processar(amanha), {'vencidas': 0, 'reativadas': 0})
+
+        # As leituras passam a refletir o campo gravado
+        url = reverse('status-mensalidade', kwargs={'aluno_id': self.vence_hoje.id})
+        response = self.client.get(url)
+        self.assertFalse(response.data['ativo'])
+        self.assertEqual(response.data['dias_restantes'], 0)
+        response = self.client.post(reverse('aluno-checkin', kwargs={'aluno_id': self.vence_hoje.id}))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        # Uma nova mensalidade reativa na hora, sem esperar o processamento
+        with self.captureOnCommitCallbacks(execute=True):
+            Mensalidade.objects.create(
+                aluno=self.vence_hoje, data_pagamento=self.hoje,
+                validade=self.hoje + timedelta(days=30), valor=100
+            )
+        self.assertTrue(ResumoMensalidade.objects.get(aluno=self.vence_hoje).ativa)
+        self.assertEqual(estatisticas.obter()['alunos_ativos'], 3)
+
+    def test_vencendo_em_n_dias(self):
+        response = self.client.get(reverse('mensalidade-vencendo'), {'dias': 7})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(aluno['aluno_id'], aluno['dias_restantes']) for aluno in response.data['alunos']],
+            [(self.vence_hoje.id, 0), (self.vence_em_5.id, 5)]
+        )
+        self.assertEqual(len(self.client.get(reverse('mensalidade-vencendo'), {'dias': 30}).data['alunos']), 3)
+        for dias in ('x', '-1', '91'):
+            response = self.client.get(reverse('mensalidade-vencendo'), {'dias': dias})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_comando(self):
+        saida = StringIO()
+        call_command('processar_vencimentos', data=(self.hoje + timedelta(days=6)).isoformat(), dias=30, stdout=saida)
+        self.assertIn("2 mensalidades vencidas e 0 reativadas", saida.getvalue())
+        self.assertIn("Vence em 20", saida.getvalue())
+        self.assertNotIn("Vence em 5", saida.getvalue().split("Vencendo")[1])
+
+
+# ============= FINANCEIRO =============
+
+class FinanceiroTest(APITestCase):
+    def setUp(self):
+        self.ana = Usuario.objects.create(nome="Ana", is_personal=False)
+        self.bruno = Usuario.objects.create(nome="Bruno, o Aluno", is_personal=False)
+        for aluno, pagamento, valor in (
+            (self.ana, date(2025, 1, 10), '100.00'),
+            (self.ana, date(2025, 2, 10), '100.00'),
+            (self.bruno, date(2025, 1, 31), '150.50'),
+            (self.bruno, date(2025, 3, 1), '150.50'),
+            (self.bruno, date(2024, 12, 31), '99.90'),
+        ):
+            Mensalidade.objects.create(
+                aluno=aluno, data_pagamento=pagamento, validade=pagamento + timedelta(days=30), valor=valor
+            )
+        self.url = reverse('financeiro-receita')
+        self.periodo = {'inicio': '2025-01-01', 'fim': '2025-02-28'}
+
+    def test_receita_por_mes(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, self.periodo)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['total'], '350.50')
+        self.assertEqual(response.data['quantidade'], 3)
+        self.assertEqual(response.data['por_mes'], [
+            {'mes': '2025-01', 'total': '250.50', 'quantidade': 2},
+            {'mes': '2025-02', 'total': '100.00', 'quantidade': 1},
+        ])
+        self.assertNotIn('por_aluno', response.data)
+
+    def test_receita_por_aluno(self):
+        response = self.client.get(self.url, {**self.periodo, 'por_aluno': 5})
+        self.assertEqual(response.data['por_aluno'], [
+            {'aluno_id': self.ana.id, 'aluno': "Ana", 'total': '200.00', 'quantidade': 2},
+            {'aluno_id': self.bruno.id, 'aluno': "Bruno, o Aluno", 'total': '150.50', 'quantidade': 1},
+        ])
+        response = self.client.get(self.url, {'inicio': '2024-12-01', 'fim': '2025-03-31', 'aluno': self.bruno.id})
+        self.assertEqual(response.data['total'], '400.90')
+        self.assertEqual([mes['total'] for mes in response.data['por_mes']], ['99.90', '150.50', '0.00', '150.50'])
+
+    def test_parametros_invalidos(self):
+        for params in (
+            {'inicio': '2025-03-01', 'fim': '2025-01-01'},
+            {'inicio': '2000-01-01', 'fim': '2025-01-01'},
+            {'inicio': 'abc', 'fim': '2025-01-01'},
+            {**self.periodo, 'aluno': 'x'},
+            {**self.periodo, 'por_aluno': 'x'},
+        ):
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, params)
+
+    def test_exportacao_csv_em_streaming(self):
+        url = reverse('financeiro-export-csv')
+        # Nenhuma instância de modelo é criada: só tuplas do values_list
+        with mock.patch.object(Mensalidade, 'from_db', side_effect=AssertionError), \
+                mock.patch.object(Usuario, 'from_db', side_effect=AssertionError):
+            response = self.client.get(url, self.periodo)
+            self.assertTrue(response.streaming)
+            conteudo = b''.join(response.streaming_content).decode()
+
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertIn('mensalidades_2025-01-01_2025-02-28.csv', response['Content-Disposition'])
+        linhas = conteudo.splitlines()
+        self.assertEqual(linhas[0], 'id,aluno_id,aluno,data_pagamento,validade,valor')
+        self.assertEqual(len(linhas), 4)
+        self.assertTrue(linhas[1].endswith(',Ana,2025-01-10,2025-02-09,100.00'))
+        self.assertIn('"Bruno, o Aluno",2025-01-31', linhas[2])
+
+
+# ============= IMPORTAÇÃO LEGADA =============
+
+class ImportacaoLegadoTest(APITestCase):
+    USUARIOS = (
+        "id_externo,nome,data_nascimento,sexo,is_personal\n"
+        "A1,Ana Legado,1990-04-01,F,false\n"
+        "A2,Bruno Legado,,M,\n"
+        "P1,Paula Personal,1985-01-01,F,true\n"
+        "A3,Homônimo,2000-01-01,,false\n"
+        "A4,Homônimo,2001-01-01,,false\n"
+        "A1,Ana Repetida,1990-04-01,F,false\n"
+        "A5,Futuro,2999-01-01,M,false\n"
+        ",,,,\n"
+    )
+    MENSALIDADES = (
+        "aluno,data_pagamento,validade,valor\n"
+        "A1,2020-01-01,2020-01-31,99.90\n"
+        "A1,{hoje},{validade},99.90\n"
+        "Bruno Legado,2021-05-01,2021-05-31,89.90\n"
+        "Homônimo,2021-05-01,2021-05-31,89.90\n"
+        "A3,2021-05-01,2021-04-30,89.90\n"
+        "X9,2021-05-01,2021-05-31,89.90\n"
+        "A2,2021-06-01,2021-07-01,abc\n"
+    )
+
+    def setUp(self):
+        limpar_caches()
+        self.pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(self.pasta.cleanup)
+        self.usuarios = self.arquivo('usuarios.csv', self.USUARIOS)
+        self.mensalidades = self.arquivo('mensalidades.csv', self.MENSALIDADES.format(
+            hoje=date.today(), validade=date.today() + timedelta(days=30)
+        ))
+
+    def arquivo(self, nome, conteudo):
+        caminho = os.path.join(self.pasta.name, nome)
+        with open(caminho, 'w', encoding='utf-8') as arquivo:
+            arquivo.write(conteudo)
+        return caminho
+
+    def test_importa_validando_com_as_regras_dos_serializers(self):
+        erros = os.path.join(self.pasta.name, 'erros.csv')
+        saida, avisos = StringIO(), StringIO()
+        call_command(
+            'importar_legado', usuarios=self.usuarios, mensalidades=self.mensalidades,
+            lote=3, erros=erros, stdout=saida, stderr=avisos
+        )
+        self.assertIn("usuarios: 5 inseridas, 3 rejeitadas", saida.getvalue())
+        self.assertIn("mensalidades: 3 inseridas, 4 rejeitadas", saida.getvalue())
+        self.assertIn("linhas/s", saida.getvalue())
+
+        self.assertEqual(Usuario.objects.filter(id_externo__isnull=False).count(), 5)
+        self.assertTrue(Usuario.objects.get(id_externo='P1').is_personal)
+        self.assertIsNone(Usuario.objects.get(id_externo='A2').data_nascimento)
+
+        with open(erros, encoding='utf-8') as arquivo:
+            rejeitadas = {(linha['arquivo'], int(linha['linha'])): linha['erro'] for linha in csv.DictReader(arquivo)}
+        self.assertIn("já importado", rejeitadas[('usuarios.csv', 7)])
+        self.assertIn("não pode ser futura", rejeitadas[('usuarios.csv', 8)])
+        self.assertIn("ambíguo", rejeitadas[('mensalidades.csv', 5)])
+        self.assertIn("anterior à data de pagamento", rejeitadas[('mensalidades.csv', 6)])
+        self.assertIn("não encontrado", rejeitadas[('mensalidades.csv', 7)])
+        self.assertIn(('mensalidades.csv', 8), rejeitadas)
+
+        # Resumo e contadores reconstruídos após o bulk_create
+        ana = Usuario.objects.get(id_externo='A1')
+        response = self.client.get(reverse('status-mensalidade', kwargs={'aluno_id': ana.id}))
+        self.assertTrue(response.data['ativo'])
+        self.assertEqual(estatisticas.obter(), estatisticas.calcular())
+        self.assertEqual(estatisticas.obter()['alunos_ativos'], 1)
+
+    def test_retoma_do_checkpoint(self):
+        checkpoint = 'legado-2024'
+        original = Mensalidade.objects.bulk_create
+        chamadas = []
+
+        def falhar_no_segundo_lote(objetos, *args, **kwargs):
+            chamadas.append(len(objetos))
+            if len(chamadas) == 2:
+                raise RuntimeError("queda do banco")
+            return original(objetos, *args, **kwargs)
+
+        with mock.patch.object(Mensalidade.objects, 'bulk_create', side_effect=falhar_no_segundo_lote):
+            with self.assertRaises(RuntimeError):
+                call_command(
+                    'importar_legado', usuarios=self.usuarios, mensalidades=self.mensalidades,
+                    lote=2, checkpoint=checkpoint, stdout=StringIO(), stderr=StringIO()
+                )
+        self.assertEqual(Mensalidade.objects.count(), 2)
+
+        saida = StringIO()
+        call_command(
+            'importar_legado', usuarios=self.usuarios, mensalidades=self.mensalidades,
+            lote=2, checkpoint=checkpoint, stdout=saida, stderr=StringIO()
+        )
+        self.assertIn("usuarios: 0 inseridas, 0 rejeitadas", saida.getvalue())
+        self.assertIn("retomado após a linha 2", saida.getvalue())
+        self.assertEqual(Usuario.objects.filter(id_externo__isnull=False).count(), 5)
+        self.assertEqual(Mensalidade.objects.count(), 3)
+        self.assertTrue(ResumoMensalidade.objects.get(aluno__id_externo='A1').ativa)
+
+    def test_queda_ao_gravar_o_progresso_nao_duplica_o_lote(self):
+        original = ProgressoImportacao.objects.update_or_create
+        chamadas = []
+
+        def falhar_no_progresso_do_segundo_lote(*args, **kwargs):
+            chamadas.append(kwargs['origem'])
+            if kwargs['origem'].endswith('mensalidades.csv') and chamadas.count(kwargs['origem']) == 2:
+                raise RuntimeError("queda após o bulk_create")
+            return original(*args, **kwargs)
+
+        with mock.patch.object(ProgressoImportacao.objects, 'update_or_create', side_effect=falhar_no_progresso_do_segundo_lote):
+            with self.assertRaises(RuntimeError):
+                call_command(
+                    'importar_legado', usuarios=self.usuarios, mensalidades=self.mensalidades,
+                    lote=2, checkpoint='legado', stdout=StringIO(), stderr=StringIO()
+                )
+        # O lote cujo progresso não foi gravado também não foi
+        self.assertEqual(Mensalidade.objects.count(), 2)
+        self.assertEqual(
+            ProgressoImportacao.objects.get(checkpoint='legado', origem=self.mensalidades).linhas, 2
+        )
+
+        call_command(
+            'importar_legado', usuarios=self.usuarios, mensalidades=self.mensalidades,
+            lote=2, checkpoint='legado', stdout=StringIO(), stderr=StringIO()
+        )
+        self.assertEqual(Mensalidade.objects.count(), 3)
+
+
+# ============= LEITURA RÁPIDA =============
+
+class LeituraRapidaTest(APITestCase):
+    """As listagens montadas de ``.values()`` são idênticas, byte a byte, às dos serializers."""
+
+    def setUp(self):
+        self.personal = Usuario.objects.create(nome="Personal Ágil", is_personal=True, sexo='F')
+        self.aluno = Usuario.objects.create(nome="Aluno \"Aspas\"", data_nascimento=date(1999, 12, 31), sexo='M')
+        self.sem_dados = Usuario.objects.create(nome="Sem Dados")
+        Mensalidade.objects.create(aluno=self.aluno, data_pagamento=date(2024, 1, 1), validade=date(2024, 1, 31), valor='100')
+        Mensalidade.objects.create(aluno=self.aluno, data_pagamento=date(2024, 2, 1), validade=date(2024, 2, 29), valor='99.9')
+        Mensalidade.objects.create(aluno=self.sem_dados, data_pagamento=date(2024, 2, 1), validade=date(2024, 2, 29), valor='0.01')
+        self.com_personal = Treino.objects.create(aluno=self.aluno, personal=self.personal, nome="A", descricao="Força")
+        self.sem_personal = Treino.objects.create(aluno=self.aluno, nome="B")
+        Treino.objects.create(aluno=self.sem_dados, nome="Vazio")
+        Exercicio.objects.create(treino=self.com_personal, nome="Supino", carga_kg=42.5)
+        Exercicio.objects.create(treino=self.com_personal, nome="Remada", series=4, repeticoes=8)
+        Exercicio.objects.create(treino=self.sem_personal, nome="Agachamento", carga_kg=80)
+
+    def esperado(self, serializer_class, queryset, ordenacao):
+        from rest_framework.renderers import JSONRenderer
+        return JSONRenderer().render(serializer_class(queryset.order_by(*ordenacao), many=True).data)
+
+    def test_paridade_com_os_serializers(self):
+        casos = [
+            ('usuario-list-create', UsuarioSerializer, Usuario.objects.all(), ('id',)),
+            ('mensalidade-list-create', MensalidadeSerializer, Mensalidade.objects.all(), ('validade', 'id')),
+            ('treino-list-create', TreinoSerializer, Treino.objects.all(), ('data_criacao', 'id')),
+            ('exercicio-list-create', ExercicioSerializer, Exercicio.objects.all(), ('id',)),
+        ]
+        for rota, serializer_class, queryset, ordenacao in casos:
+            with self.subTest(rota=rota):
+                response = self.client.get(reverse(rota))
+                self.assertEqual(response.content, self.esperado(serializer_class, queryset, ordenacao))
+
+                pagina = self.client.get(reverse(rota), {'page_size': 2}).json()
+                proxima = self.client.get(pagina['next']).json()
+                self.assertEqual(pagina['results'] + proxima['results'], response.json())
+
+                stream = self.client.get(reverse(rota), {'stream': 1})
+                linhas = [json.loads(linha) for linha in b''.join(stream.streaming_content).splitlines()]
+                self.assertEqual(linhas, response.json())
+
+    def test_personal_nulo_omite_personal_nome(self):
+        response = self.client.get(reverse('treino-list-create'), {'aluno': self.aluno.pk})
+        treinos = {treino['id']: treino for treino in response.json()}
+        self.assertEqual(treinos[self.com_personal.pk]['personal_nome'], "Personal Ágil")
+        self.assertNotIn('personal_nome', treinos[self.sem_personal.pk])
+        self.assertIsNone(treinos[self.sem_personal.pk]['personal'])
+        self.assertEqual([e['nome'] for e in treinos[self.com_personal.pk]['exercicios']], ["Supino", "Remada"])
+
+    def test_treinos_sem_exercicios_e_consultas(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('treino-list-create'), {'aluno': self.sem_dados.pk})
+        self.assertEqual(response.json()[0]['exercicios'], [])
+        # Treinos e exercícios: uma consulta cada
+        self.assertEqual(len(ctx.captured_queries), 2)
+
+
+# ============= BUSCA TEXTUAL =============
+
+class BuscaTreinoTest(APITestCase):
+    def setUp(self):
+        self.url = reverse('treino-busca')
+        self.personal = Usuario.objects.create(nome="Personal Busca", is_personal=True)
+        self.aluno = Usuario.objects.create(nome="Aluno Busca", is_personal=False)
+        self.pernas = Treino.objects.create(aluno=self.aluno, personal=self.personal, nome="Agachamento pesado")
+        Exercicio.objects.create(treino=self.pernas, nome="Agachamento livre")
+        Exercicio.objects.create(treino=self.pernas, nome="Leg press")
+        self.costas = Treino.objects.create(aluno=self.aluno, nome="Costas", descricao="Finalizar com agachaménto leve")
+        self.exercicio_costas = Exercicio.objects.create(treino=self.costas, nome="Remada curvada")
+
+    def ids(self, q, **params):
+        response = self.client.get(self.url, {'q': q, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [resultado['id'] for resultado in response.data['resultados']]
+
+    def test_prefixo_sem_acentos_e_relevancia(self):
+        # No nome e nos exercícios pesa mais do que só na descrição
+        self.assertEqual(self.ids("agach"), [self.pernas.pk, self.costas.pk])
+        self.assertEqual(self.ids("AGACHAMÊNTO"), [self.pernas.pk, self.costas.pk])
+        self.assertEqual(self.ids("agach rem"), [self.costas.pk])
+        self.assertEqual(self.ids("agach", limite=1), [self.pernas.pk])
+        self.assertEqual(self.ids("inexistente"), [])
+
+    def test_resultado_no_formato_da_listagem(self):
+        response = self.client.get(self.url, {'q': "leg"})
+        resultado = response.data['resultados'][0]
+        self.assertEqual(resultado['personal_nome'], "Personal Busca")
+        self.assertEqual([e['nome'] for e in resultado['exercicios']], ["Agachamento livre", "Leg press"])
+        self.assertGreater(resultado['relevancia'], 0)
+
+    def test_indice_acompanha_as_gravacoes(self):
+        self.exercicio_costas.nome = "Puxada frontal"
+        self.exercicio_costas.save()
+        self.assertEqual(self.ids("remada"), [])
+        self.assertEqual(self.ids("puxada"), [self.costas.pk])
+
+        self.pernas.delete()
+        self.assertEqual(self.ids("leg"), [])
+
+        response = self.client.post(reverse('treino-completo-create'), [
+            {"aluno": self.aluno.pk, "nome": "Lote", "exercicios": [{"nome": "Stiff"}]},
+        ], format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response = self.client.put(
+            reverse('treino-completo-update', kwargs={'pk': self.costas.pk}),
+            {"aluno": self.aluno.pk, "nome": "Costas", "exercicios": [{"nome": "Serrote"}]}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(self.ids("stiff")), 1)
+        self.assertEqual(self.ids("serrote"), [self.costas.pk])
+        self.assertEqual(self.ids("puxada"), [])
+
+    def test_termo_obrigatorio(self):
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(self.url, {'q': '"*'}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(self.url, {'q': 'a', 'limite': 'x'}).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_reindexar(self):
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM gym_busca_treino")
+        self.assertEqual(self.ids("leg"), [])
+        saida = StringIO()
+        call_command('reindexar_busca', stdout=saida)
+        self.assertIn("2 treinos indexados", saida.getvalue())
+        self.assertEqual(self.ids("leg"), [self.pernas.pk])
+
+
+# ============= VOLUME DE TREINO =============
+
+class VolumeTreinoTest(APITestCase):
+    def setUp(self):
+        limpar_caches()
+        self.aluno = Usuario.objects.create(nome="Aluno Volume", is_personal=False)
+        self.outro = Usuario.objects.create(nome="Outro Aluno", is_personal=False)
+        self.url = reverse('aluno-volume', kwargs={'aluno_id': self.aluno.pk})
+        hoje = timezone.localdate()
+        self.treinos = []
+        for meses_atras, carga in ((2, 40.0), (1, 50.0), (0, 60.0)):
+            # Dia 1 de cada um dos três últimos meses (o atual incluído)
+            mes = (hoje.month - meses_atras - 1) % 12 + 1
+            ano = hoje.year + (hoje.month - meses_atras - 1) // 12
+            treino = Treino.objects.create(aluno=self.aluno, nome=f"Pernas {meses_atras}")
+            Treino.objects.filter(pk=treino.pk).update(
+                data_criacao=timezone.make_aware(datetime(ano, mes, 1, 12))
+            )
+            Exercicio.objects.create(treino=treino, nome="Agachamento", series=3, repeticoes=10, carga_kg=carga)
+            Exercicio.objects.create(treino=treino, nome="Prancha", series=3, repeticoes=1, carga_kg=None)
+            self.treinos.append(treino)
+        Exercicio.objects.create(treino=Treino.objects.create(aluno=self.outro, nome="X"), nome="Agachamento", carga_kg=500)
+
+    def test_tonelagem_por_exercicio_e_tendencia(self):
+        dados = self.client.get(self.url).data
+        self.assertEqual(dados['tonelagem'], 3 * 10 * (40 + 50 + 60))
+        self.assertEqual(dados['series'], 18)
+        self.assertEqual(dados['repeticoes'], 3 * 10 * 3 + 3 * 1 * 3)
+
+        agachamento, prancha = dados['exercicios']
+        self.assertEqual(agachamento['exercicio'], "Agachamento")
+        self.assertEqual(agachamento['carga_maxima'], 60.0)
+        self.assertEqual([mes['tonelagem'] for mes in agachamento['por_mes']], [1200, 1500, 1800])
+        self.assertEqual(agachamento['tendencia'], {'tonelagem_por_mes': 300.0, 'carga_maxima_por_mes': 10.0})
+        # Sem carga: conta séries e repetições, mas não tonelagem
+        self.assertEqual(prancha['tonelagem'], 0)
+        self.assertIsNone(prancha['carga_maxima'])
+        self.assertIsNone(prancha['tendencia']['carga_maxima_por_mes'])
+
+        recente = self.client.get(self.url, {'inicio': timezone.localdate().replace(day=1).isoformat()}).data
+        self.assertEqual(recente['tonelagem'], 1800)
+        self.assertIsNone(recente['exercicios'][0]['tendencia']['tonelagem_por_mes'])
+
+    def test_volume_do_treino(self):
+        response = self.client.get(reverse('treino-volume', kwargs={'pk': self.treinos[0].pk}))
+        self.assertEqual(response.data['tonelagem'], 1200)
+        self.assertEqual([e['tonelagem'] for e in response.data['exercicios']], [1200, None])
+        self.assertEqual(self.client.get(reverse('treino-volume', kwargs={'pk': 0})).status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(VOLUME_CACHE_TTL=120)
+    def test_analises_expiram(self):
+        with mock.patch.object(volume.cache, 'set', wraps=volume.cache.set) as guardar:
+            self.client.get(self.url)
+        self.assertEqual(guardar.call_args.kwargs['timeout'], 120)
+
+    def test_invalidacao_de_outro_processo(self):
+        self.client.get(self.url)
+        chave = f'{volume.PREFIXO}{self.aluno.pk}:versao'
+        self.assertIsNotNone(volume.versoes().get(chave))
+        # O worker que atendeu a gravação só troca a versão no cache compartilhado
+        volume.versoes().set(chave, volume.nova_versao())
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(self.url)
+        self.assertGreater(len(ctx.captured_queries), 1)
+
+    def test_cache_invalidado_quando_os_exercicios_mudam(self):
+        treino_url = reverse('treino-volume', kwargs={'pk': self.treinos[-1].pk})
+        self.client.get(self.url)
+        self.client.get(treino_url)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(self.url).data['tonelagem'], 4500)
+        with self.assertNumQueries(1):
+            self.client.get(treino_url)
+
+        exercicio = self.treinos[-1].exercicios.get(nome="Agachamento")
+        with self.captureOnCommitCallbacks(execute=True):
+            exercicio.carga_kg = 100
+            exercicio.save()
+        self.assertEqual(self.client.get(self.url).data['tonelagem'], 4500 + 3 * 10 * 40)
+        self.assertEqual(self.client.get(treino_url).data['tonelagem'], 3000)
+
+        # Substituição em lote dos exercícios também invalida
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.put(
+                reverse('treino-completo-update', kwargs={'pk': self.treinos[-1].pk}),
+                {"aluno": self.aluno.pk, "nome": "Pernas", "exercicios": [{"nome": "Leg press", "series": 1, "repeticoes": 1, "carga_kg": 7}]},
+                format='json'
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get(treino_url).data['tonelagem'], 7)
+        self.assertEqual(self.client.get(self.url).data['tonelagem'], 2700 + 7)
+
+        # Treino passado a outro aluno sai da análise do primeiro
+        with self.captureOnCommitCallbacks(execute=True):
+            self.treinos[0].aluno = self.outro
+            self.treinos[0].save()
+        self.assertEqual(self.client.get(self.url).data['tonelagem'], 1500 + 7)
+
+    def test_periodo_invalido(self):
+        for params in ({'inicio': '2024-02-01', 'fim': '2024-01-01'}, {'fim': 'ontem'}):
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, params)
+
+
+# ============= CACHE DE ELEGIBILIDADE =============
+
+class ElegibilidadeCacheTest(APITestCase):
+    def setUp(self):
+        elegibilidade.limpar()
+        self.aluno = Usuario.objects.create(nome="Aluno Catraca", is_personal=False)
+        self.mensalidade = Mensalidade.objects.create(
+            aluno=self.aluno, data_pagamento=date.today(),
+            validade=date.today() + timedelta(days=30), valor=100
+        )
+        self.url = reverse('aluno-checkin', kwargs={'aluno_id': self.aluno.pk})
+
+    def checkin(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(self.url)
+        return response.status_code, [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('SELECT')]
+
+    def test_em_regime_o_checkin_so_grava(self):
+        self.assertEqual(self.checkin()[0], status.HTTP_201_CREATED)
+        codigo, leituras = self.checkin()
+        self.assertEqual(codigo, status.HTTP_201_CREATED)
+        self.assertEqual(leituras, [])
+        self.assertEqual(CheckIn.objects.count(), 2)
+
+    def test_invalidado_pelos_sinais(self):
+        self.checkin()
+        self.mensalidade.validade = date.today() - timedelta(days=1)
+        self.mensalidade.save()
+        self.assertEqual(self.checkin()[0], status.HTTP_403_FORBIDDEN)
+
+        Mensalidade.objects.create(
+            aluno=self.aluno, data_pagamento=date.today(),
+            validade=date.today() + timedelta(days=30), valor=100
+        )
+        self.assertEqual(self.checkin()[0], status.HTTP_201_CREATED)
+
+        self.aluno.is_personal = True
+        self.aluno.save()
+        self.assertEqual(self.checkin()[0], status.HTTP_400_BAD_REQUEST)
+
+        self.aluno.delete()
+        self.assertEqual(self.checkin()[0], status.HTTP_404_NOT_FOUND)
+
+    def test_processamento_de_vencimentos_limpa_o_cache(self):
+        self.mensalidade.validade = date.today()
+        self.mensalidade.save()
+        self.assertEqual(self.checkin()[0], status.HTTP_201_CREATED)
+        vencimentos.processar(date.today() + timedelta(days=1))
+        self.assertEqual(self.checkin()[0], status.HTTP_403_FORBIDDEN)
+
+    def test_expira_pelo_ttl_e_na_virada_do_dia(self):
+        with override_settings(ELEGIBILIDADE_CACHE_TTL=0):
+            self.checkin()
+            self.assertEqual(len(self.checkin()[1]), 1)
+
+        self.checkin()
+        amanha = date.today() + timedelta(days=1)
+        with mock.patch('gym.elegibilidade.date', wraps=date) as data:
+            data.today.return_value = amanha
+            self.assertEqual(len(self.checkin()[1]), 1)
+
+    def test_lru_limitado(self):
+        lru = elegibilidade.CacheLocal(tamanho=2, ttl=60)
+        for aluno_id in (1, 2, 3):
+            lru.guardar(aluno_id, aluno_id, lru.obter(aluno_id)[1])
+        self.assertIsNone(lru.obter(1)[0])
+        self.assertEqual(lru.obter(3)[0], 3)
+
+        # Valor lido antes de uma invalidação não é guardado
+        _, geracao = lru.obter(4)
+        lru.descartar(4)
+        lru.guardar(4, 'antigo', geracao)
+        self.assertIsNone(lru.obter(4)[0])
+
+        resumo = lru.resumo()
+        self.assertEqual((resumo['tamanho'], resumo['descartadas_por_tamanho'], resumo['acertos']), (2, 1, 1))
+
+    @override_settings(ELEGIBILIDADE_CACHE='compartilhado')
+    def test_modo_compartilhado(self):
+        limpar_caches()
+        self.assertEqual(elegibilidade.cache_ativo().modo, 'compartilhado')
+        self.checkin()
+        self.assertEqual(self.checkin()[1], [])
+
+        Mensalidade.objects.filter(pk=self.mensalidade.pk).update(validade=date.today() - timedelta(days=1))
+        ResumoMensalidade.objects.filter(aluno=self.aluno).update(ativa=False)
+        self.assertEqual(self.checkin()[0], status.HTTP_201_CREATED)
+        elegibilidade.limpar()
+        self.assertEqual(self.checkin()[0], status.HTTP_403_FORBIDDEN)
+
+    @override_settings(ELEGIBILIDADE_CACHE='compartilhado')
+    def test_compartilhado_nao_guarda_valor_lido_antes_da_invalidacao(self):
+        limpar_caches()
+        compartilhado = elegibilidade.cache_ativo()
+        _, marcador = compartilhado.obter(self.aluno.pk)
+        compartilhado.descartar(self.aluno.pk)
+        compartilhado.guardar(self.aluno.pk, 'antigo', marcador)
+        self.assertIsNone(compartilhado.obter(self.aluno.pk)[0])
+
+        # A geração despejada do cache é recriada com outro valor
+        _, marcador = compartilhado.obter(self.aluno.pk)
+        compartilhado.guardar(self.aluno.pk, 'atual', marcador)
+        self.assertEqual(compartilhado.obter(self.aluno.pk)[0], 'atual')
+        elegibilidade.cache.delete(compartilhado.chave_geracao(self.aluno.pk))
+        self.assertIsNone(compartilhado.obter(self.aluno.pk)[0])
+
+    def test_estatisticas_restritas_a_admin(self):
+        url = reverse('checkin-elegibilidade')
+        self.checkin()
+        self.checkin()
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.force_authenticate(User.objects.create_user('admin', is_staff=True))
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['modo'], 'local')
+        self.assertGreater(response.data['acertos'], 0)
+        self.assertIsNotNone(response.data['taxa_de_acerto'])
+
+
+# ============= ARQUIVAMENTO DE CHECK-INS =============
+
+class ArquivamentoCheckInTest(APITestCase):
+    def setUp(self):
+        self.aluno = Usuario.objects.create(nome="Aluno Antigo", is_personal=False)
+        self.outro = Usuario.objects.create(nome="Outro Aluno", is_personal=False)
+        self.mes_atual = timezone.localdate().replace(day=1)
+        self.antigo = arquivamento.limite_de_retencao(meses=5)
+        self.anterior = arquivamento.proximo_mes(self.antigo)
+        self.horarios = [
+            (self.aluno, self.em(self.antigo, 3, time(7, 15, 20))),
+            (self.outro, self.em(self.antigo, 3, time(7, 40))),
+            (self.aluno, self.em(self.antigo, 17, time(19, 5, 59))),
+            (self.aluno, self.em(self.anterior, 1, time(0, 0, 1))),
+            (self.aluno, self.em(self.mes_atual, 1, time(6, 0))),
+        ]
+        for aluno, horario in self.horarios:
+            CheckIn.objects.create(aluno=aluno, data_hora_checkin=horario)
+
+    @staticmethod
+    def em(mes, dia, horario):
+        return timezone.make_aware(datetime.combine(mes.replace(day=dia), horario))
+
+    def arquivar(self):
+        call_command('arquivar_checkins', retencao=3, stdout=StringIO())
+
+    def test_move_meses_antigos_para_o_arquivo(self):
+        self.arquivar()
+        self.assertEqual(list(CheckIn.objects.values_list('data_hora_checkin', flat=True)), [self.horarios[-1][1]])
+        self.assertEqual(
+            list(ArquivoCheckIn.objects.order_by('mes').values_list('mes', 'total', 'alunos_distintos')),
+            [(self.antigo, 3, 2), (self.anterior, 1, 1)]
+        )
+        de, ate = arquivamento.limites_do_mes(self.antigo)
+        self.assertEqual(
+            list(arquivamento.registros(de, ate)),
+            [(aluno.pk, horario) for aluno, horario in self.horarios[:3]]
+        )
+
+        # Segunda execução não encontra nada para mover
+        self.assertEqual(arquivamento.arquivar(retencao=3), [])
+
+    def test_rollups_e_consultas_continuam_iguais(self):
+        antes = sorted(OcupacaoHoraria.objects.values_list('hora', 'total'))
+        inicio = {'inicio': self.antigo.isoformat()}
+        mapa = self.client.get(reverse('checkin-ocupacao'), inicio).data['matriz']
+        self.arquivar()
+        self.assertEqual(sorted(OcupacaoHoraria.objects.values_list('hora', 'total')), antes)
+        self.assertEqual(self.client.get(reverse('checkin-ocupacao'), inicio).data['matriz'], mapa)
+
+        # Os rollups refeitos do zero incluem os meses arquivados
+        OcupacaoHoraria.objects.all().delete()
+        FrequenciaDiaria.objects.all().delete()
+        ocupacao.recompactar(self.antigo, timezone.localdate())
+        self.assertEqual(sorted(OcupacaoHoraria.objects.values_list('hora', 'total')), antes)
+        self.assertEqual(
+            FrequenciaDiaria.objects.get(aluno=self.aluno, dia=self.antigo.replace(day=3)).total, 1
+        )
+
+    def test_eventos_atrasados_sao_mesclados(self):
+        self.arquivar()
+        atrasado = self.em(self.antigo, 10, time(12, 0))
+        CheckIn.objects.create(aluno=self.outro, data_hora_checkin=atrasado)
+        self.assertEqual(arquivamento.arquivar(retencao=3), [(self.antigo, 1)])
+
+        arquivo = ArquivoCheckIn.objects.get(mes=self.antigo)
+        self.assertEqual(arquivo.total, 4)
+        alunos, instantes = arquivamento.decodificar(arquivo)
+        self.assertEqual(list(instantes), sorted(instantes))
+        self.assertEqual(alunos[2], self.outro.pk)
+        self.assertEqual(arquivamento.total_arquivado(), 5)
+
+    def test_checkin_confirmado_depois_da_leitura_fica_na_tabela(self):
+        atrasado = self.em(self.antigo, 20, time(9, 0))
+        salvar = ArquivoCheckIn.save
+
+        def checkin_concorrente(arquivo, *args, **kwargs):
+            # Chega entre a leitura das linhas e a exclusão
+            CheckIn.objects.create(aluno=self.outro, data_hora_checkin=atrasado)
+            return salvar(arquivo, *args, **kwargs)
+
+        with mock.patch.object(ArquivoCheckIn, 'save', checkin_concorrente):
+            arquivamento.arquivar_mes(self.antigo)
+        self.assertEqual(ArquivoCheckIn.objects.get(mes=self.antigo).total, 3)
+        self.assertTrue(CheckIn.objects.filter(data_hora_checkin=atrasado).exists())
+
+        # Fica para a próxima execução, que o mescla ao arquivo
+        self.assertEqual(arquivamento.arquivar_mes(self.antigo), 1)
+        self.assertEqual(ArquivoCheckIn.objects.get(mes=self.antigo).total, 4)
+
+    def test_colunas_comprimidas(self):
+        base = int(arquivamento.limites_do_mes(self.antigo)[0].timestamp())
+        instantes = [base + 60 * i for i in range(10000)]
+        alunos, deltas = arquivamento.codificar([7] * 10000, instantes, base)
+        self.assertLess(len(alunos) + len(deltas), 1000)
+
+    def test_retencao_invalida(self):
+        with self.assertRaises(CommandError):
+            call_command('arquivar_checkins', retencao=0, stdout=StringIO())
+
+
+# ============= CAMPOS SOB DEMANDA =============
+
+class CamposSobDemandaTest(APITestCase):
+    def setUp(self):
+        self.personal = Usuario.objects.create(nome="Personal Campos", is_personal=True)
+        self.aluno = Usuario.objects.create(nome="Aluno Campos", is_personal=False)
+        self.treinos = [
+            Treino.objects.create(aluno=self.aluno, personal=self.personal, nome=f"Treino {letra}")
+            for letra in 'AB'
+        ]
+        for treino in self.treinos:
+            Exercicio.objects.create(treino=treino, nome="Supino", series=3, repeticoes=10)
+        Mensalidade.objects.create(
+            aluno=self.aluno, data_pagamento=date.today(),
+            validade=date.today() + timedelta(days=30), valor=100
+        )
+
+    def get(self, nome, params, **kwargs):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse(nome, kwargs=kwargs), params)
+        return response, [q['sql'] for q in ctx.captured_queries]
+
+    def test_lista_sem_joins_nem_exercicios(self):
+        response, queries = self.get('treino-list-create', {'fields': 'id,nome'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, [{'id': t.pk, 'nome': t.nome} for t in self.treinos])
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('JOIN', queries[0])
+
+    def test_expand(self):
+        response, queries = self.get('treino-list-create', {'fields': 'id', 'expand': 'exercicios,aluno'})
+        self.assertEqual(list(response.data[0]), ['id', 'aluno_nome', 'exercicios'])
+        self.assertEqual(response.data[0]['exercicios'][0]['nome'], "Supino")
+        self.assertEqual(len(queries), 2)
+        self.assertNotIn('personal', queries[0].split('FROM')[0])
+
+    def test_sem_fields_resposta_completa(self):
+        completo = self.client.get(reverse('treino-list-create')).data
+        self.assertEqual(self.client.get(reverse('treino-list-create'), {'expand': 'exercicios'}).data, completo)
+        self.assertIn('personal_nome', completo[0])
+
+    def test_paginacao_com_campos(self):
+        url = reverse('treino-list-create')
+        response = self.client.get(url, {'fields': 'nome', 'page_size': 1})
+        self.assertEqual(response.data['results'], [{'nome': "Treino A"}])
+        response = self.client.get(response.data['next'])
+        self.assertEqual(response.data['results'], [{'nome': "Treino B"}])
+
+    def test_streaming_com_campos(self):
+        response = self.client.get(reverse('mensalidade-list-create'), {'fields': 'valor', 'stream': '1'})
+        linhas = [json.loads(linha) for linha in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual(linhas, [{'valor': '100.00'}])
+
+    def test_detalhe_e_etag_por_recorte(self):
+        response, queries = self.get('treino-detail', {'fields': 'id,nome'}, pk=self.treinos[0].pk)
+        self.assertEqual(response.data, {'id': self.treinos[0].pk, 'nome': "Treino A"})
+        self.assertFalse(any('JOIN' in sql or 'gym_exercicio' in sql for sql in queries))
+
+        completo = self.client.get(reverse('treino-detail', kwargs={'pk': self.treinos[0].pk}))
+        self.assertNotEqual(response['ETag'], completo['ETag'])
+
+    def test_campo_desconhecido(self):
+        response = self.client.get(reverse('mensalidade-list-create'), {'fields': 'valor,senha'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('senha', response.data['error'])
+
+        response = self.client.get(reverse('usuario-list-create'), {'fields': 'id', 'expand': 'treinos'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_escrita_ignora_campos(self):
+        url = reverse('mensalidade-list-create') + '?fields=id'
+        response = self.client.post(url, {
+            'aluno': self.aluno.pk, 'data_pagamento': date.today(),
+            'validade': date.today() + timedelta(days=30), 'valor': '80.00'
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertIn('aluno_nome', response.data)
+
+    def test_listagem_async_delega(self):
+        response = self.client.get(reverse('async-treino-list'), {'fields': 'nome'})
+        self.assertEqual(response.json(), [{'nome': "Treino A"}, {'nome': "Treino B"}])
+
+
+# ============= SINCRONIZAÇÃO INCREMENTAL =============
+
+@override_settings(SYNC_MARGEM_SEGUNDOS=0)
+class SincronizacaoTest(APITestCase):
+    def setUp(self):
+        self.personal = Usuario.objects.create(nome="Personal Sync", is_personal=True)
+        self.aluno = Usuario.objects.create(nome="Aluno Sync", is_personal=False)
+        self.outro = Usuario.objects.create(nome="Outro Sync", is_personal=False)
+        self.treino = Treino.objects.create(aluno=self.aluno, personal=self.personal, nome="Treino Sync")
+        self.exercicios = [
+            Exercicio.objects.create(treino=self.treino, nome=nome, series=3, repeticoes=10)
+            for nome in ("Supino", "Remada")
+        ]
+        self.mensalidade = Mensalidade.objects.create(
+            aluno=self.aluno, data_pagamento=date.today(),
+            validade=date.today() + timedelta(days=30), valor=100
+        )
+        Treino.objects.create(aluno=self.outro, nome="Treino de outro")
+        self.url = reverse('sync')
+
+    def sync(self, **params):
+        response = self.client.get(self.url, {'aluno': self.aluno.pk, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    @staticmethod
+    def ids(dados, chave):
+        return sorted(item['id'] for item in dados[chave]['alterados'])
+
+    def test_retrato_do_aluno(self):
+        dados = self.sync()
+        self.assertTrue(dados['completo'])
+        self.assertEqual(dados['cursor'], Alteracao.objects.latest('id').pk)
+        self.assertEqual(self.ids(dados, 'usuarios'), [self.aluno.pk])
+        self.assertEqual(self.ids(dados, 'treinos'), [self.treino.pk])
+        self.assertEqual(self.ids(dados, 'exercicios'), [e.pk for e in self.exercicios])
+        self.assertEqual(self.ids(dados, 'mensalidades'), [self.mensalidade.pk])
+        self.assertNotIn('exercicios', dados['treinos']['alterados'][0])
+        self.assertEqual(dados['treinos']['alterados'][0]['personal_nome'], "Personal Sync")
+
+    def test_so_o_que_mudou_desde_o_cursor(self):
+        cursor = self.sync()['cursor']
+        self.assertEqual(self.sync(since=cursor)['treinos'], {'alterados': [], 'excluidos': []})
+
+        self.treino.nome = "Treino Renomeado"
+        self.treino.save()
+        excluido_id = self.exercicios[0].pk
+        self.exercicios[0].delete()
+        nova = Mensalidade.objects.create(
+            aluno=self.aluno, data_pagamento=date.today(),
+            validade=date.today() + timedelta(days=60), valor=100
+        )
+        Treino.objects.create(aluno=self.outro, nome="Fora do escopo")
+
+        with CaptureQueriesContext(connection) as ctx:
+            dados = self.sync(since=cursor)
+        self.assertLessEqual(len(ctx.captured_queries), 6)
+        self.assertFalse(dados['completo'])
+        self.assertEqual([t['nome'] for t in dados['treinos']['alterados']], ["Treino Renomeado"])
+        self.assertEqual(dados['exercicios'], {'alterados': [], 'excluidos': [excluido_id]})
+        self.assertEqual(self.ids(dados, 'mensalidades'), [nova.pk])
+        self.assertEqual(dados['usuarios'], {'alterados': [], 'excluidos': []})
+
+        self.assertEqual(self.sync(since=dados['cursor'])['treinos']['alterados'], [])
+
+    def test_criado_e_excluido_vira_so_lapide(self):
+        cursor = self.sync()['cursor']
+        exercicio = Exercicio.objects.create(treino=self.treino, nome="Temporário")
+        exercicio_id = exercicio.pk
+        exercicio.delete()
+        self.assertEqual(self.sync(since=cursor)['exercicios'], {'alterados': [], 'excluidos': [exercicio_id]})
+
+    def test_mudanca_de_aluno(self):
+        cursor = self.sync()['cursor']
+        self.treino.aluno = self.outro
+        self.treino.save()
+
+        antigo = self.sync(since=cursor)
+        self.assertEqual(antigo['treinos']['excluidos'], [self.treino.pk])
+        self.assertEqual(antigo['exercicios']['excluidos'], [e.pk for e in self.exercicios])
+
+        novo = self.client.get(self.url, {'aluno': self.outro.pk, 'since': cursor}).data
+        self.assertEqual(self.ids(novo, 'treinos'), [self.treino.pk])
+        self.assertEqual(self.ids(novo, 'exercicios'), [e.pk for e in self.exercicios])
+
+    def test_nome_do_personal_atualiza_treinos(self):
+        cursor = self.sync()['cursor']
+        self.personal.nome = "Personal Novo Nome"
+        self.personal.save()
+        dados = self.sync(since=cursor)
+        self.assertEqual([t['personal_nome'] for t in dados['treinos']['alterados']], ["Personal Novo Nome"])
+
+    def test_exclusao_do_personal_atualiza_treinos(self):
+        cursor = self.sync()['cursor']
+        self.personal.delete()
+        dados = self.sync(since=cursor)
+        self.assertEqual(self.ids(dados, 'treinos'), [self.treino.pk])
+        self.assertIsNone(dados['treinos']['alterados'][0]['personal'])
+        self.assertEqual(dados['treinos']['excluidos'], [])
+
+    def test_exclusao_em_cascata(self):
+        cursor = self.sync()['cursor']
+        aluno_id, treino_id, mensalidade_id = self.aluno.pk, self.treino.pk, self.mensalidade.pk
+        exercicio_ids = [e.pk for e in self.exercicios]
+        self.aluno.delete()
+        dados = self.client.get(self.url, {'aluno': aluno_id, 'since': cursor}).data
+        self.assertEqual(dados['usuarios']['excluidos'], [aluno_id])
+        self.assertEqual(dados['treinos']['excluidos'], [treino_id])
+        self.assertEqual(dados['exercicios']['excluidos'], exercicio_ids)
+        self.assertEqual(dados['mensalidades']['excluidos'], [mensalidade_id])
+
+    def test_gravacoes_em_lote(self):
+        cursor = self.sync()['cursor']
+        corpo = {
+            'aluno': self.aluno.pk, 'nome': "Treino Completo",
+            'exercicios': [{'nome': "Agachamento", 'series': 4, 'repeticoes': 8}],
+        }
+        criado = self.client.post(reverse('treino-completo-create'), corpo, format='json').data
+        dados = self.sync(since=cursor)
+        self.assertIn(criado['id'], self.ids(dados, 'treinos'))
+        self.assertEqual(self.ids(dados, 'exercicios'), [e['id'] for e in criado['exercicios']])
+
+        cursor = dados['cursor']
+        url = reverse('treino-completo-update', kwargs={'pk': self.treino.pk})
+        corpo = {'aluno': self.aluno.pk, 'nome': "Treino Sync", 'exercicios': [{'id': self.exercicios[1].pk, 'nome': "Remada"}]}
+        self.client.put(url, corpo, format='json')
+        dados = self.sync(since=cursor)
+        self.assertEqual(dados['exercicios']['excluidos'], [self.exercicios[0].pk])
+        self.assertEqual(self.ids(dados, 'exercicios'), [self.exercicios[1].pk])
+
+    def test_paginas(self):
+        cursor = self.sync()['cursor']
+        for nome in "ABC":
+            Exercicio.objects.create(treino=self.treino, nome=nome)
+        pagina = self.sync(since=cursor, limite=2)
+        self.assertTrue(pagina['mais'])
+        resto = self.sync(since=pagina['cursor'], limite=2)
+        self.assertFalse(resto['mais'])
+        nomes = [e['nome'] for e in pagina['exercicios']['alterados'] + resto['exercicios']['alterados']]
+        self.assertEqual(sorted(nomes), ["A", "B", "C"])
+
+    @override_settings(SYNC_MARGEM_SEGUNDOS=60)
+    def test_margem_retem_o_cursor(self):
+        cursor = Alteracao.objects.earliest('id').pk
+        dados = self.sync(since=cursor, limite=1)
+        self.assertEqual(dados['cursor'], cursor)
+        self.assertFalse(dados['mais'])
+
+    def test_cursor_expirado_apos_poda(self):
+        Alteracao.objects.update(criado_em=timezone.now() - timedelta(days=100))
+        Exercicio.objects.create(treino=self.treino, nome="Novo")
+        call_command('podar_alteracoes', dias=90, stdout=StringIO())
+        self.assertEqual(Alteracao.objects.count(), 1)
+
+        response = self.client.get(self.url, {'since': 1})
+        self.assertEqual(response.status_code, status.HTTP_410_GONE)
+        self.assertIn('error', response.data)
+        self.assertEqual(len(self.sync(since=Alteracao.objects.get().pk - 1)['exercicios']['alterados']), 1)
+
+    def test_parametros_invalidos(self):
+        for params in ({'since': 'x'}, {'aluno': 'x'}, {'since': -1}, {}):
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+# ============= ADMIN =============
+class AdminEscalavelTest(APITestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@gym.local', 'senha'))
+        self.aluna = Usuario.objects.create(nome="Mariana Souza")
+        self.outra = Usuario.objects.create(nome="Ana Maria")
+        self.personal = Usuario.objects.create(nome="marcos Lima", is_personal=True)
+
+    def popular(self, quantidade):
+        for i in range(quantidade):
+            aluno = Usuario.objects.create(nome=f"Aluno {i}")
+            Mensalidade.objects.create(
+                aluno=aluno, data_pagamento=date.today(), validade=date.today() + timedelta(days=30), valor=100
+            )
+            treino = Treino.objects.create(aluno=aluno, personal=self.personal, nome=f"Treino {i}")
+            Exercicio.objects.create(treino=treino, nome="Supino")
+            CheckIn.objects.create(aluno=aluno)
+
+    def consultas(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(ctx.captured_queries)
+
+    def test_listagens_sem_consulta_por_linha(self):
+        urls = [
+            reverse(f'admin:gym_{modelo}_changelist')
+            for modelo in ('usuario', 'mensalidade', 'treino', 'exercicio', 'checkin')
+        ]
+        self.popular(2)
+        poucas = {url: self.consultas(url) for url in urls}
+        self.popular(10)
+        self.assertEqual({url: self.consultas(url) for url in urls}, poucas)
+
+    def test_autocomplete_pelo_inicio_do_nome(self):
+        url = reverse('admin:autocomplete')
+        params = {'app_label': 'gym', 'model_name': 'mensalidade', 'field_name': 'aluno'}
+        response = self.client.get(url, {**params, 'term': 'MAR'})
+        self.assertEqual(
+            [resultado['text'] for resultado in response.json()['results']],
+            ['marcos Lima (Personal)', 'Mariana Souza (Aluno)']
+        )
+        response = self.client.get(url, {**params, 'term': str(self.outra.pk)})
+        self.assertEqual([resultado['id'] for resultado in response.json()['results']], [str(self.outra.pk)])
+
+    def test_busca_por_nomes_acentuados(self):
+        erica = Usuario.objects.create(nome="Érica Alves")
+        angela = Usuario.objects.create(nome="Ângela Dias")
+        # bulk_create também preenche o nome normalizado
+        Usuario.objects.bulk_create([Usuario(nome="ÊNIO Castro")])
+        url = reverse('admin:gym_usuario_changelist')
+        for termo, nomes in [
+            ('Érica', ["Érica Alves"]), ('éRI', ["Érica Alves"]), ('erica', ["Érica Alves"]),
+            ('âng', ["Ângela Dias"]), ('ANGELA D', ["Ângela Dias"]), ('ênio', ["ÊNIO Castro"]),
+        ]:
+            with self.subTest(termo=termo):
+                response = self.client.get(url, {'q': termo})
+                self.assertEqual([usuario.nome for usuario in response.context['cl'].result_list], nomes)
+
+        Mensalidade.objects.create(aluno=angela, data_pagamento=date.today(), validade=date.today(), valor=100)
+        response = self.client.get(reverse('admin:gym_mensalidade_changelist'), {'q': 'Ângela'})
+        self.assertEqual([mensalidade.aluno for mensalidade in response.context['cl'].result_list], [angela])
+
+        response = self.client.get(reverse('admin:autocomplete'), {
+            'app_label': 'gym', 'model_name': 'mensalidade', 'field_name': 'aluno', 'term': 'ÉR'
+        })
+        self.assertEqual([resultado['id'] for resultado in response.json()['results']], [str(erica.pk)])
+
+    def test_busca_nas_listagens_pelo_aluno(self):
+        Mensalidade.objects.create(aluno=self.aluna, data_pagamento=date.today(), validade=date.today(), valor=100)
+        Mensalidade.objects.create(aluno=self.outra, data_pagamento=date.today(), validade=date.today(), valor=100)
+        url = reverse('admin:gym_mensalidade_changelist')
+        response = self.client.get(url, {'q': 'maria'})
+        self.assertEqual([mensalidade.aluno for mensalidade in response.context['cl'].result_list], [self.aluna])
+        response = self.client.get(url, {'q': self.outra.pk})
+        self.assertEqual([mensalidade.aluno for mensalidade in response.context['cl'].result_list], [self.outra])
+
+    def test_busca_de_exercicios_pelo_aluno_do_treino(self):
+        supino = Exercicio.objects.create(treino=Treino.objects.create(aluno=self.aluna, nome="A"), nome="Supino")
+        remada = Exercicio.objects.create(treino=Treino.objects.create(aluno=self.outra, nome="B"), nome="Remada")
+        url = reverse('admin:gym_exercicio_changelist')
+        response = self.client.get(url, {'q': 'maria'})
+        self.assertEqual(list(response.context['cl'].result_list), [supino])
+        response = self.client.get(url, {'q': self.outra.pk})
+        self.assertEqual(list(response.context['cl'].result_list), [remada])
+
+    def test_formularios_sem_select_de_usuarios(self):
+        response = self.client.get(reverse('admin:gym_treino_add'))
+        self.assertContains(response, 'admin-autocomplete')
+        self.assertNotContains(response, 'Mariana Souza')
+        response = self.client.get(reverse('admin:gym_exercicio_add'))
+        self.assertContains(response, 'vForeignKeyRawIdAdminField')
+
+    def test_checkin_so_visualizacao_e_insercao(self):
+        checkin = CheckIn.objects.create(aluno=self.aluna)
+        self.assertEqual(self.client.get(reverse('admin:gym_checkin_add')).status_code, status.HTTP_200_OK)
+        response = self.client.post(reverse('admin:gym_checkin_delete', args=[checkin.pk]), {'post': 'yes'})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertTrue(CheckIn.objects.filter(pk=checkin.pk).exists())
+
+    def test_date_hierarchy_em_saltos(self):
+        for dia in (date(2023, 12, 31), date(2024, 1, 1), date(2024, 1, 15), date(2024, 3, 2)):
+            Mensalidade.objects.create(aluno=self.aluna, data_pagamento=dia, validade=dia, valor=100)
+            CheckIn.objects.create(aluno=self.aluna, data_hora_checkin=timezone.make_aware(datetime.combine(dia, time(23, 30))))
+        admin_qs = QuerySetDoAdmin(Mensalidade)
+        for nivel in ('year', 'month', 'day'):
+            with self.subTest(nivel=nivel):
+                self.assertEqual(admin_qs.dates('data_pagamento', nivel), list(Mensalidade.objects.dates('data_pagamento', nivel)))
+                self.assertEqual(
+                    QuerySetDoAdmin(CheckIn).datetimes('data_hora_checkin', nivel, 'DESC'),
+                    list(CheckIn.objects.datetimes('data_hora_checkin', nivel, 'DESC'))
+                )
+        self.assertEqual(
+            admin_qs.aggregate(first=Min('data_pagamento'), last=Max('data_pagamento')),
+            {'first': date(2023, 12, 31), 'last': date(2024, 3, 2)}
+        )
+
+    @override_settings(ADMIN_CONTAGEM_EXATA_ATE=10)
+    @skipUnless(connection.vendor == 'sqlite', "estatísticas do SQLite (sqlite_stat1)")
+    def test_contagem_estimada_e_limitada(self):
+        for _ in range(15):
+            CheckIn.objects.create(aluno=self.aluna)
+        todos = CheckIn.objects.order_by('id')
+        self.assertEqual(ContagemEstimadaPaginator(todos, 100).count, 10)
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        for _ in range(5):
+            CheckIn.objects.create(aluno=self.outra)
+        # Tabela inteira pela estatística (anterior aos 5 últimos); com filtro, limitada
+        self.assertEqual(ContagemEstimadaPaginator(todos, 100).count, 15)
+        self.assertEqual(ContagemEstimadaPaginator(todos.filter(aluno=self.outra), 100).count, 5)
+        self.assertEqual(ContagemEstimadaPaginator(todos.filter(aluno=self.aluna), 100).count, 10)
@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import views, views_async
 
 urlpatterns = [
     # ============= USUÁRIOS =============
@@ -9,10 +9,15 @@ urlpatterns = [
     # ============= MENSALIDADES =============
     path('mensalidades/', views.MensalidadeListCreateView.as_view(), name='mensalidade-list-create'),
     path('mensalidades/<int:pk>/', views.MensalidadeDetailView.as_view(), name='mensalidade-detail'),
+    path('mensalidades/vencendo/', views.mensalidades_vencendo, name='mensalidade-vencendo'),
     
     # ============= TREINOS =============
     path('treinos/', views.TreinoListCreateView.as_view(), name='treino-list-create'),
     path('treinos/<int:pk>/', views.TreinoDetailView.as_view(), name='treino-detail'),
+    path('treinos/completo/', views.TreinoCompletoCreateView.as_view(), name='treino-completo-create'),
+    path('treinos/<int:pk>/completo/', views.TreinoCompletoUpdateView.as_view(), name='treino-completo-update'),
+    path('treinos/busca/', views.buscar_treinos, name='treino-busca'),
+    path('treinos/<int:pk>/volume/', views.volume_treino, name='treino-volume'),
     
     # ============= EXERCÍCIOS =============
     path('exercicios/', views.ExercicioListCreateView.as_view(), name='exercicio-list-create'),
@@ -24,6 +29,31 @@ urlpatterns = [
     path('dashboard/stats/', views.dashboard_stats, name='dashboard-stats'),
 
     path('personal/mais-popular/', views.personal_mais_popular, name='personal-mais-popular'),
+    path('personal/ranking/', views.ranking_personals, name='personal-ranking'),
 
     path('aluno/<int:aluno_id>/checkin/', views.aluno_checkin, name='aluno-checkin'), 
-]
\ No newline at end of file
+    path('checkins/bulk/', views.checkin_em_lote, name='checkin-bulk'),
+    path('checkins/elegibilidade/', views.elegibilidade_cache, name='checkin-elegibilidade'),
+
+    # ============= ANÁLISE DE CHECK-INS =============
+    path('checkins/ocupacao/', views.ocupacao_semanal, name='checkin-ocupacao'),
+    path('checkins/picos/', views.horarios_pico, name='checkin-picos'),
+    path('aluno/<int:aluno_id>/frequencia/', views.frequencia_aluno, name='aluno-frequencia'),
+    path('aluno/<int:aluno_id>/volume/', views.volume_aluno, name='aluno-volume'),
+
+    # ============= FINANCEIRO =============
+    path('financeiro/receita/', views.receita, name='financeiro-receita'),
+    path('financeiro/mensalidades.csv', views.exportar_mensalidades_csv, name='financeiro-export-csv'),
+
+    # ============= SINCRONIZAÇÃO =============
+    path('sync/', views.sincronizar, name='sync'),
+
+    # ============= ASGI (versões assíncronas) =============
+    path('async/usuarios/', views_async.UsuarioListAsyncView.as_view(), name='async-usuario-list'),
+    path('async/mensalidades/', views_async.MensalidadeListAsyncView.as_view(), name='async-mensalidade-list'),
+    path('async/treinos/', views_async.TreinoListAsyncView.as_view(), name='async-treino-list'),
+    path('async/exercicios/', views_async.ExercicioListAsyncView.as_view(), name='async-exercicio-list'),
+    path('async/aluno/<int:aluno_id>/status-mensalidade/', views_async.status_mensalidade, name='async-status-mensalidade'),
+    path('async/dashboard/stats/', views_async.dashboard_stats, name='async-dashboard-stats'),
+    path('async/aluno/<int:aluno_id>/checkin/', views_async.aluno_checkin, name='async-aluno-checkin'),
+]
@@ -0,0 +1,40 @@
+"""
+Processamento diário dos vencimentos de mensalidade.
+
+O status de cada aluno fica gravado em ``ResumoMensalidade.ativa``. Quem
+entra como ativo é ``sincronizar`` (a cada mensalidade gravada); quem sai é
+``processar``, executado uma vez por dia pelo comando
+``processar_vencimentos`` (ex.: às 00:05, pelo cron), que vira em lote todos
+os resumos cuja validade passou (e limpa o cache de elegibilidade de
+check-in). As views apenas leem o campo.
+"""
+from datetime import date, timedelta
+from django.db import transaction
+from . import elegibilidade, estatisticas
+from .models import ResumoMensalidade
+
+
+def processar(hoje=None):
+    """
+    Marca como inativos os resumos vencidos antes de ``hoje`` e como ativos
+    os que voltaram a valer (ex.: data do sistema corrigida). Idempotente.
+    """
+    hoje = hoje or date.today()
+    with transaction.atomic():
+        vencidas = ResumoMensalidade.objects.filter(ativa=True, validade__lt=hoje).update(ativa=False)
+        reativadas = ResumoMensalidade.objects.filter(ativa=False, validade__gte=hoje).update(ativa=True)
+        estatisticas.ajustar(alunos_ativos=reativadas - vencidas)
+        if vencidas or reativadas:
+            elegibilidade.limpar()
+    return {'vencidas': vencidas, 'reativadas': reativadas}
+
+
+def vencendo(dias, hoje=None):
+    """Resumos ativos que vencem entre hoje e daqui a ``dias`` dias, pela ordem de validade."""
+    hoje = hoje or date.today()
+    return (
+        ResumoMensalidade.objects
+        .filter(ativa=True, validade__gte=hoje, validade__lte=hoje + timedelta(days=dias))
+        .select_related('aluno')
+        .order_by('validade', 'aluno_id')
+    )
@@ -1,58 +1,244 @@
+import hashlib
+import json
 from rest_framework import generics, status
 from rest_framework.response import Response
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
+from rest_framework.utils.encoders import JSONEncoder
+from django.http import StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 from django.shortcuts import get_object_or_404
-from .models import Usuario, Mensalidade, Treino, Exercicio, CheckIn
+from core.db_router import usar_replica
+from core.middleware import orcamento_queries
+from . import busca, checkins, elegibilidade, estatisticas, financeiro, ocupacao, ranking, sync, vencimentos, volume
+from .leitura import LeituraRapida
+from .models import Usuario, Mensalidade, Treino, Exercicio, CheckIn, RankingPersonal
 from django.db import models
-from datetime import date
+from datetime import date, timedelta
+from django.utils.dateparse import parse_date
 from .serializers import (
     UsuarioSerializer, 
+    AlunoDoPersonalSerializer,
     MensalidadeSerializer, 
     TreinoSerializer, 
     TreinoCreateSerializer,
-    ExercicioSerializer
+    TreinoComExerciciosSerializer,
+    ExercicioSerializer,
+    relacoes_dos_campos,
 )
+from .pagination import (
+    UsuarioCursorPagination,
+    MensalidadeCursorPagination,
+    TreinoCursorPagination,
+    ExercicioCursorPagination,
+)
+
+
+# ============= LISTAGEM EM STREAMING =============
+class StreamingListMixin:
+    """
+    Com ``?stream=1`` a listagem é enviada como NDJSON (um objeto por linha),
+    lendo o banco em blocos com ``.iterator(chunk_size=...)``. A memória usada
+    fica constante, independente do tamanho da tabela.
+    """
+    stream_chunk_size = 2000
+
+    def list(self, request, *args, **kwargs):
+        if request.query_params.get('stream', '').lower() in ('1', 'true'):
+            queryset = self.filter_queryset(self.get_queryset())
+            # Fixa o banco agora: o corpo é gerado depois que o middleware de
+            # réplica já encerrou a requisição
+            queryset = queryset.order_by(*self.pagination_class.ordering)
+            queryset = queryset.using(queryset.db)
+            return StreamingHttpResponse(
+                self.linhas_ndjson(queryset),
+                content_type='application/x-ndjson'
+            )
+        return super().list(request, *args, **kwargs)
+
+    def linhas_ndjson(self, queryset):
+        serializer_class = self.get_serializer_class()
+        context = self.get_serializer_context()
+        for obj in queryset.iterator(chunk_size=self.stream_chunk_size):
+            data = serializer_class(obj, context=context).data
+            yield json.dumps(data, cls=JSONEncoder, ensure_ascii=False) + '\n'
+
+
+# ============= CAMPOS SOB DEMANDA =============
+class CamposSobDemandaViewMixin:
+    """
+    GETs com ``?fields=``/``?expand=`` (ver ``CamposSobDemandaMixin``): o
+    serializer monta só os campos pedidos e o queryset perde os
+    ``select_related``/``prefetch_related`` dos demais, sem SQL nem
+    serialização para o que ficou de fora.
+    """
+    def campos_pedidos(self):
+        if self.request.method not in ('GET', 'HEAD'):
+            return None
+        if not hasattr(self, '_campos_pedidos'):
+            self._campos_pedidos = self.get_serializer_class().campos_pedidos(self.request.query_params)
+        return self._campos_pedidos
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        campos = self.campos_pedidos()
+        if campos is None:
+            return queryset
+        return self.get_serializer_class().otimizar(queryset, campos)
+
+    def get_serializer(self, *args, **kwargs):
+        campos = self.campos_pedidos()
+        if campos is not None:
+            kwargs['campos'] = campos
+        return super().get_serializer(*args, **kwargs)
+
+
+# ============= LEITURA RÁPIDA =============
+class LeituraRapidaMixin(CamposSobDemandaViewMixin):
+    """
+    GETs da listagem (completa, paginada ou em streaming) montados por
+    ``leitura_rapida`` a partir de ``.values()``, no mesmo formato do
+    serializer e na ordem da paginação por cursor.
+    """
+    leitura_rapida = None
+
+    def list(self, request, *args, **kwargs):
+        if request.query_params.get('stream', '').lower() in ('1', 'true'):
+            return super().list(request, *args, **kwargs)
+        ordering = self.pagination_class.ordering
+        queryset = self.filter_queryset(self.get_queryset()).order_by(*ordering)
+        leitura = self.leitura_rapida.recorte(self.campos_pedidos())
+        # O cursor lê a posição nas colunas da ordenação de cada linha
+        linhas = leitura.valores(queryset, [campo.lstrip('-') for campo in ordering])
+        pagina = self.paginate_queryset(linhas)
+        if pagina is not None:
+            return self.get_paginated_response(leitura.representar(pagina))
+        return Response(leitura.representar(linhas))
+
+    def linhas_ndjson(self, queryset):
+        leitura = self.leitura_rapida.recorte(self.campos_pedidos())
+        for dados in leitura.em_blocos(queryset, self.stream_chunk_size):
+            yield json.dumps(dados, cls=JSONEncoder, ensure_ascii=False) + '\n'
+
+
+# ============= GET CONDICIONAL =============
+class ConditionalRetrieveMixin:
+    """
+    Responde GETs condicionais (If-None-Match / If-Modified-Since) com 304
+    antes de carregar e serializar o objeto.
+
+    O ETag forte é derivado dos ``atualizado_em`` listados em
+    ``campos_de_versao``: o do próprio objeto e os das relações cujos dados
+    aparecem na resposta (ex.: ``aluno_nome``), lidos numa consulta só.
+    """
+    campos_de_versao = ('atualizado_em',)
+
+    def versoes_usadas(self):
+        """``campos_de_versao`` sem as relações que ficaram fora de ``?fields=``."""
+        campos = self.campos_pedidos()
+        if campos is None:
+            return self.campos_de_versao
+        relacoes = {
+            relacao for nome, (relacao, _) in relacoes_dos_campos(self.get_serializer_class()).items()
+            if nome in campos and relacao
+        }
+        return [campo for campo in self.campos_de_versao if '__' not in campo or campo.rsplit('__', 1)[0] in relacoes]
+
+    def validadores(self):
+        model = self.get_queryset().model
+        campos_de_versao = self.versoes_usadas()
+        versoes = (
+            model.objects.filter(pk=self.kwargs[self.lookup_field])
+            .values_list(*campos_de_versao).first()
+        )
+        if versoes is None:
+            return None, None
+        marcas = [versao for versao in versoes if versao is not None]
+        assinatura = f"{model._meta.label}:{self.kwargs[self.lookup_field]}:" + ':'.join(
+            versao.isoformat() if versao else '-' for versao in versoes
+        )
+        campos = self.campos_pedidos()
+        if campos is not None:
+            # Cada recorte de campos é uma representação diferente
+            assinatura += ':' + ','.join(sorted(campos))
+        etag = '"%s"' % hashlib.md5(assinatura.encode(), usedforsecurity=False).hexdigest()
+        return etag, max(marcas)
+
+    def retrieve(self, request, *args, **kwargs):
+        etag, ultima_modificacao = self.validadores()
+        if etag is None:
+            return super().retrieve(request, *args, **kwargs)
+
+        timestamp = int(ultima_modificacao.timestamp())
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = super().retrieve(request, *args, **kwargs)
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(timestamp)
+        return response
 
 
 # ============= USUÁRIO CRUD =============
-class UsuarioListCreateView(generics.ListCreateAPIView):
+class UsuarioListCreateView(LeituraRapidaMixin, StreamingListMixin, generics.ListCreateAPIView):
+    orcamento_queries = {'GET': 1}
+    usar_replica = True
+    leitura_rapida = LeituraRapida(UsuarioSerializer)
     queryset = Usuario.objects.all()
+    pagination_class = UsuarioCursorPagination
     serializer_class = UsuarioSerializer
     
     def get_queryset(self):
-        queryset = Usuario.objects.all()
-        is_personal = self.request.query_params.get('is_personal')
+        return self.filtrar(super().get_queryset(), self.request.query_params)
+
+    @staticmethod
+    def filtrar(queryset, params):
+        is_personal = params.get('is_personal')
         if is_personal is not None:
             queryset = queryset.filter(is_personal=is_personal.lower() == 'true')
         return queryset
 
 
-class UsuarioDetailView(generics.RetrieveUpdateDestroyAPIView):
+class UsuarioDetailView(ConditionalRetrieveMixin, CamposSobDemandaViewMixin, generics.RetrieveUpdateDestroyAPIView):
+    orcamento_queries = {'GET': 2}
     queryset = Usuario.objects.all()
     serializer_class = UsuarioSerializer
 
 
 # ============= MENSALIDADE CRUD =============
-class MensalidadeListCreateView(generics.ListCreateAPIView):
+class MensalidadeListCreateView(LeituraRapidaMixin, StreamingListMixin, generics.ListCreateAPIView):
+    orcamento_queries = {'GET': 1}
+    usar_replica = True
+    leitura_rapida = LeituraRapida(MensalidadeSerializer)
     queryset = Mensalidade.objects.select_related('aluno')
+    pagination_class = MensalidadeCursorPagination
     serializer_class = MensalidadeSerializer
     
     def get_queryset(self):
-        queryset = Mensalidade.objects.select_related('aluno')
-        aluno_id = self.request.query_params.get('aluno')
+        return self.filtrar(super().get_queryset(), self.request.query_params)
+
+    @staticmethod
+    def filtrar(queryset, params):
+        aluno_id = params.get('aluno')
         if aluno_id:
             queryset = queryset.filter(aluno_id=aluno_id)
         return queryset
 
 
-class MensalidadeDetailView(generics.RetrieveUpdateDestroyAPIView):
+class MensalidadeDetailView(ConditionalRetrieveMixin, CamposSobDemandaViewMixin, generics.RetrieveUpdateDestroyAPIView):
+    orcamento_queries = {'GET': 2}
     queryset = Mensalidade.objects.select_related('aluno')
+    campos_de_versao = ('atualizado_em', 'aluno__atualizado_em')
     serializer_class = MensalidadeSerializer
 
 
 # ============= TREINO CRUD =============
-class TreinoListCreateView(generics.ListCreateAPIView):
+class TreinoListCreateView(LeituraRapidaMixin, StreamingListMixin, generics.ListCreateAPIView):
+    orcamento_queries = {'GET': 2}
+    usar_replica = True
+    leitura_rapida = LeituraRapida(TreinoSerializer)
     queryset = Treino.objects.select_related('aluno', 'personal').prefetch_related('exercicios')
+    pagination_class = TreinoCursorPagination
     
     def get_serializer_class(self):
         if self.request.method == 'POST':
@@ -60,9 +246,12 @@ class TreinoListCreateView(generics.ListCreateAPIView):
         return TreinoSerializer
     
     def get_queryset(self):
-        queryset = Treino.objects.select_related('aluno', 'personal').prefetch_related('exercicios')
-        aluno_id = self.request.query_params.get('aluno')
-        personal_id = self.request.query_params.get('personal')
+        return self.filtrar(super().get_queryset(), self.request.query_params)
+
+    @staticmethod
+    def filtrar(queryset, params):
+        aluno_id = params.get('aluno')
+        personal_id = params.get('personal')
         
         if aluno_id:
             queryset = queryset.filter(aluno_id=aluno_id)
@@ -72,97 +261,244 @@ class TreinoListCreateView(generics.ListCreateAPIView):
         return queryset
 
 
-class TreinoDetailView(generics.RetrieveUpdateDestroyAPIView):
+class TreinoDetailView(ConditionalRetrieveMixin, CamposSobDemandaViewMixin, generics.RetrieveUpdateDestroyAPIView):
+    orcamento_queries = {'GET': 3}
     queryset = Treino.objects.select_related('aluno', 'personal').prefetch_related('exercicios')
+    campos_de_versao = ('atualizado_em', 'aluno__atualizado_em', 'personal__atualizado_em')
     serializer_class = TreinoSerializer
 
 
+class TreinoCompletoMixin:
+    """Carrega numa única consulta todos os usuários citados no payload"""
+    serializer_class = TreinoComExerciciosSerializer
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        itens = self.request.data if isinstance(self.request.data, list) else [self.request.data]
+        ids = set()
+        for item in itens:
+            if isinstance(item, dict):
+                for campo in ('aluno', 'personal'):
+                    try:
+                        ids.add(int(item[campo]))
+                    except (KeyError, TypeError, ValueError):
+                        pass
+        context['usuarios'] = Usuario.objects.in_bulk(ids) if ids else {}
+        return context
+
+
+class TreinoCompletoCreateView(TreinoCompletoMixin, generics.CreateAPIView):
+    """
+    Cria um treino com seus exercícios numa única requisição atômica.
+
+    Aceita também uma lista de treinos (importação de modelos de programa),
+    gravados todos com bulk_create na mesma transação.
+    """
+    max_treinos_por_lote = 1000
+
+    def create(self, request, *args, **kwargs):
+        lote = isinstance(request.data, list)
+        if lote and len(request.data) > self.max_treinos_por_lote:
+            return Response(
+                {"error": f"Envie no máximo {self.max_treinos_por_lote} treinos por lote."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        serializer = self.get_serializer(data=request.data, many=lote)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+class TreinoCompletoUpdateView(TreinoCompletoMixin, generics.UpdateAPIView):
+    """Substitui um treino e seus exercícios (PUT) ou altera parte deles (PATCH)"""
+    queryset = Treino.objects.select_related('aluno', 'personal')
+
+
+@usar_replica
+@orcamento_queries(3)
+@api_view(['GET'])
+def buscar_treinos(request):
+    """
+    Busca textual de treinos por nome, descrição e exercícios (ver
+    ``gym/busca.py``): ``?q=agach supino`` traz os treinos com todos os
+    termos, como prefixo e sem diferenciar acentos, do mais relevante ao
+    menos. ``?limite=`` vai até 100 (padrão 20).
+    """
+    termo = request.query_params.get('q', '')
+    if not busca.termos(termo):
+        return Response({"error": "Informe o termo de busca no parâmetro q."}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        limite = min(max(int(request.query_params.get('limite', 20)), 1), 100)
+    except ValueError:
+        return Response({"error": "O parâmetro limite deve ser um número inteiro."}, status=status.HTTP_400_BAD_REQUEST)
+
+    relevancias = dict(busca.buscar(termo, limite))
+    leitura = TreinoListCreateView.leitura_rapida
+    treinos = {} if not relevancias else {
+        dados['id']: dados
+        for dados in leitura.representar(leitura.valores(Treino.objects.filter(id__in=list(relevancias))))
+    }
+    return Response({
+        'q': termo,
+        'resultados': [
+            {**treinos[treino_id], 'relevancia': relevancia}
+            for treino_id, relevancia in relevancias.items() if treino_id in treinos
+        ]
+    })
+
+
 # ============= EXERCÍCIO CRUD =============
-class ExercicioListCreateView(generics.ListCreateAPIView):
+class ExercicioListCreateView(LeituraRapidaMixin, StreamingListMixin, generics.ListCreateAPIView):
+    orcamento_queries = {'GET': 1}
+    usar_replica = True
+    leitura_rapida = LeituraRapida(ExercicioSerializer)
     queryset = Exercicio.objects.select_related('treino')
+    pagination_class = ExercicioCursorPagination
     serializer_class = ExercicioSerializer
     
     def get_queryset(self):
-        queryset = Exercicio.objects.select_related('treino')
-        treino_id = self.request.query_params.get('treino')
+        return self.filtrar(super().get_queryset(), self.request.query_params)
+
+    @staticmethod
+    def filtrar(queryset, params):
+        treino_id = params.get('treino')
         if treino_id:
             queryset = queryset.filter(treino_id=treino_id)
         return queryset
 
 
-class ExercicioDetailView(generics.RetrieveUpdateDestroyAPIView):
+class ExercicioDetailView(CamposSobDemandaViewMixin, generics.RetrieveUpdateDestroyAPIView):
+    orcamento_queries = {'GET': 1}
     queryset = Exercicio.objects.select_related('treino')
     serializer_class = ExercicioSerializer
 
 
 # ============= VIEWS PERSONALIZADAS =============
+@usar_replica
+@orcamento_queries(2)
 @api_view(['GET'])
 def alunos_personal(request, personal_id):
-    """Lista todos os alunos que possuem treinos com um personal específico"""
+    """
+    Lista os alunos que possuem treinos com um personal específico.
+
+    A deduplicação é feita no banco (``id IN (SELECT aluno_id ...)`` sobre o
+    índice de treinos por personal), em ordem estável de id, com paginação
+    por cursor opcional. ``?estatisticas=1`` acrescenta o total de treinos com
+    o personal e a data do último treino de cada aluno.
+    """
     personal = get_object_or_404(Usuario, id=personal_id, is_personal=True)
-    treinos = Treino.objects.filter(personal=personal).select_related('aluno')
-    alunos = list(set([treino.aluno for treino in treinos]))
-    serializer = UsuarioSerializer(alunos, many=True)
-    return Response(serializer.data)
+    treinos = Treino.objects.filter(personal=personal)
+    alunos = Usuario.objects.filter(id__in=treinos.values('aluno_id')).order_by('id')
+    serializer_class = UsuarioSerializer
+
+    if request.query_params.get('estatisticas', '').lower() in ('1', 'true'):
+        treinos_do_aluno = treinos.filter(aluno=models.OuterRef('pk')).order_by().values('aluno')
+        alunos = alunos.annotate(
+            total_treinos=models.Subquery(treinos_do_aluno.annotate(total=models.Count('id')).values('total')),
+            ultimo_treino=models.Subquery(treinos_do_aluno.annotate(ultimo=models.Max('data_criacao')).values('ultimo')),
+        )
+        serializer_class = AlunoDoPersonalSerializer
+
+    paginator = UsuarioCursorPagination()
+    pagina = paginator.paginate_queryset(alunos, request)
+    if pagina is not None:
+        return paginator.get_paginated_response(serializer_class(pagina, many=True).data)
+    return Response(serializer_class(alunos.iterator(), many=True).data)
 
 
+@usar_replica
+@orcamento_queries(1)
 @api_view(['GET'])
 def status_mensalidade(request, aluno_id):
     """Verifica o status da mensalidade de um aluno"""
-    aluno = get_object_or_404(Usuario, id=aluno_id)
-    from datetime import date
-    
-    try:
-        ultima_mensalidade = Mensalidade.objects.filter(aluno=aluno).latest('validade')
-        ativo = ultima_mensalidade.validade >= date.today()
-        
-        return Response({
-            'aluno': aluno.nome,
-            'ativo': ativo,
-            'ultima_mensalidade': MensalidadeSerializer(ultima_mensalidade).data,
-            'dias_restantes': (ultima_mensalidade.validade - date.today()).days if ativo else 0
-        })
-    except Mensalidade.DoesNotExist:
-        return Response({
+    # O resumo desnormalizado traz a mensalidade mais recente na mesma consulta
+    aluno = get_object_or_404(
+        Usuario.objects.select_related('resumo_mensalidade__ultima_mensalidade'),
+        id=aluno_id
+    )
+    return Response(dados_status_mensalidade(aluno))
+
+
+def dados_status_mensalidade(aluno):
+    """Corpo da resposta de status, a partir do aluno com o resumo já carregado"""
+    resumo = getattr(aluno, 'resumo_mensalidade', None)
+
+    if resumo is None or resumo.ultima_mensalidade is None:
+        return {
             'aluno': aluno.nome,
             'ativo': False,
             'ultima_mensalidade': None,
             'dias_restantes': 0
-        })
+        }
+
+    ultima_mensalidade = resumo.ultima_mensalidade
+    ultima_mensalidade.aluno = aluno
+
+    return {
+        'aluno': aluno.nome,
+        'ativo': resumo.ativa,
+        'ultima_mensalidade': MensalidadeSerializer(ultima_mensalidade).data,
+        'dias_restantes': max((resumo.validade - date.today()).days, 0) if resumo.ativa else 0
+    }
 
 
+@usar_replica
+@orcamento_queries(5)
 @api_view(['GET'])
 def dashboard_stats(request):
-    """Estatísticas gerais da academia"""
-    total_usuarios = Usuario.objects.count()
-    total_alunos = Usuario.objects.filter(is_personal=False).count()
-    total_personals = Usuario.objects.filter(is_personal=True).count()
-    total_treinos = Treino.objects.count()
-    
-    # Alunos ativos (com mensalidade válida)
-    from datetime import date
-    mensalidades_ativas = Mensalidade.objects.filter(validade__gte=date.today())
-    alunos_ativos = mensalidades_ativas.values_list('aluno', flat=True).distinct().count()
-    
+    """Estatísticas gerais da academia, lidas dos contadores em cache"""
+    return Response(dados_dashboard(estatisticas.obter()))
+
+
+def dados_dashboard(contadores):
+    return {
+        'total_usuarios': contadores['total_usuarios'],
+        'total_alunos': contadores['total_alunos'],
+        'total_personals': contadores['total_personals'],
+        'total_treinos': contadores['total_treinos'],
+        'alunos_ativos': contadores['alunos_ativos'],
+        'alunos_inativos': contadores['total_alunos'] - contadores['alunos_ativos']
+    }
+
+@usar_replica
+@orcamento_queries(1)
+@api_view(['GET'])
+def mensalidades_vencendo(request):
+    """Alunos ativos cuja mensalidade vence nos próximos ``?dias=`` dias (padrão 7, máximo 90)."""
+    try:
+        dias = int(request.query_params.get('dias', 7))
+    except ValueError:
+        return Response({"error": "O parâmetro dias deve ser um número inteiro."}, status=status.HTTP_400_BAD_REQUEST)
+    if not 0 <= dias <= 90:
+        return Response({"error": "O parâmetro dias deve estar entre 0 e 90."}, status=status.HTTP_400_BAD_REQUEST)
+
+    hoje = date.today()
     return Response({
-        'total_usuarios': total_usuarios,
-        'total_alunos': total_alunos,
-        'total_personals': total_personals,
-        'total_treinos': total_treinos,
-        'alunos_ativos': alunos_ativos,
-        'alunos_inativos': total_alunos - alunos_ativos
+        'dias': dias,
+        'alunos': [
+            {
+                'aluno_id': resumo.aluno_id,
+                'aluno': resumo.aluno.nome,
+                'validade': resumo.validade,
+                'dias_restantes': (resumo.validade - hoje).days,
+            }
+            for resumo in vencimentos.vencendo(dias, hoje)
+        ]
     })
 
+
+@usar_replica
+@orcamento_queries(2)
 @api_view(['GET'])
 def personal_mais_popular(request):
     """Retorna o personal trainer com o maior número de alunos distintos."""
-    # Conta alunos distintos para cada personal e ordena de forma decrescente
-    popular_personal = (
-        Usuario.objects.filter(is_personal=True)
-        .annotate(total_alunos=models.Count('treinos_orientados__aluno', distinct=True))
-        .order_by('-total_alunos')
-        .first()
-    )
+    # Primeira entrada do ranking materializado (ver gym/ranking.py)
+    topo = RankingPersonal.objects.select_related('personal').order_by('-total_alunos', '-personal_id').first()
+    if topo:
+        popular_personal, total_alunos = topo.personal, topo.total_alunos
+    else:
+        # Nenhum personal com alunos: qualquer personal empata com zero
+        popular_personal, total_alunos = Usuario.objects.filter(is_personal=True).order_by('id').first(), 0
 
     if not popular_personal:
         return Response({"detail": "Nenhum personal trainer encontrado."}, status=404)
@@ -170,35 +506,310 @@ def personal_mais_popular(request):
     serializer = UsuarioSerializer(popular_personal)
     return Response({
         **serializer.data,
-        'total_alunos': popular_personal.total_alunos
+        'total_alunos': total_alunos
     })
 
+
+@usar_replica
+@orcamento_queries(2)
+@api_view(['GET'])
+def ranking_personals(request):
+    """
+    Ranking de personals por alunos distintos, com empates.
+
+    ``?top=N`` limita as posições (empatados na última posição entram todos) e
+    ``?dias=30`` restringe aos alunos com treino criado nos últimos dias
+    (máximo 3650).
+    """
+    try:
+        top = min(max(int(request.query_params.get('top', 10)), 1), 100)
+        dias = request.query_params.get('dias')
+        dias = int(dias) if dias else None
+    except ValueError:
+        return Response({"error": "Os parâmetros top e dias devem ser números inteiros."}, status=status.HTTP_400_BAD_REQUEST)
+    if dias is not None and not 1 <= dias <= 3650:
+        return Response({"error": "O parâmetro dias deve estar entre 1 e 3650."}, status=status.HTTP_400_BAD_REQUEST)
+
+    return Response({
+        'top': top,
+        'dias': dias,
+        'ranking': ranking.ranking(top, dias)
+    })
+
+@orcamento_queries(6)
 @api_view(['POST'])
 def aluno_checkin(request, aluno_id):
     """
     Registra o check-in de um aluno, verificando se sua mensalidade está ativa.
+
+    A elegibilidade vem do cache de ``gym/elegibilidade.py``: em regime, só o
+    check-in é gravado, sem leitura do aluno.
     """
-    try:
-        aluno = Usuario.objects.get(pk=aluno_id)
-    except Usuario.DoesNotExist:
+    aluno = elegibilidade.obter(aluno_id)
+    if aluno is None:
         return Response({"error": "Aluno não encontrado."}, status=status.HTTP_404_NOT_FOUND)
 
-    # Regra 1: Apenas alunos podem fazer check-in
-    if aluno.is_personal:
-        return Response({"error": "Apenas alunos podem fazer check-in."}, status=status.HTTP_400_BAD_REQUEST)
-
-    # Regra 2: Verificar se a mensalidade está ativa
-    try:
-        ultima_mensalidade = Mensalidade.objects.filter(aluno=aluno).latest('validade')
-        if ultima_mensalidade.validade < date.today():
-            return Response({"error": "Mensalidade inativa. Verifique sua assinatura."}, status=status.HTTP_403_FORBIDDEN)
-    except Mensalidade.DoesNotExist:
-        return Response({"error": "Aluno não possui mensalidade registrada."}, status=status.HTTP_403_FORBIDDEN)
+    recusa = recusa_de_checkin(aluno)
+    if recusa:
+        return Response(*recusa)
 
     # Se passou por todas as regras, registrar o check-in
-    CheckIn.objects.create(aluno=aluno)
+    CheckIn.objects.create(aluno_id=aluno_id)
     
     return Response(
         {"message": f"Check-in de {aluno.nome} realizado com sucesso!"}, 
         status=status.HTTP_201_CREATED
-    )
\ No newline at end of file
+    )
+
+
+def recusa_de_checkin(aluno):
+    """(corpo, status) do erro se o aluno não pode fazer check-in, senão None"""
+    # Regra 1: Apenas alunos podem fazer check-in
+    if aluno.is_personal:
+        return {"error": "Apenas alunos podem fazer check-in."}, status.HTTP_400_BAD_REQUEST
+
+    # Regra 2: Verificar se a mensalidade está ativa
+    if aluno.ativa is None:
+        return {"error": "Aluno não possui mensalidade registrada."}, status.HTTP_403_FORBIDDEN
+    if not aluno.ativa:
+        return {"error": "Mensalidade inativa. Verifique sua assinatura."}, status.HTTP_403_FORBIDDEN
+    return None
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def elegibilidade_cache(request):
+    """Tamanho e taxa de acerto do cache de elegibilidade de check-in deste processo."""
+    return Response(elegibilidade.estatisticas())
+
+
+@orcamento_queries(9)
+@api_view(['POST'])
+def checkin_em_lote(request):
+    """
+    Registra em lote os check-ins acumulados pelas catracas.
+
+    Recebe uma lista de ``{"aluno_id": ..., "timestamp": ...}`` e devolve um
+    resultado por evento, com o status que ``aluno_checkin`` daria a ele.
+    """
+    eventos = request.data
+    if not isinstance(eventos, list):
+        return Response({"error": "Envie uma lista de eventos {aluno_id, timestamp}."}, status=status.HTTP_400_BAD_REQUEST)
+    if len(eventos) > checkins.MAX_EVENTOS:
+        return Response({"error": f"Envie no máximo {checkins.MAX_EVENTOS} eventos por lote."}, status=status.HTTP_400_BAD_REQUEST)
+
+    resultados = checkins.registrar_em_lote(eventos)
+    aceitos = sum(1 for resultado in resultados if resultado['status'] == status.HTTP_201_CREATED)
+
+    return Response({
+        'aceitos': aceitos,
+        'rejeitados': len(resultados) - aceitos,
+        'resultados': resultados
+    })
+
+
+# ============= ANÁLISE DE CHECK-INS =============
+def data_da_requisicao(request, parametro):
+    """``?parametro=`` como data; ``None`` se ausente. ``ValueError`` se não for uma data AAAA-MM-DD válida."""
+    texto = request.query_params.get(parametro, '').strip()
+    if not texto:
+        return None
+    valor = parse_date(texto)
+    if valor is None:
+        raise ValueError(texto)
+    return valor
+
+
+def periodo_da_requisicao(request, dias_padrao=365):
+    """Lê ``?inicio=`` e ``?fim=`` (AAAA-MM-DD); por padrão, o último ano até hoje. ``None`` se inválido."""
+    try:
+        fim = data_da_requisicao(request, 'fim') or date.today()
+        inicio = data_da_requisicao(request, 'inicio') or fim - timedelta(days=dias_padrao - 1)
+    except (ValueError, OverflowError):
+        return None
+    if inicio > fim:
+        return None
+    return inicio, fim
+
+
+PERIODO_INVALIDO = {"error": "Período inválido. Use inicio e fim no formato AAAA-MM-DD, com inicio <= fim."}
+
+
+@usar_replica
+@orcamento_queries(1)
+@api_view(['GET'])
+def ocupacao_semanal(request):
+    """Mapa de calor de check-ins por dia da semana e hora, lido dos rollups horários"""
+    periodo = periodo_da_requisicao(request)
+    if periodo is None:
+        return Response(PERIODO_INVALIDO, status=status.HTTP_400_BAD_REQUEST)
+    inicio, fim = periodo
+
+    return Response({
+        'inicio': inicio,
+        'fim': fim,
+        'dias_semana': ocupacao.DIAS_DA_SEMANA,
+        'matriz': ocupacao.mapa_semanal(inicio, fim)
+    })
+
+
+@usar_replica
+@orcamento_queries(2)
+@api_view(['GET'])
+def horarios_pico(request):
+    """Horários de pico do período, lidos dos rollups horários"""
+    periodo = periodo_da_requisicao(request)
+    if periodo is None:
+        return Response(PERIODO_INVALIDO, status=status.HTTP_400_BAD_REQUEST)
+    inicio, fim = periodo
+    try:
+        top = min(max(int(request.query_params.get('top', 5)), 1), 50)
+    except ValueError:
+        return Response({"error": "O parâmetro top deve ser um número inteiro."}, status=status.HTTP_400_BAD_REQUEST)
+
+    return Response({
+        'inicio': inicio,
+        'fim': fim,
+        **ocupacao.picos(inicio, fim, top)
+    })
+
+
+@usar_replica
+@orcamento_queries(2)
+@api_view(['GET'])
+def frequencia_aluno(request, aluno_id):
+    """Frequência de um aluno no período, lida do rollup diário"""
+    aluno = get_object_or_404(Usuario, id=aluno_id)
+    periodo = periodo_da_requisicao(request, dias_padrao=90)
+    if periodo is None:
+        return Response(PERIODO_INVALIDO, status=status.HTTP_400_BAD_REQUEST)
+    inicio, fim = periodo
+
+    return Response({
+        'aluno': aluno.nome,
+        'inicio': inicio,
+        'fim': fim,
+        **ocupacao.frequencia(aluno.id, inicio, fim)
+    })
+
+
+# ============= VOLUME DE TREINO =============
+@usar_replica
+@orcamento_queries(3)
+@api_view(['GET'])
+def volume_aluno(request, aluno_id):
+    """
+    Tonelagem (séries × repetições × carga) dos treinos do aluno no período,
+    por exercício e por mês, com a tendência mensal de tonelagem e de carga
+    máxima. Calculada no banco e mantida em cache até o aluno mudar de treino.
+    """
+    aluno = get_object_or_404(Usuario, id=aluno_id)
+    periodo = periodo_da_requisicao(request)
+    if periodo is None:
+        return Response(PERIODO_INVALIDO, status=status.HTTP_400_BAD_REQUEST)
+
+    return Response({'aluno': aluno.nome, **volume.aluno(aluno.id, *periodo)})
+
+
+@usar_replica
+@orcamento_queries(3)
+@api_view(['GET'])
+def volume_treino(request, pk):
+    """Tonelagem de cada exercício do treino e os totais, em cache como a do aluno."""
+    treino = get_object_or_404(Treino.objects.only('id', 'aluno_id', 'nome'), pk=pk)
+    return Response({'treino': treino.nome, **volume.treino(treino)})
+
+
+# ============= FINANCEIRO =============
+def filtros_financeiros(request):
+    """Período (máx. ``financeiro.MAX_DIAS``) e ``?aluno=`` opcional, ou a resposta de erro."""
+    periodo = periodo_da_requisicao(request)
+    if periodo is None:
+        return None, None, Response(PERIODO_INVALIDO, status=status.HTTP_400_BAD_REQUEST)
+    if (periodo[1] - periodo[0]).days >= financeiro.MAX_DIAS:
+        return None, None, Response(
+            {"error": f"O período deve ter no máximo {financeiro.MAX_DIAS} dias."},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    try:
+        aluno_id = int(request.query_params['aluno']) if request.query_params.get('aluno') else None
+    except ValueError:
+        return None, None, Response({"error": "O parâmetro aluno deve ser um número inteiro."}, status=status.HTTP_400_BAD_REQUEST)
+    return periodo, aluno_id, None
+
+
+@usar_replica
+@orcamento_queries(2)
+@api_view(['GET'])
+def receita(request):
+    """
+    Receita das mensalidades por data de pagamento: total do período e por mês.
+
+    ``?aluno=`` restringe a um aluno e ``?por_aluno=N`` inclui os N alunos que
+    mais pagaram no período (máximo 100).
+    """
+    periodo, aluno_id, erro = filtros_financeiros(request)
+    if erro:
+        return erro
+    try:
+        por_aluno = int(request.query_params.get('por_aluno', 0))
+    except ValueError:
+        return Response({"error": "O parâmetro por_aluno deve ser um número inteiro."}, status=status.HTTP_400_BAD_REQUEST)
+
+    dados = financeiro.receita(*periodo, aluno_id=aluno_id)
+    if por_aluno > 0 and aluno_id is None:
+        dados['por_aluno'] = financeiro.receita_por_aluno(*periodo, top=min(por_aluno, 100))
+    return Response(dados)
+
+
+@usar_replica
+@orcamento_queries(1)
+@api_view(['GET'])
+def exportar_mensalidades_csv(request):
+    """Exporta os pagamentos do período em CSV, em streaming e com memória constante"""
+    periodo, aluno_id, erro = filtros_financeiros(request)
+    if erro:
+        return erro
+    inicio, fim = periodo
+    response = StreamingHttpResponse(
+        financeiro.linhas_csv(inicio, fim, aluno_id),
+        content_type='text/csv; charset=utf-8'
+    )
+    response['Content-Disposition'] = f'attachment; filename="mensalidades_{inicio}_{fim}.csv"'
+    return response
+
+
+# ============= SINCRONIZAÇÃO INCREMENTAL =============
+@usar_replica
+@orcamento_queries(6)
+@api_view(['GET'])
+def sincronizar(request):
+    """
+    Sincronização para clientes offline (ver ``gym/sync.py``).
+
+    Sem ``?since=`` devolve o retrato do aluno de ``?aluno=`` (obrigatório) e
+    o cursor; com ``?since=<cursor>`` devolve só os usuários, treinos,
+    exercícios e mensalidades alterados (``alterados``) ou excluídos
+    (``excluidos``, só os ids) desde então. ``mais`` indica que há outra página
+    (``?limite=``, até 5000 entradas do log). 410 indica um cursor anterior à
+    poda do log: o cliente refaz o retrato.
+    """
+    try:
+        aluno_id = int(request.query_params['aluno']) if request.query_params.get('aluno') else None
+        since = int(request.query_params['since']) if request.query_params.get('since') else None
+        limite = int(request.query_params.get('limite', sync.LIMITE_PADRAO))
+    except ValueError:
+        return Response({"error": "Os parâmetros aluno, since e limite devem ser números inteiros."}, status=status.HTTP_400_BAD_REQUEST)
+    if since is None:
+        if aluno_id is None:
+            return Response(
+                {"error": "O retrato exige o parâmetro aluno; sem ele, percorra o log a partir de since=0."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(sync.retrato(aluno_id))
+    if since < 0:
+        return Response({"error": "Cursor inválido."}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        return Response(sync.alteracoes(since, aluno_id, min(max(limite, 1), sync.LIMITE_MAXIMO)))
+    except sync.CursorExpirado:
+        return Response({"error": "Cursor expirado: sincronize sem since."}, status=status.HTTP_410_GONE)
@@ -0,0 +1,128 @@
+"""
+Versões assíncronas (ASGI) dos endpoints de leitura mais acessados.
+
+Sob ASGI uma view síncrona do DRF ocupa uma thread do executor durante toda
+a requisição. Estas views usam o ORM assíncrono (``aget``, ``acount``,
+``async for``) e o cache assíncrono, e devolvem o mesmo JSON, byte a byte,
+que as versões síncronas: as regras e o corpo das respostas vêm dos mesmos
+helpers de ``gym/views.py``.
+"""
+import json
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from rest_framework import status
+from rest_framework.utils.encoders import JSONEncoder
+from core.db_router import usar_replica
+from core.middleware import orcamento_queries
+from . import elegibilidade, estatisticas
+from .models import Usuario, CheckIn
+from .views import (
+    UsuarioListCreateView,
+    MensalidadeListCreateView,
+    TreinoListCreateView,
+    ExercicioListCreateView,
+    dados_status_mensalidade,
+    dados_dashboard,
+    recusa_de_checkin,
+)
+
+
+def resposta_json(dados, status=status.HTTP_200_OK):
+    """JSON com a mesma formatação do ``JSONRenderer`` do DRF (compacto, UTF-8)."""
+    conteudo = json.dumps(dados, cls=JSONEncoder, ensure_ascii=False, separators=(',', ':'), allow_nan=False)
+    return HttpResponse(conteudo.encode(), status=status, content_type='application/json')
+
+
+def nao_encontrado(model):
+    return resposta_json(
+        {"detail": f"No {model._meta.object_name} matches the given query."},
+        status=status.HTTP_404_NOT_FOUND
+    )
+
+
+# ============= LISTAGENS =============
+class ListagemAsync(View):
+    """
+    Listagem completa com ``async for``, reaproveitando o queryset, os filtros
+    e a leitura rápida da view síncrona correspondente.
+
+    Paginação por cursor (``?cursor=``/``?page_size=``), ``?stream=1`` e
+    ``?fields=`` seguem para a view do DRF, executada numa thread.
+    """
+    http_method_names = ['get', 'head', 'options']
+    usar_replica = True
+    view_sincrona = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.orcamento_queries = cls.view_sincrona.orcamento_queries
+        cls.delegada = staticmethod(sync_to_async(cls.view_sincrona.as_view()))
+
+    async def get(self, request):
+        params = request.GET
+        delegar = ('cursor', 'page_size', 'fields')
+        if any(param in params for param in delegar) or params.get('stream', '').lower() in ('1', 'true'):
+            return await self.delegada(request)
+
+        view = self.view_sincrona
+        queryset = view.filtrar(view.queryset.all(), params).order_by(*view.pagination_class.ordering)
+        leitura = view.leitura_rapida
+        linhas = [linha async for linha in leitura.valores(queryset)]
+        return resposta_json(await leitura.arepresentar(linhas))
+
+
+class UsuarioListAsyncView(ListagemAsync):
+    view_sincrona = UsuarioListCreateView
+
+
+class MensalidadeListAsyncView(ListagemAsync):
+    view_sincrona = MensalidadeListCreateView
+
+
+class TreinoListAsyncView(ListagemAsync):
+    view_sincrona = TreinoListCreateView
+
+
+class ExercicioListAsyncView(ListagemAsync):
+    view_sincrona = ExercicioListCreateView
+
+
+# ============= VIEWS PERSONALIZADAS =============
+@usar_replica
+@orcamento_queries(1)
+@require_GET
+async def status_mensalidade(request, aluno_id):
+    try:
+        aluno = await Usuario.objects.select_related('resumo_mensalidade__ultima_mensalidade').aget(id=aluno_id)
+    except Usuario.DoesNotExist:
+        return nao_encontrado(Usuario)
+    return resposta_json(dados_status_mensalidade(aluno))
+
+
+@usar_replica
+@orcamento_queries(5)
+@require_GET
+async def dashboard_stats(request):
+    return resposta_json(dados_dashboard(await estatisticas.aobter()))
+
+
+@orcamento_queries(6)
+@csrf_exempt
+@require_POST
+async def aluno_checkin(request, aluno_id):
+    aluno = await elegibilidade.aobter(aluno_id)
+    if aluno is None:
+        return resposta_json({"error": "Aluno não encontrado."}, status=status.HTTP_404_NOT_FOUND)
+
+    recusa = recusa_de_checkin(aluno)
+    if recusa:
+        return resposta_json(*recusa)
+
+    await CheckIn.objects.acreate(aluno_id=aluno_id)
+    return resposta_json(
+        {"message": f"Check-in de {aluno.nome} realizado com sucesso!"},
+        status=status.HTTP_201_CREATED
+    )
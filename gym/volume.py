@@ -0,0 +1,179 @@
+"""
+Volume de treino (tonelagem = séries × repetições × carga) por aluno e por treino.
+
+Tudo é agregado no banco: o volume de cada exercício é uma expressão sobre as
+colunas de ``Exercicio`` e os totais saem de um ``GROUP BY`` por nome de
+exercício e mês de ``Treino.data_criacao``, sobre o índice de treinos por
+aluno. Em Python ficam só as linhas já agregadas (exercícios × meses), das
+quais saem os totais e a tendência (inclinação da reta de mínimos quadrados
+por mês). Exercícios sem carga contam séries e repetições, mas não tonelagem.
+
+Os resultados ficam no cache de cada processo, por aluno, sob uma versão
+que os sinais de Treino e Exercicio (e as gravações em lote) trocam após o
+commit: uma mudança invalida de uma vez a análise do aluno e a de todos os
+seus treinos. As versões ficam no cache ``compartilhado`` (ver ``CACHES``),
+para que a gravação atendida por um worker invalide as análises de todos.
+Cada versão nova é um valor único, então uma versão despejada e recriada
+nunca reaproveita uma análise antiga. As análises também expiram após
+``VOLUME_CACHE_TTL`` segundos, e as versões antigas e os períodos pouco
+pedidos não ficam ocupando o cache.
+"""
+import uuid
+from datetime import datetime, time, timedelta
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.db import transaction
+from django.db.models import ExpressionWrapper, F, FloatField, Max, Sum
+from django.db.models.functions import Coalesce, TruncMonth
+from django.utils import timezone
+from .models import Exercicio
+
+PREFIXO = 'gym:volume:'
+TONELAGEM = ExpressionWrapper(F('series') * F('repeticoes') * F('carga_kg'), output_field=FloatField())
+REPETICOES = F('series') * F('repeticoes')
+
+
+def arredondar(valor, casas=2):
+    return round(valor, casas) if valor is not None else None
+
+
+def inclinacao(pontos):
+    """Inclinação da reta de mínimos quadrados por ``(x, y)``; ``None`` com menos de dois x distintos."""
+    pontos = [(x, y) for x, y in pontos if y is not None]
+    n = len(pontos)
+    if n < 2:
+        return None
+    media_x = sum(x for x, _ in pontos) / n
+    media_y = sum(y for _, y in pontos) / n
+    variancia = sum((x - media_x) ** 2 for x, _ in pontos)
+    if not variancia:
+        return None
+    return sum((x - media_x) * (y - media_y) for x, y in pontos) / variancia
+
+
+# ============= CACHE =============
+def versoes():
+    return caches['compartilhado']
+
+
+def nova_versao():
+    return uuid.uuid4().hex
+
+
+def versao(aluno_id):
+    # Perder a versão só custa recalcular: ela pode expirar com as análises
+    return versoes().get_or_set(f'{PREFIXO}{aluno_id}:versao', nova_versao, timeout=settings.VOLUME_CACHE_TTL)
+
+
+def em_cache(aluno_id, sufixo, calcular):
+    chave = f'{PREFIXO}{aluno_id}:{versao(aluno_id)}:{sufixo}'
+    dados = cache.get(chave)
+    if dados is None:
+        dados = calcular()
+        cache.set(chave, dados, timeout=settings.VOLUME_CACHE_TTL)
+    return dados
+
+
+def invalidar(*aluno_ids):
+    """Descarta as análises dos alunos depois que a transação atual confirmar."""
+    aluno_ids = {aluno_id for aluno_id in aluno_ids if aluno_id is not None}
+    if not aluno_ids:
+        return
+
+    def aplicar():
+        versoes().set_many(
+            {f'{PREFIXO}{aluno_id}:versao': nova_versao() for aluno_id in aluno_ids},
+            timeout=settings.VOLUME_CACHE_TTL
+        )
+
+    transaction.on_commit(aplicar)
+
+
+# ============= ANÁLISES =============
+def por_exercicio(linhas):
+    """Agrupa as linhas ``(nome, mes, ...)`` já agregadas no banco por exercício."""
+    exercicios = {}
+    for linha in linhas:
+        exercicios.setdefault(linha['nome'], []).append(linha)
+
+    resultado = []
+    for nome, meses in exercicios.items():
+        base = meses[0]['mes']
+        indice = [(mes['mes'].year - base.year) * 12 + mes['mes'].month - base.month for mes in meses]
+        tonelagem = sum(mes['tonelagem'] for mes in meses)
+        resultado.append({
+            'exercicio': nome,
+            'tonelagem': arredondar(tonelagem),
+            'series': sum(mes['total_series'] for mes in meses),
+            'repeticoes': sum(mes['total_repeticoes'] for mes in meses),
+            'carga_maxima': max((mes['carga_maxima'] for mes in meses if mes['carga_maxima'] is not None), default=None),
+            'por_mes': [
+                {
+                    'mes': mes['mes'].strftime('%Y-%m'),
+                    'tonelagem': arredondar(mes['tonelagem']),
+                    'carga_maxima': mes['carga_maxima'],
+                }
+                for mes in meses
+            ],
+            'tendencia': {
+                'tonelagem_por_mes': arredondar(inclinacao(zip(indice, (mes['tonelagem'] for mes in meses)))),
+                'carga_maxima_por_mes': arredondar(inclinacao(zip(indice, (mes['carga_maxima'] for mes in meses)))),
+            },
+        })
+    resultado.sort(key=lambda exercicio: (-exercicio['tonelagem'], exercicio['exercicio']))
+    return resultado
+
+
+def calcular_aluno(aluno_id, inicio, fim):
+    # Faixa de data_criacao, em vez de __date, para percorrer o índice (aluno, data_criacao)
+    de = timezone.make_aware(datetime.combine(inicio, time.min))
+    ate = timezone.make_aware(datetime.combine(fim + timedelta(days=1), time.min))
+    linhas = (
+        Exercicio.objects
+        .filter(treino__aluno_id=aluno_id, treino__data_criacao__gte=de, treino__data_criacao__lt=ate)
+        .values('nome', mes=TruncMonth('treino__data_criacao'))
+        .annotate(
+            tonelagem=Coalesce(Sum(TONELAGEM), 0.0),
+            total_series=Sum('series'),
+            total_repeticoes=Sum(REPETICOES),
+            carga_maxima=Max('carga_kg'),
+        )
+        .order_by('nome', 'mes')
+    )
+    exercicios = por_exercicio(linhas)
+    return {
+        'inicio': inicio,
+        'fim': fim,
+        'tonelagem': arredondar(sum(exercicio['tonelagem'] for exercicio in exercicios)),
+        'series': sum(exercicio['series'] for exercicio in exercicios),
+        'repeticoes': sum(exercicio['repeticoes'] for exercicio in exercicios),
+        'exercicios': exercicios,
+    }
+
+
+def aluno(aluno_id, inicio, fim):
+    """Tonelagem total, por exercício e por mês, e tendência dos treinos do período."""
+    return em_cache(aluno_id, f'aluno:{inicio}:{fim}', lambda: calcular_aluno(aluno_id, inicio, fim))
+
+
+def calcular_treino(treino_id):
+    exercicios = [
+        {**linha, 'tonelagem': arredondar(linha['tonelagem'])}
+        for linha in (
+            Exercicio.objects.filter(treino_id=treino_id)
+            .order_by('id')
+            .values('id', 'nome', 'series', 'repeticoes', 'carga_kg')
+            .annotate(tonelagem=TONELAGEM)
+        )
+    ]
+    return {
+        'tonelagem': arredondar(sum(exercicio['tonelagem'] or 0 for exercicio in exercicios)),
+        'series': sum(exercicio['series'] for exercicio in exercicios),
+        'repeticoes': sum(exercicio['series'] * exercicio['repeticoes'] for exercicio in exercicios),
+        'exercicios': exercicios,
+    }
+
+
+def treino(instancia):
+    """Tonelagem de cada exercício do treino e os totais."""
+    return em_cache(instancia.aluno_id, f'treino:{instancia.pk}', lambda: calcular_treino(instancia.pk))